@@ -0,0 +1,98 @@
+"""
+Нагрузочная проверка интеграции с iiko на локальной замене API.
+
+    python bench_iiko.py --users 200 --products 5000 --latency 0.3 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+from iiko_integration.client import close_iiko_clients
+from iiko_integration.fake_server import FakeIikoConfig, FakeIikoServer
+from services.iiko_service import IikoService
+from services.menu_cache import MenuCache
+from services.web_server import start_web_server
+
+logger = logging.getLogger(__name__)
+
+
+async def measure(name: str, calls: int, func: Callable[[], Awaitable]) -> None:
+    """Запускает calls одновременных вызовов и печатает пропускную способность и задержки"""
+    latencies: List[float] = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            if await func() is None:
+                errors += 1
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    print(
+        f"{name:<28} {calls / elapsed:>9.1f} req/s   "
+        f"p50 {statistics.median(latencies) * 1000:>8.1f} ms   "
+        f"p95 {p95 * 1000:>8.1f} ms   ошибок {errors}"
+    )
+
+
+async def run(args):
+    config = FakeIikoConfig(
+        categories=args.categories,
+        products=args.products,
+        latency=args.latency,
+        jitter=args.latency / 4,
+        error_rate=args.error_rate,
+        token_ttl=args.token_ttl
+    )
+    server = FakeIikoServer(config)
+    runner = await start_web_server(server.create_app(), "127.0.0.1", args.port)
+
+    service = IikoService(
+        api_login="bench",
+        api_password="",
+        organization_id="bench-org",
+        base_url=f"http://127.0.0.1:{args.port}"
+    )
+    cache = MenuCache(service)
+    items = [{"product_id": "product-1", "quantity": 1}]
+
+    try:
+        await measure("меню: запрос в iiko", args.users, service.get_menu)
+        await cache.refresh()
+        await measure("меню: общий кэш", args.users, cache.get)
+        await measure("заказ: orders/create", args.users, lambda: service.create_order(1, items))
+        print(f"Запросов к iiko: {server.requests}")
+    finally:
+        await close_iiko_clients()
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест интеграции iiko")
+    parser.add_argument("--users", type=int, default=200, help="одновременных пользователей")
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", dest="error_rate", type=float, default=0.0)
+    parser.add_argument("--token-ttl", dest="token_ttl", type=float, default=3600.0)
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.CRITICAL)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
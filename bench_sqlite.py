@@ -0,0 +1,117 @@
+"""
+Сравнение пропускной способности оформления заказов в SQLite:
+настройки по умолчанию, профиль с WAL, прагмами, одним писателем и пулом
+читателей, и тот же профиль с групповым commit.
+
+    python bench_sqlite.py --writers 50 --orders 20 --readers 10 --read-interval 0.05
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+from typing import List
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database.crud import add_order_with_outbox, create_order_with_outbox, ensure_user, get_orders_stats
+from database.models import Base
+from database.session import create_async_engines
+from database.writer import GroupCommitWriter
+
+logger = logging.getLogger(__name__)
+
+ITEMS = [
+    {"product_id": "product-1", "name": "Блюдо 1", "price": 350.0, "quantity": 2},
+    {"product_id": "product-2", "name": "Блюдо 2", "price": 120.5, "quantity": 1}
+]
+
+
+async def run_profile(name: str, tuned: bool, group_commit: bool, args) -> None:
+    """Запускает writers пишущих и readers читающих задач на чистой БД"""
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    writer, reader = create_async_engines(f"sqlite+aiosqlite:///{path}", tuned=tuned)
+    write_session = async_sessionmaker(bind=writer, class_=AsyncSession, expire_on_commit=False)
+    read_session = async_sessionmaker(bind=reader, class_=AsyncSession, expire_on_commit=False)
+
+    async with writer.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    group_writer = GroupCommitWriter(write_session)
+    if group_commit:
+        group_writer.start()
+
+    latencies: List[float] = []
+    errors = 0
+    reads = 0
+    writing = True
+
+    async def write(worker: int):
+        nonlocal errors
+        async with write_session() as session:
+            user = await ensure_user(session, 1000 + worker, f"Пользователь {worker}")
+        for _ in range(args.orders):
+            started = time.perf_counter()
+            try:
+                if group_commit:
+                    await group_writer.run(
+                        lambda session: add_order_with_outbox(session, user.id, ITEMS, "bench-org", {})
+                    )
+                else:
+                    async with write_session() as session:
+                        await create_order_with_outbox(session, user.id, ITEMS, "bench-org", {})
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    async def read():
+        nonlocal reads
+        while writing:
+            async with read_session() as session:
+                await get_orders_stats(session)
+            reads += 1
+            await asyncio.sleep(args.read_interval)
+
+    readers = [asyncio.create_task(read()) for _ in range(args.readers)]
+    started = time.perf_counter()
+    await asyncio.gather(*(write(i) for i in range(args.writers)))
+    elapsed = time.perf_counter() - started
+    writing = False
+    await asyncio.gather(*readers)
+
+    await group_writer.close()
+    await writer.dispose()
+    await reader.dispose()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    print(
+        f"{name:<10} {len(latencies) / elapsed:>9.1f} заказов/с   "
+        f"p50 {statistics.median(latencies) * 1000:>8.1f} ms   "
+        f"p95 {p95 * 1000:>8.1f} ms   чтений {reads / elapsed:>8.1f}/с   ошибок {errors}"
+    )
+
+
+async def run(args):
+    await run_profile("default", False, False, args)
+    await run_profile("tuned", True, False, args)
+    await run_profile("group", True, True, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест записи в SQLite")
+    parser.add_argument("--writers", type=int, default=50, help="одновременных пишущих задач")
+    parser.add_argument("--orders", type=int, default=20, help="заказов на задачу")
+    parser.add_argument("--readers", type=int, default=10, help="одновременных читающих задач")
+    parser.add_argument("--read-interval", dest="read_interval", type=float, default=0.05,
+                        help="пауза между чтениями одной задачи, с")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.CRITICAL)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
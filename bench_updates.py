@@ -0,0 +1,295 @@
+"""
+Нагрузочная проверка приема апдейтов: webhook против long polling.
+
+Бот работает против локальной замены Telegram Bot API, обработчик отвечает
+на каждое сообщение через sendMessage.
+
+    python bench_updates.py --updates 20000 --concurrency 100 --latency 0.005
+    python bench_updates.py --mode sharded --workers 4 --work 0.002
+
+В режиме sharded апдейты идут через ShardRouter в отдельные процессы-воркеры.
+--work добавляет обработчику CPU-нагрузку на каждый апдейт: масштабирование
+по воркерам видно только на хосте, где ядер не меньше, чем воркеров.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Any, Dict, List
+
+from aiogram import Bot, Dispatcher, F, types
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import ClientSession, web
+
+from services.sharding import ShardRouter
+from services.web_server import setup_telegram_webhook, start_web_server
+
+logger = logging.getLogger(__name__)
+
+BOT_TOKEN = "42:bench"
+SECRET_TOKEN = "bench-secret"
+
+
+def make_update(update_id: int) -> Dict[str, Any]:
+    """Текстовое сообщение от одного из 1000 пользователей"""
+    user_id = 1000 + update_id % 1000
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "text": "🍽 Меню"
+        }
+    }
+
+
+class FakeBotApi:
+    """Обработчики поддельного Bot API; getUpdates отдает заранее заданное число апдейтов"""
+
+    def __init__(self, updates: int, latency: float):
+        self.updates = updates
+        self.latency = latency
+        self.sent = 0
+
+    async def _respond(self, result: Any) -> web.Response:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        return web.json_response({"ok": True, "result": result})
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        form = await request.post()
+
+        if method == "getme":
+            return await self._respond({"id": 42, "is_bot": True, "first_name": "Bench", "username": "bench_bot"})
+        if method == "getupdates":
+            offset = max(int(form.get("offset") or 1), 1)
+            limit = int(form.get("limit") or 100)
+            last = min(offset + limit, self.updates + 1)
+            if offset > self.updates:
+                # как настоящий long polling: пустой ответ после таймаута
+                await asyncio.sleep(0.5)
+            return await self._respond([make_update(i) for i in range(offset, last)])
+        if method == "sendmessage":
+            self.sent += 1
+            return await self._respond({
+                "message_id": self.sent,
+                "date": int(time.time()),
+                "chat": {"id": int(form["chat_id"]), "type": "private"},
+                "text": form.get("text", "")
+            })
+        return await self._respond(True)
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+
+def burn_cpu(seconds: float):
+    """Имитация CPU-работы обработчика (разбор, рендеринг клавиатур)"""
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def create_dispatcher(updates: int, done: asyncio.Event, work: float = 0.0) -> Dispatcher:
+    dp = Dispatcher()
+    handled = 0
+
+    @dp.message(F.text)
+    async def echo(message: types.Message):
+        nonlocal handled
+        if work > 0:
+            burn_cpu(work)
+        await message.answer("Категории меню")
+        handled += 1
+        if handled >= updates:
+            done.set()
+
+    return dp
+
+
+def create_bot(api_port: int) -> Bot:
+    return Bot(
+        BOT_TOKEN,
+        session=AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{api_port}"))
+    )
+
+
+async def deliver_updates(url: str, updates: int, concurrency: int) -> float:
+    """Шлет апдейты так же, как Telegram: до concurrency параллельных POST; возвращает время"""
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET_TOKEN}
+    ids = iter(range(1, updates + 1))
+
+    async def deliver(http: ClientSession):
+        for update_id in ids:
+            # как и Telegram, повторяем доставку, пока бот не ответит 200
+            while True:
+                async with http.post(url, json=make_update(update_id), headers=headers) as response:
+                    await response.read()
+                if response.status == 200:
+                    break
+                await asyncio.sleep(0.1)
+
+    started = time.perf_counter()
+    async with ClientSession() as http:
+        await asyncio.gather(*(deliver(http) for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+def report(name: str, updates: int, elapsed: float, api: FakeBotApi) -> None:
+    print(f"{name:<10} {updates / elapsed:>9.1f} updates/s   {elapsed:>7.2f} s   ответов {api.sent}")
+
+
+async def bench_polling(args) -> None:
+    api = FakeBotApi(args.updates, args.latency)
+    api_runner = await start_web_server(api.create_app(), "127.0.0.1", args.api_port)
+    bot = create_bot(args.api_port)
+    done = asyncio.Event()
+    dp = create_dispatcher(args.updates, done, args.work)
+
+    try:
+        started = time.perf_counter()
+        polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False))
+        await done.wait()
+        report("polling", args.updates, time.perf_counter() - started, api)
+        await dp.stop_polling()
+        await polling
+    finally:
+        await bot.session.close()
+        await api_runner.cleanup()
+
+
+async def bench_webhook(args) -> None:
+    api = FakeBotApi(args.updates, args.latency)
+    api_runner = await start_web_server(api.create_app(), "127.0.0.1", args.api_port)
+    bot = create_bot(args.api_port)
+    done = asyncio.Event()
+    dp = create_dispatcher(args.updates, done, args.work)
+
+    app = web.Application()
+    setup_telegram_webhook(app, dp, bot, "/telegram/webhook", SECRET_TOKEN)
+    bot_runner = await start_web_server(app, "127.0.0.1", args.bot_port)
+
+    url = f"http://127.0.0.1:{args.bot_port}/telegram/webhook"
+    try:
+        async with ClientSession() as http:
+            async with http.post(url, json=make_update(0)) as response:
+                rejected = response.status == 401
+
+        started = time.perf_counter()
+        acked = await deliver_updates(url, args.updates, args.concurrency)
+        await done.wait()
+        report("webhook", args.updates, time.perf_counter() - started, api)
+        print(f"{'':<10} подтверждение всех POST за {acked:.2f} s, запрос без секрета отклонен: {rejected}")
+    finally:
+        await bot_runner.cleanup()
+        await bot.session.close()
+        await api_runner.cleanup()
+
+
+async def serve_worker(args):
+    """Процесс-воркер режима sharded: вебхук на порту bot_port + 1 + номер"""
+    bot = create_bot(args.api_port)
+    dp = create_dispatcher(args.updates, asyncio.Event(), args.work)
+    app = web.Application()
+    setup_telegram_webhook(app, dp, bot, "/telegram/webhook", SECRET_TOKEN)
+    runner = await start_web_server(app, "127.0.0.1", args.bot_port + 1 + args.serve_worker)
+
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        await bot.session.close()
+
+
+async def wait_ready(urls: List[str]):
+    """Ждет, пока HTTP-серверы воркеров начнут отвечать"""
+    async with ClientSession() as http:
+        for url in urls:
+            while True:
+                try:
+                    async with http.post(url + "/telegram/webhook", json={}) as response:
+                        await response.read()
+                    break
+                except OSError:
+                    await asyncio.sleep(0.1)
+
+
+async def bench_sharded(args):
+    api = FakeBotApi(args.updates, args.latency)
+    api_runner = await start_web_server(api.create_app(), "127.0.0.1", args.api_port)
+    workers = [
+        await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__),
+            "--serve-worker", str(i),
+            "--api-port", str(args.api_port),
+            "--bot-port", str(args.bot_port),
+            "--updates", str(args.updates),
+            "--work", str(args.work)
+        )
+        for i in range(args.workers)
+    ]
+    router = ShardRouter(
+        [f"http://127.0.0.1:{args.bot_port + 1 + i}" for i in range(args.workers)],
+        SECRET_TOKEN
+    )
+    app = web.Application()
+    router.setup(app, "/telegram/webhook")
+    router_runner = await start_web_server(app, "127.0.0.1", args.bot_port)
+
+    try:
+        await wait_ready(router.workers)
+        started = time.perf_counter()
+        await deliver_updates(f"http://127.0.0.1:{args.bot_port}/telegram/webhook", args.updates, args.concurrency)
+        while api.sent < args.updates:
+            await asyncio.sleep(0.01)
+        report(f"sharded x{args.workers}", args.updates, time.perf_counter() - started, api)
+    finally:
+        for worker in workers:
+            worker.terminate()
+        await asyncio.gather(*(worker.wait() for worker in workers))
+        await router_runner.cleanup()
+        await api_runner.cleanup()
+
+
+async def run(args):
+    if args.serve_worker is not None:
+        await serve_worker(args)
+        return
+    if args.mode in ("polling", "all"):
+        await bench_polling(args)
+    if args.mode in ("webhook", "all"):
+        await bench_webhook(args)
+    if args.mode in ("sharded", "all"):
+        await bench_sharded(args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест приема апдейтов Telegram")
+    parser.add_argument("--mode", choices=["polling", "webhook", "sharded", "all"], default="all")
+    parser.add_argument("--updates", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=100, help="параллельных POST (max_connections)")
+    parser.add_argument("--latency", type=float, default=0.005, help="задержка ответа Bot API, с")
+    parser.add_argument("--workers", type=int, default=2, help="процессов-воркеров в режиме sharded")
+    parser.add_argument("--work", type=float, default=0.0, help="CPU-работа обработчика на апдейт, с")
+    parser.add_argument("--serve-worker", dest="serve_worker", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--api-port", dest="api_port", type=int, default=8082)
+    parser.add_argument("--bot-port", dest="bot_port", type=int, default=8083)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.CRITICAL)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -29,12 +29,98 @@ class AppSettings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite:///database.db"
     DB_ECHO: bool = False
+    # Профиль SQLite: WAL и прагмы на каждом соединении, один писатель, пул читателей
+    SQLITE_TUNING: bool = True
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 20000
+    SQLITE_MMAP_SIZE: int = 134217728
+    SQLITE_READ_POOL_SIZE: int = 4
+    SQLITE_WRITE_TIMEOUT: float = 30.0
+    DB_GROUP_COMMIT_MAX_BATCH: int = 64
 
     # iikoCloud API
     IIKO_API_URL: str = "https://api-ru.iiko.services"
     IIKO_API_LOGIN: str
     IIKO_API_PASSWORD: str
     IIKO_ORG_ID: str
+    IIKO_HTTP_TIMEOUT: float = 15.0
+    IIKO_CONNECT_TIMEOUT: float = 5.0
+    IIKO_MAX_CONNECTIONS: int = 20
+    IIKO_MAX_CONCURRENCY: int = 10
+    IIKO_TOKEN_TTL: float = 3600.0
+    IIKO_TOKEN_REFRESH_MARGIN: float = 300.0
+    IIKO_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    IIKO_CIRCUIT_RECOVERY_TIMEOUT: float = 30.0
+    MENU_CACHE_TTL: float = 300.0
+    # При включенных вебхуках iiko меню обновляется по событиям, опрос - страховочный
+    MENU_CACHE_PUSH_TTL: float = 3600.0
+
+    # Корзины: запись в БД пачками раз в интервал, вытеснение неактивных из памяти
+    CART_FLUSH_INTERVAL: float = 2.0
+    CART_IDLE_TTL: float = 3600.0
+
+    # FSM: состояния в БД, запись пачками, вытеснение из памяти и удаление по TTL
+    FSM_FLUSH_INTERVAL: float = 1.0
+    FSM_CACHE_TTL: float = 3600.0
+    FSM_CACHE_SIZE: int = 10000
+    FSM_STATE_TTL: float = 604800.0
+
+    # Кэш пользователей в middleware
+    USER_CACHE_SIZE: int = 10000
+    USER_ACTIVITY_FLUSH_INTERVAL: float = 5.0
+    # Роль может смениться в другом воркере, поэтому запись кэша живет ограниченно
+    USER_CACHE_TTL: float = 300.0
+
+    # Ограничение нагрузки: частота на пользователя и одновременные обработчики
+    THROTTLE_RATE: float = 3.0
+    THROTTLE_BURST: int = 10
+    THROTTLE_MAX_IN_FLIGHT: int = 200
+    # Просмотр меню занимает не больше этой доли слотов, остальное - запас для заказов
+    THROTTLE_LOW_PRIORITY_SHARE: float = 0.8
+    THROTTLE_MAX_WAITING: int = 1000
+
+    # Исходящие сообщения: общий лимит и интервал между сообщениями в один чат.
+    # В режиме супервизора каждый воркер получает NOTIFY_GLOBAL_RATE / BOT_WORKERS
+    NOTIFY_GLOBAL_RATE: float = 25.0
+    NOTIFY_CHAT_INTERVAL: float = 1.0
+    NOTIFY_GROUP_CHAT_INTERVAL: float = 3.0
+    NOTIFY_MAX_ATTEMPTS: int = 3
+    NOTIFY_DRAIN_TIMEOUT: float = 5.0
+
+    # Рассылки: пачка получателей, период обновления отчета, аренда процессом
+    BROADCAST_BATCH_SIZE: int = 500
+    BROADCAST_PROGRESS_INTERVAL: float = 10.0
+    BROADCAST_LEASE_TTL: float = 120.0
+    BROADCAST_RESUME_INTERVAL: float = 30.0
+
+    # Получение апдейтов Telegram: polling (для разработки) или webhook
+    BOT_MODE: str = "polling"
+    # Публичный https-адрес бота, например https://bot.example.com
+    BOT_WEBHOOK_URL: Optional[str] = None
+    BOT_WEBHOOK_PATH: str = "/telegram/webhook"
+    BOT_WEBHOOK_SECRET: Optional[str] = None
+    BOT_WEBHOOK_MAX_CONNECTIONS: int = 100
+    # Больше одного воркера: супервизор раздает апдейты процессам по id пользователя
+    BOT_WORKERS: int = 1
+    BOT_WORKER_BASE_PORT: int = 8090
+    # Номер воркера; задается супервизором
+    BOT_WORKER_ID: Optional[int] = None
+
+    # HTTP-сервер (вебхуки Telegram и iiko, метрики)
+    WEB_SERVER_HOST: str = "0.0.0.0"
+    WEB_SERVER_PORT: int = 8080
+    IIKO_WEBHOOK_PATH: str = "/iiko/webhook"
+    IIKO_WEBHOOK_TOKEN: Optional[str] = None
+
+    # Очередь отправки заказов в iiko
+    ORDER_QUEUE_WORKERS: int = 4
+    ORDER_QUEUE_BATCH_SIZE: int = 20
+    ORDER_QUEUE_CONCURRENCY: int = 5
+    ORDER_QUEUE_MAX_ATTEMPTS: int = 8
+    ORDER_QUEUE_RETRY_BASE: float = 2.0
+    ORDER_QUEUE_RETRY_MAX: float = 300.0
+    ORDER_QUEUE_POLL_INTERVAL: float = 5.0
 
     # Logging
     LOG_LEVEL: str = "INFO"
@@ -60,6 +146,14 @@ class AppSettings(BaseSettings):
                 raise ValueError("ADMIN_IDS должен содержать только числа")
         return value or []
 
+    @field_validator('BOT_MODE', mode='before')
+    @classmethod
+    def parse_bot_mode(cls, value):
+        value = (value or "polling").lower()
+        if value not in ("polling", "webhook"):
+            raise ValueError("BOT_MODE должен быть polling или webhook")
+        return value
+
     @field_validator('DB_ECHO', mode='before')
     @classmethod
     def parse_db_echo(cls, value):
@@ -80,6 +174,12 @@ def load_config() -> AppSettings:
         if not all([config.IIKO_API_LOGIN, config.IIKO_API_PASSWORD, config.IIKO_ORG_ID]):
             raise ValueError("Не все обязательные параметры для iiko API указаны")
 
+        if config.BOT_MODE == "webhook" and not (config.BOT_WEBHOOK_URL and config.BOT_WEBHOOK_SECRET):
+            raise ValueError("Для BOT_MODE=webhook нужны BOT_WEBHOOK_URL и BOT_WEBHOOK_SECRET")
+
+        if config.BOT_WORKERS > 1 and config.BOT_MODE != "webhook":
+            raise ValueError("Несколько воркеров (BOT_WORKERS) работают только с BOT_MODE=webhook")
+
         # Настройка логирования
         if config.LOG_FILE:
             file_handler = logging.FileHandler(config.LOG_FILE, encoding='utf-8')
@@ -1,20 +1,29 @@
 from .session import (
     sync_engine,
     async_engine,
+    async_read_engine,
     SessionLocal,
     AsyncSessionLocal,
+    AsyncReadSessionLocal,
     get_db,
     async_get_db,
     Base
 )
-from .models import User, Order, UserRole, MenuCategory, MenuItem
+from .models import User, Order, OrderOutbox, Broadcast, DailyOrderStats, UserRole, MenuCategory, MenuItem
 from .crud import (
     get_user_by_id,
     get_or_create_user,
+    ensure_user,
+    find_user_role,
+    touch_users,
     update_user_role,
     search_users,
     create_order,
+    create_order_with_outbox,
+    add_order_with_outbox,
     get_orders_stats,
+    get_daily_order_stats,
+    rebuild_daily_order_stats,
     get_menu_categories,
     update_menu_item
 )
@@ -23,21 +32,33 @@ __all__ = [
     'Base',
     'User',
     'Order',
+    'OrderOutbox',
+    'Broadcast',
+    'DailyOrderStats',
     'UserRole',
     'MenuCategory',
     'MenuItem',
     'sync_engine',
     'async_engine',
+    'async_read_engine',
     'SessionLocal',
     'AsyncSessionLocal',
+    'AsyncReadSessionLocal',
     'get_db',
     'async_get_db',
     'get_user_by_id',
     'get_or_create_user',
+    'ensure_user',
+    'find_user_role',
+    'touch_users',
     'update_user_role',
     'search_users',
     'create_order',
+    'create_order_with_outbox',
+    'add_order_with_outbox',
     'get_orders_stats',
+    'get_daily_order_stats',
+    'rebuild_daily_order_stats',
     'get_menu_categories',
     'update_menu_item'
 ]
\ No newline at end of file
@@ -1,26 +1,187 @@
-from typing import Optional, List, Dict
-from dataclasses import dataclass
+import asyncio
+import logging
+import time
+from typing import Optional, List, Dict, Set
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import select, delete
+
+from config.config import settings
+from .crud import dialect_insert
+from .models import UserCart
+from .session import AsyncSessionLocal, AsyncReadSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class CartItem:
+    """Позиция корзины; цена хранится в копейках"""
+    __slots__ = ("product_id", "name", "price", "quantity")
+
+    def __init__(self, product_id: str, name: str, price: int, quantity: int):
+        self.product_id = product_id
+        self.name = name
+        self.price = price
+        self.quantity = quantity
+
+    @property
+    def total(self) -> int:
+        return self.price * self.quantity
+
+    def to_dict(self) -> Dict:
+        """Представление для таблицы carts (цена в копейках)"""
+        return {
+            "product_id": self.product_id,
+            "name": self.name,
+            "price": self.price,
+            "quantity": self.quantity
+        }
+
+    def to_order_item(self) -> Dict:
+        """Позиция для orders.items (цена в рублях, как раньше)"""
+        return {
+            "product_id": self.product_id,
+            "name": self.name,
+            "price": self.price / 100,
+            "quantity": self.quantity
+        }
 
 
 @dataclass
 class Cart:
     user_id: int
-    items: List[Dict]
+    items: List[CartItem]
+    touched_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def total(self) -> int:
+        """Сумма корзины в копейках"""
+        return sum(item.total for item in self.items)
 
 
 class CartRepository:
+    """
+    Корзины живут в памяти процесса, изменения пишутся в таблицу carts
+    пачками раз в flush_interval секунд. После перезапуска корзина
+    подгружается из БД при первом обращении.
+    """
+
+    def __init__(self, flush_interval: Optional[float] = None, idle_ttl: Optional[float] = None):
+        self.flush_interval = flush_interval or settings.CART_FLUSH_INTERVAL
+        self.idle_ttl = idle_ttl or settings.CART_IDLE_TTL
+        self._carts: Dict[int, Cart] = {}
+        self._dirty: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+
     async def get_cart(self, user_id: int) -> Optional[Cart]:
         """Получает корзину пользователя"""
-        pass
+        cart = self._carts.get(user_id)
+        if cart is None:
+            cart = await self._load(user_id)
+        cart.touched_at = time.monotonic()
+        return cart
+
+    async def _load(self, user_id: int) -> Cart:
+        async with AsyncReadSessionLocal() as session:
+            items = await session.scalar(
+                select(UserCart.items).where(UserCart.user_id == user_id)
+            )
+        loaded = Cart(user_id=user_id, items=[CartItem(**item) for item in items or []])
+        # пока шла загрузка, корзину мог создать параллельный запрос
+        return self._carts.setdefault(user_id, loaded)
 
     async def add_item(self, user_id: int, product_id: str, name: str, price: float, quantity: int):
-        """Добавляет товар в корзину"""
-        pass
+        """Добавляет товар в корзину (price - в рублях)"""
+        cart = await self.get_cart(user_id)
+        for item in cart.items:
+            if item.product_id == product_id:
+                item.quantity += quantity
+                break
+        else:
+            cart.items.append(CartItem(product_id, name, int(round(price * 100)), quantity))
+        self._dirty.add(user_id)
 
     async def remove_item(self, user_id: int, item_id: str):
         """Удаляет товар из корзины"""
-        pass
+        cart = await self.get_cart(user_id)
+        cart.items = [item for item in cart.items if item.product_id != item_id]
+        self._dirty.add(user_id)
 
     async def clear_cart(self, user_id: int):
         """Очищает корзину"""
-        pass
\ No newline at end of file
+        cart = await self.get_cart(user_id)
+        cart.items = []
+        self._dirty.add(user_id)
+
+    async def flush(self):
+        """Записывает все измененные корзины одной транзакцией"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+
+        carts = [self._carts[user_id] for user_id in dirty if user_id in self._carts]
+        filled = [cart for cart in carts if cart.items]
+        emptied = [cart.user_id for cart in carts if not cart.items]
+
+        try:
+            async with AsyncSessionLocal() as session:
+                if filled:
+                    stmt = dialect_insert(session, UserCart)
+                    await session.execute(
+                        stmt.on_conflict_do_update(
+                            index_elements=[UserCart.user_id],
+                            set_={"items": stmt.excluded["items"], "updated_at": stmt.excluded.updated_at}
+                        ),
+                        [
+                            {
+                                "user_id": cart.user_id,
+                                "items": [item.to_dict() for item in cart.items],
+                                "updated_at": datetime.utcnow()
+                            }
+                            for cart in filled
+                        ]
+                    )
+                if emptied:
+                    await session.execute(delete(UserCart).where(UserCart.user_id.in_(emptied)))
+                await session.commit()
+        except BaseException as e:
+            # не потерять изменения (и при отмене посреди записи): вернем корзины в очередь
+            self._dirty |= dirty
+            if isinstance(e, Exception):
+                logger.error(f"Ошибка записи корзин: {e}")
+            raise
+
+    def _evict_idle(self):
+        """Убирает из памяти давно не использованные и уже сохраненные корзины"""
+        deadline = time.monotonic() - self.idle_ttl
+        for user_id in [
+            user_id for user_id, cart in self._carts.items()
+            if cart.touched_at < deadline and user_id not in self._dirty
+        ]:
+            del self._carts[user_id]
+
+    def start(self):
+        """Запускает фоновую запись корзин"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                self._evict_idle()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка фоновой записи корзин: {e}")
+
+    async def close(self):
+        """Останавливает фоновую запись и сохраняет оставшиеся изменения"""
+        if self._task is not None:
+            self._task.cancel()
+            # дождемся отмены: прерванная запись вернет свои корзины в _dirty
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
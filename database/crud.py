@@ -1,13 +1,123 @@
-from sqlalchemy import select, update, delete, or_, and_, func
+from sqlalchemy import select, update, delete, or_, and_, func, bindparam, text, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
 from sqlalchemy.orm import selectinload
-from .models import User, Order, UserRole, MenuCategory, MenuItem
-from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
+from .models import User, Order, OrderOutbox, DailyOrderStats, UserRole, MenuCategory, MenuItem, normalize_phone
+from datetime import datetime, timedelta, date
+from typing import List, Optional, Dict, Any, Iterable, Tuple
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+# Заказы, которые еще не завершены и не отменены
+ACTIVE_ORDER_STATUSES = ("created", "accepted", "cooking", "ready", "delivering")
+
+# Порядок статусов: заказ движется только вперед, опоздавшие события iiko его не откатывают.
+# completed и cancelled - конечные, друг друга не заменяют
+ORDER_STATUS_RANK = {
+    "created": 0,
+    "failed": 1,
+    "accepted": 2,
+    "cooking": 3,
+    "ready": 4,
+    "delivering": 5,
+    "completed": 6,
+    "cancelled": 6,
+}
+
+
+def status_advances(current: Optional[str], status: str) -> bool:
+    """Переход из current в status - движение заказа вперед"""
+    return ORDER_STATUS_RANK.get(status, -1) > ORDER_STATUS_RANK.get(current, -1)
+
+
+def order_total(items: List[Dict[str, Any]]) -> int:
+    """Сумма позиций заказа в копейках (цены позиций - в рублях)"""
+    return sum(int(round(item['price'] * 100)) * item['quantity'] for item in items)
+
+
+def dialect_insert(session: AsyncSession, model):
+    """INSERT с поддержкой ON CONFLICT для текущего диалекта (SQLite или PostgreSQL)"""
+    if session.bind.dialect.name == "postgresql":
+        return postgresql_insert(model)
+    return sqlite_insert(model)
+
+
+# Daily Order Stats
+RollupDeltas = Dict[Tuple[date, str], List[int]]
+
+
+def _rollup_add(deltas: RollupDeltas, order: Any, status: str, sign: int = 1):
+    """Добавляет заказ (или вычитает при sign=-1) в корзину сводки день/статус"""
+    bucket = deltas.setdefault((order.created_at.date(), status), [0, 0, 0])
+    bucket[0] += sign
+    bucket[1] += sign * (order.total or 0)
+    bucket[2] += sign * sum(item.get('quantity', 0) for item in order.items or [])
+
+
+async def _apply_rollup(session: AsyncSession, deltas: RollupDeltas):
+    """Применяет изменения сводки одним upsert (без commit)"""
+    rows = [
+        {"day": day, "status": status, "orders_count": count, "revenue": revenue, "items_count": items}
+        for (day, status), (count, revenue, items) in deltas.items()
+        if count or revenue or items
+    ]
+    if not rows:
+        return
+    stmt = dialect_insert(session, DailyOrderStats)
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[DailyOrderStats.day, DailyOrderStats.status],
+            set_={
+                column: getattr(DailyOrderStats, column) + stmt.excluded[column]
+                for column in ("orders_count", "revenue", "items_count")
+            }
+        ),
+        rows
+    )
+
+
+async def change_orders_status(
+        session: AsyncSession,
+        order_ids: Iterable[int],
+        status: str,
+        only_from: Optional[Iterable[str]] = None
+) -> int:
+    """
+    Переводит заказы в новый статус и переносит их в сводке (без commit,
+    чтобы вызывающий код закрепил изменения своей транзакцией).
+    only_from - статусы, из которых разрешен переход.
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return 0
+    query = (
+        select(Order.id, Order.status, Order.created_at, Order.total, Order.items)
+        .where(Order.id.in_(order_ids), Order.status != status)
+        .with_for_update()
+    )
+    if only_from is not None:
+        query = query.where(Order.status.in_(list(only_from)))
+    orders = (await session.execute(query)).all()
+    if not orders:
+        return 0
+
+    deltas: RollupDeltas = {}
+    for order in orders:
+        _rollup_add(deltas, order, order.status, -1)
+        _rollup_add(deltas, order, status)
+
+    await session.execute(
+        update(Order)
+        .where(Order.id.in_([order.id for order in orders]))
+        .values(status=status, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    await _apply_rollup(session, deltas)
+    return len(orders)
+
 
 # User CRUD Operations
 async def get_user_by_id(session: AsyncSession, user_id: int) -> Optional[User]:
@@ -49,6 +159,72 @@ async def get_or_create_user(
         raise
 
 
+async def find_user_role(session: AsyncSession, telegram_id: int) -> Any:
+    """Возвращает (id, role) пользователя или None; только чтение"""
+    try:
+        return (await session.execute(
+            select(User.id, User.role).where(User.telegram_id == telegram_id)
+        )).first()
+    except Exception as e:
+        logger.error(f"Error in find_user_role: {e}")
+        raise
+
+
+async def ensure_user(
+        session: AsyncSession,
+        telegram_id: int,
+        full_name: str
+) -> Any:
+    """
+    Возвращает (id, role) пользователя, создавая его при первом обращении
+    через INSERT ... ON CONFLICT DO NOTHING (без гонки между параллельными апдейтами).
+    """
+    try:
+        query = select(User.id, User.role).where(User.telegram_id == telegram_id)
+        row = (await session.execute(query)).first()
+        if row is None:
+            now = datetime.utcnow()
+            await session.execute(
+                dialect_insert(session, User)
+                .values(
+                    telegram_id=telegram_id,
+                    full_name=full_name,
+                    role=UserRole.CUSTOMER,
+                    created_at=now,
+                    last_activity=now
+                )
+                .on_conflict_do_nothing(index_elements=[User.telegram_id])
+            )
+            await session.commit()
+            row = (await session.execute(query)).one()
+        return row
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Error in ensure_user: {e}")
+        raise
+
+
+async def touch_users(session: AsyncSession, activity: Dict[int, datetime]) -> None:
+    """
+    Записывает last_activity пачки пользователей одним executemany (ключ - users.id).
+    Написавший боту пользователь снова доступен для рассылок.
+    """
+    if not activity:
+        return
+    try:
+        await session.execute(
+            update(User.__table__)
+            .where(User.__table__.c.id == bindparam("b_id"))
+            .values(last_activity=bindparam("b_last_activity"), bot_blocked_at=None),
+            [{"b_id": user_id, "b_last_activity": ts} for user_id, ts in activity.items()]
+        )
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Error in touch_users: {e}")
+        raise
+
+
 async def update_user_role(
         session: AsyncSession,
         user_id: int,
@@ -68,22 +244,61 @@ async def update_user_role(
         return None
 
 
+def _prefix_range(column, prefix: str):
+    """Поиск по префиксу через диапазон, чтобы использовался индекс"""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(column >= prefix, column < upper)
+
+
+def _fts_query(search_query: str) -> str:
+    """Запрос FTS5: каждое слово ищется по префиксу"""
+    words = re.findall(r"\w+", search_query)
+    return " ".join(f'"{word}"*' for word in words)
+
+
 async def search_users(
         session: AsyncSession,
         search_query: str,
         limit: int = 50
 ) -> List[User]:
-    """Поиск пользователей по ID, имени или телефону"""
+    """
+    Поиск пользователей по индексам:
+    число - точное совпадение telegram_id или префикс телефона,
+    телефон (+7 (900) ...) - префикс нормализованных цифр,
+    текст - полнотекстовый поиск по имени (FTS5 в SQLite).
+    """
     try:
+        search_query = search_query.strip()
+        if not search_query:
+            return []
+
+        conditions = []
+        if search_query.isdigit():
+            conditions.append(User.telegram_id == int(search_query))
+
+        if re.fullmatch(r"[\d\s()+\-]+", search_query):
+            digits = normalize_phone(search_query)
+            if digits and len(digits) >= 3:
+                conditions.append(_prefix_range(User.phone_digits, digits))
+                if digits.startswith("8"):
+                    # неполный номер, набранный через 8
+                    conditions.append(_prefix_range(User.phone_digits, "7" + digits[1:]))
+        elif session.bind.dialect.name == "sqlite":
+            match = _fts_query(search_query)
+            if match:
+                conditions.append(User.id.in_(
+                    text("SELECT rowid FROM users_fts WHERE users_fts MATCH :match LIMIT :limit")
+                    .bindparams(match=match, limit=limit)
+                ))
+        else:
+            conditions.append(User.full_name.ilike(f"{search_query}%"))
+
+        if not conditions:
+            return []
+
         result = await session.execute(
             select(User)
-            .where(
-                or_(
-                    User.telegram_id.cast(String).ilike(f"%{search_query}%"),
-                    User.full_name.ilike(f"%{search_query}%"),
-                    User.phone.ilike(f"%{search_query}%")
-                )
-            )
+            .where(or_(*conditions))
             .limit(limit)
         )
         return result.scalars().all()
@@ -104,9 +319,14 @@ async def create_order(
         order = Order(
             user_id=user_id,
             items=items,
-            status=status
+            status=status,
+            total=order_total(items),
+            created_at=datetime.utcnow()
         )
         session.add(order)
+        deltas: RollupDeltas = {}
+        _rollup_add(deltas, order, status)
+        await _apply_rollup(session, deltas)
         await session.commit()
         await session.refresh(order)
         return order
@@ -116,59 +336,264 @@ async def create_order(
         raise
 
 
+async def add_order_with_outbox(
+        session: AsyncSession,
+        user_id: int,
+        items: List[Dict[str, Any]],
+        organization_id: str,
+        payload: Dict[str, Any]
+) -> Order:
+    """Добавляет заказ, его строку в сводке и задачу на отправку в iiko (без commit)"""
+    order = Order(
+        user_id=user_id,
+        items=items,
+        status="created",
+        total=order_total(items),
+        created_at=datetime.utcnow()
+    )
+    session.add(order)
+    await session.flush()
+
+    deltas: RollupDeltas = {}
+    _rollup_add(deltas, order, "created")
+    await _apply_rollup(session, deltas)
+
+    # Номер заказа в боте передается в iiko, чтобы сопоставлять события вебхуков
+    session.add(OrderOutbox(
+        order_id=order.id,
+        organization_id=organization_id,
+        payload={**payload, "externalNumber": str(order.id)}
+    ))
+    await session.flush()
+    return order
+
+
+async def create_order_with_outbox(
+        session: AsyncSession,
+        user_id: int,
+        items: List[Dict[str, Any]],
+        organization_id: str,
+        payload: Dict[str, Any]
+) -> Order:
+    """Создает заказ и задачу на его отправку в iiko в одной транзакции"""
+    try:
+        order = await add_order_with_outbox(session, user_id, items, organization_id, payload)
+        await session.commit()
+        return order
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Error in create_order_with_outbox: {e}")
+        raise
+
+
+async def get_user_orders_page(
+        session: AsyncSession,
+        user_id: int,
+        limit: int = 5,
+        older_than: Optional[Tuple[datetime, int]] = None,
+        newer_than: Optional[Tuple[datetime, int]] = None
+) -> Tuple[List[Any], bool]:
+    """
+    Страница заказов пользователя от новых к старым с keyset-пагинацией
+    по (created_at, id) - без OFFSET, по индексу ix_orders_user_id_created_at.
+    Позиции заказа не загружаются, только их количество.
+
+    Возвращает (строки id/status/total/created_at/items_count, есть ли еще
+    заказы в направлении листания).
+    """
+    try:
+        key = tuple_(Order.created_at, Order.id)
+        query = select(
+            Order.id,
+            Order.status,
+            Order.total,
+            Order.created_at,
+            func.json_array_length(Order.items).label("items_count")
+        ).where(Order.user_id == user_id)
+
+        if newer_than is not None:
+            query = query.where(key > tuple_(*newer_than)).order_by(Order.created_at, Order.id)
+        else:
+            if older_than is not None:
+                query = query.where(key < tuple_(*older_than))
+            query = query.order_by(Order.created_at.desc(), Order.id.desc())
+
+        rows = (await session.execute(query.limit(limit + 1))).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if newer_than is not None:
+            rows.reverse()
+        return rows, has_more
+    except Exception as e:
+        logger.error(f"Error in get_user_orders_page: {e}")
+        return [], False
+
+
+async def apply_order_status_updates(
+        session: AsyncSession,
+        updates: List[Dict[str, Any]]
+) -> int:
+    """
+    Применяет пачку статусов заказов из iiko одним executemany
+    и переносит изменившиеся заказы в сводке по дням. Статусы, которые
+    вернули бы заказ назад (события пришли не по порядку), пропускаются.
+
+    Каждый элемент: iiko_order_id, order_id (номер заказа в боте или None), status.
+    """
+    if not updates:
+        return 0
+    try:
+        iiko_ids = [item["iiko_order_id"] for item in updates]
+        order_ids = [item["order_id"] for item in updates if item.get("order_id") is not None]
+        orders = (await session.execute(
+            select(Order.id, Order.iiko_order_id, Order.status, Order.created_at, Order.total, Order.items)
+            .where(or_(Order.iiko_order_id.in_(iiko_ids), Order.id.in_(order_ids)))
+            .with_for_update()
+        )).all()
+        by_iiko_id = {order.iiko_order_id: order for order in orders if order.iiko_order_id}
+        by_id = {order.id: order for order in orders}
+
+        # самый продвинутый статус каждого заказа в пачке
+        changes: Dict[int, Dict[str, Any]] = {}
+        for item in updates:
+            order = by_iiko_id.get(item["iiko_order_id"]) or by_id.get(item.get("order_id"))
+            if order is None:
+                continue
+            by_iiko_id[item["iiko_order_id"]] = order
+            current = changes[order.id]["status"] if order.id in changes else order.status
+            if status_advances(current, item["status"]):
+                changes[order.id] = {"order": order, **item}
+
+        if not changes:
+            return 0
+
+        now = datetime.utcnow()
+        await session.execute(
+            update(Order.__table__)
+            .where(Order.__table__.c.id == bindparam("b_order_id"))
+            .values(
+                status=bindparam("b_status"),
+                iiko_order_id=bindparam("b_iiko_order_id"),
+                updated_at=now
+            ),
+            [
+                {
+                    "b_order_id": order_id,
+                    "b_iiko_order_id": change["iiko_order_id"],
+                    "b_status": change["status"]
+                }
+                for order_id, change in changes.items()
+            ]
+        )
+
+        deltas: RollupDeltas = {}
+        for change in changes.values():
+            order = change["order"]
+            if order.status != change["status"]:
+                _rollup_add(deltas, order, order.status, -1)
+                _rollup_add(deltas, order, change["status"])
+        await _apply_rollup(session, deltas)
+
+        await session.commit()
+        return len(changes)
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Error in apply_order_status_updates: {e}")
+        raise
+
+
 async def get_orders_stats(
         session: AsyncSession,
         days: int = 7
 ) -> Dict[str, Any]:
-    """Возвращает статистику заказов за последние N дней"""
+    """
+    Возвращает статистику заказов за последние N календарных дней (включая сегодня).
+
+    Заказы за период и выручка берутся из сводки daily_order_stats (строк - дни
+    периода на число статусов), активные заказы - по индексу (status, created_at).
+    Стоимость запроса не зависит от общего числа заказов.
+    Выручка - сумма завершенных заказов в копейках.
+    """
+    empty = {
+        "total_users": 0,
+        "total_orders": 0,
+        "completed_orders": 0,
+        "active_orders": 0,
+        "weekly_orders": 0,
+        "total_revenue": 0
+    }
     try:
-        date_from = datetime.utcnow() - timedelta(days=days)
+        today = datetime.utcnow().date()
+        period_start = today - timedelta(days=days - 1)
+        week_start = today - timedelta(days=6)
+        completed = DailyOrderStats.status == "completed"
 
-        # Получаем общее количество заказов
-        total_orders = await session.scalar(
-            select(func.count(Order.id))
-            .where(Order.created_at >= date_from)
-        )
+        period = select(
+            func.sum(DailyOrderStats.orders_count).label("total_orders"),
+            func.sum(DailyOrderStats.orders_count).filter(completed).label("completed_orders"),
+            func.sum(DailyOrderStats.revenue).filter(completed).label("total_revenue")
+        ).where(DailyOrderStats.day >= period_start).subquery()
 
-        # Получаем количество завершенных заказов
-        completed_orders = await session.scalar(
-            select(func.count(Order.id))
-            .where(
-                and_(
-                    Order.created_at >= date_from,
-                    Order.status == "completed"
-                )
+        row = (await session.execute(
+            select(
+                select(func.count(User.id)).scalar_subquery().label("total_users"),
+                period.c.total_orders,
+                period.c.completed_orders,
+                select(func.count(Order.id)).where(
+                    Order.status.in_(ACTIVE_ORDER_STATUSES)
+                ).scalar_subquery().label("active_orders"),
+                select(func.sum(DailyOrderStats.orders_count)).where(
+                    DailyOrderStats.day >= week_start
+                ).scalar_subquery().label("weekly_orders"),
+                period.c.total_revenue
             )
-        )
+        )).one()
 
-        # Получаем общую выручку
-        orders = await session.execute(
-            select(Order)
-            .where(
-                and_(
-                    Order.created_at >= date_from,
-                    Order.status == "completed"
-                )
-            )
+        return {key: row._mapping[key] or 0 for key in empty}
+    except Exception as e:
+        logger.error(f"Error in get_orders_stats: {e}")
+        return empty
+
+
+async def get_daily_order_stats(
+        session: AsyncSession,
+        date_from: date,
+        date_to: Optional[date] = None
+) -> List[DailyOrderStats]:
+    """Строки сводки заказов за период (включительно), по возрастанию дня"""
+    try:
+        query = select(DailyOrderStats).where(DailyOrderStats.day >= date_from)
+        if date_to is not None:
+            query = query.where(DailyOrderStats.day <= date_to)
+        result = await session.execute(
+            query.order_by(DailyOrderStats.day, DailyOrderStats.status)
         )
+        return result.scalars().all()
+    except Exception as e:
+        logger.error(f"Error in get_daily_order_stats: {e}")
+        return []
+
 
-        total_revenue = sum(
-            sum(item['price'] * item['quantity'] for item in order.items)
-            for order in orders.scalars()
+async def rebuild_daily_order_stats(session: AsyncSession, batch_size: int = 1000) -> int:
+    """Пересчитывает сводку по всем заказам (для уже существующих данных)"""
+    try:
+        deltas: RollupDeltas = {}
+        result = await session.stream(
+            select(Order.status, Order.created_at, Order.total, Order.items)
+            .execution_options(yield_per=batch_size)
         )
+        async for order in result:
+            if order.created_at is not None:
+                _rollup_add(deltas, order, order.status or "created")
 
-        return {
-            "total_orders": total_orders or 0,
-            "completed_orders": completed_orders or 0,
-            "total_revenue": total_revenue or 0
-        }
+        await session.execute(delete(DailyOrderStats))
+        await _apply_rollup(session, deltas)
+        await session.commit()
+        return len(deltas)
     except Exception as e:
-        logger.error(f"Error in get_orders_stats: {e}")
-        return {
-            "total_orders": 0,
-            "completed_orders": 0,
-            "total_revenue": 0
-        }
+        await session.rollback()
+        logger.error(f"Error in rebuild_daily_order_stats: {e}")
+        raise
 
 
 # Admin Menu Management
@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import pickle
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Set
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from sqlalchemy import select, delete
+
+from config.config import settings
+from .crud import dialect_insert
+from .models import FSMRecord
+from .session import AsyncSessionLocal, AsyncReadSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class _Record:
+    __slots__ = ("state", "data", "touched_at")
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any]):
+        self.state = state
+        self.data = data
+        self.touched_at = time.monotonic()
+
+
+class DatabaseStorage(BaseStorage):
+    """
+    FSM-хранилище aiogram в таблице fsm_states.
+
+    Чтение и запись идут через кэш в памяти с той же скоростью, что и у
+    MemoryStorage; измененные ключи пишутся в БД одной транзакцией раз в
+    flush_interval секунд (и при остановке). Данные сериализуются pickle.
+    В памяти не больше cache_size записей (LRU), неактивные вытесняются
+    через cache_ttl; записанные ключи при следующем обращении читаются из БД.
+    Из БД записи удаляются через state_ttl.
+    """
+
+    def __init__(
+            self,
+            key_builder: Optional[KeyBuilder] = None,
+            flush_interval: Optional[float] = None,
+            cache_ttl: Optional[float] = None,
+            state_ttl: Optional[float] = None,
+            cache_size: Optional[int] = None
+    ):
+        self.key_builder = key_builder or DefaultKeyBuilder(
+            with_bot_id=True,
+            with_business_connection_id=True,
+            with_destiny=True
+        )
+        self.flush_interval = flush_interval or settings.FSM_FLUSH_INTERVAL
+        self.cache_ttl = cache_ttl or settings.FSM_CACHE_TTL
+        self.state_ttl = state_ttl or settings.FSM_STATE_TTL
+        self.cache_size = cache_size or settings.FSM_CACHE_SIZE
+        self._records: "OrderedDict[StorageKey, _Record]" = OrderedDict()
+        self._dirty: Set[StorageKey] = set()
+        # ключи, которые сейчас пишутся в БД
+        self._flushing: Set[StorageKey] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _record(self, key: StorageKey) -> _Record:
+        record = self._records.get(key)
+        if record is None:
+            record = await self._load(key)
+            self._evict(key)
+        else:
+            self._records.move_to_end(key)
+        record.touched_at = time.monotonic()
+        return record
+
+    def _evict(self, keep: StorageKey):
+        """Вытесняет давно не использованные записи сверх cache_size; несохраненные и keep остаются"""
+        excess = len(self._records) - self.cache_size
+        if excess <= 0:
+            return
+        victims = []
+        for key in self._records:
+            if key != keep and key not in self._dirty and key not in self._flushing:
+                victims.append(key)
+                if len(victims) == excess:
+                    break
+        for key in victims:
+            del self._records[key]
+
+    async def _load(self, key: StorageKey) -> _Record:
+        async with AsyncReadSessionLocal() as session:
+            row = (await session.execute(
+                select(FSMRecord.state, FSMRecord.data, FSMRecord.updated_at)
+                .where(FSMRecord.key == self.key_builder.build(key))
+            )).first()
+
+        record = _Record(None, {})
+        if row is not None and row.updated_at >= datetime.utcnow() - timedelta(seconds=self.state_ttl):
+            record = _Record(row.state, pickle.loads(row.data) if row.data else {})
+        # пока шла загрузка, запись мог создать параллельный апдейт
+        return self._records.setdefault(key, record)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._dirty.add(key)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._record(key)
+        record.data = data.copy()
+        self._dirty.add(key)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._record(key)).data.copy()
+
+    async def flush(self):
+        """Записывает измененные ключи одной транзакцией"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        self._flushing = dirty
+
+        now = datetime.utcnow()
+        upserts = []
+        deletes = []
+        for key in dirty:
+            record = self._records.get(key)
+            if record is None:
+                continue
+            if record.state is None and not record.data:
+                deletes.append(self.key_builder.build(key))
+            else:
+                upserts.append({
+                    "key": self.key_builder.build(key),
+                    "state": record.state,
+                    "data": pickle.dumps(record.data, protocol=pickle.HIGHEST_PROTOCOL) if record.data else None,
+                    "updated_at": now
+                })
+
+        try:
+            async with AsyncSessionLocal() as session:
+                if upserts:
+                    stmt = dialect_insert(session, FSMRecord)
+                    await session.execute(
+                        stmt.on_conflict_do_update(
+                            index_elements=[FSMRecord.key],
+                            set_={
+                                "state": stmt.excluded.state,
+                                "data": stmt.excluded.data,
+                                "updated_at": stmt.excluded.updated_at
+                            }
+                        ),
+                        upserts
+                    )
+                if deletes:
+                    await session.execute(delete(FSMRecord).where(FSMRecord.key.in_(deletes)))
+                await session.commit()
+        except BaseException as e:
+            # не потерять изменения (и при отмене посреди записи): вернем ключи в очередь
+            self._dirty |= dirty
+            if isinstance(e, Exception):
+                logger.error(f"Ошибка записи состояний FSM: {e}")
+            raise
+        finally:
+            self._flushing = set()
+
+    async def expire(self):
+        """Вытесняет неактивные записи из памяти и удаляет устаревшие из БД"""
+        deadline = time.monotonic() - self.cache_ttl
+        for key in [
+            key for key, record in self._records.items()
+            if record.touched_at < deadline and key not in self._dirty
+        ]:
+            del self._records[key]
+
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                delete(FSMRecord)
+                .where(FSMRecord.updated_at < datetime.utcnow() - timedelta(seconds=self.state_ttl))
+            )
+            await session.commit()
+
+    def start(self):
+        """Запускает фоновую запись и очистку"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        expire_every = max(1, int(self.cache_ttl / self.flush_interval / 10))
+        ticks = 0
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            ticks += 1
+            try:
+                await self.flush()
+                if ticks % expire_every == 0:
+                    await self.expire()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка фоновой записи состояний FSM: {e}")
+
+    async def close(self) -> None:
+        """Останавливает фоновую запись и сохраняет оставшиеся изменения"""
+        if self._task is not None:
+            self._task.cancel()
+            # дождемся отмены: прерванная запись вернет свои ключи в _dirty
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
@@ -1,8 +1,11 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, JSON, DateTime, Date, ForeignKey, Enum, DDL, Index, LargeBinary, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime
+from typing import Optional
 import enum
+import re
+import uuid
 
 Base = declarative_base()
 
@@ -15,16 +18,34 @@ class UserRole(enum.Enum):
     COURIER = "courier"
 
 
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Оставляет в телефоне только цифры, 8XXXXXXXXXX приводится к 7XXXXXXXXXX"""
+    digits = re.sub(r"\D", "", phone or "")
+    if len(digits) == 11 and digits.startswith("8"):
+        digits = "7" + digits[1:]
+    return digits or None
+
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
     telegram_id = Column(Integer, unique=True, nullable=False)
     full_name = Column(String(100))
     phone = Column(String(20), nullable=True)
+    # Цифры телефона для поиска по префиксу
+    phone_digits = Column(String(20), nullable=True, index=True)
     role = Column(Enum(UserRole), default=UserRole.CUSTOMER)
     created_at = Column(DateTime, default=datetime.utcnow)
-    last_activity = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    orders = relationship("Order", back_populates="user")
+    # Обновляется пачками из UserMiddleware, а не при каждом изменении строки
+    last_activity = Column(DateTime, default=datetime.utcnow)
+    # Когда рассылка получила от Telegram 403 (бот заблокирован); сбрасывается при новой активности
+    bot_blocked_at = Column(DateTime, nullable=True)
+    orders = relationship("Order", back_populates="user", foreign_keys="Order.user_id")
+
+    @validates("phone")
+    def _set_phone_digits(self, key, phone):
+        self.phone_digits = normalize_phone(phone)
+        return phone
 
     def is_admin(self):
         return self.role == UserRole.ADMIN
@@ -33,19 +54,121 @@ class User(Base):
         return self.role in [UserRole.ADMIN, UserRole.MANAGER]
 
 
+# Полнотекстовый индекс имен пользователей (SQLite FTS5), синхронизируется триггерами
+USERS_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5("
+    "full_name, content='users', content_rowid='id', tokenize='unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN "
+    "INSERT INTO users_fts(rowid, full_name) VALUES (new.id, new.full_name); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, full_name) VALUES ('delete', old.id, old.full_name); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF full_name ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, full_name) VALUES ('delete', old.id, old.full_name); "
+    "INSERT INTO users_fts(rowid, full_name) VALUES (new.id, new.full_name); END",
+]
+
+for _statement in USERS_FTS_DDL:
+    event.listen(User.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
+
 class Order(Base):
     __tablename__ = "orders"
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     items = Column(JSON, nullable=False)
     status = Column(String(20), default="created")
+    # Сумма заказа в копейках, считается при создании
+    total = Column(Integer, nullable=False, default=0)
     iiko_order_id = Column(String(50), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    user = relationship("User", back_populates="orders")
+    user = relationship("User", back_populates="orders", foreign_keys=[user_id])
     courier_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     courier = relationship("User", foreign_keys=[courier_id])
 
+    __table_args__ = (
+        Index("ix_orders_status_created_at", "status", "created_at"),
+        Index("ix_orders_user_id_created_at", "user_id", "created_at"),
+        Index("ix_orders_courier_id_status", "courier_id", "status"),
+    )
+
+
+class OrderOutbox(Base):
+    """Очередь отправки заказов в iiko"""
+    __tablename__ = "order_outbox"
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    organization_id = Column(String(50), nullable=False)
+    payload = Column(JSON, nullable=False)
+    # id заказа в iiko, задается ботом: повторная отправка не создает дубль
+    order_uuid = Column(String(36), nullable=False, default=lambda: str(uuid.uuid4()))
+    status = Column(String(20), default="pending")
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    last_error = Column(String(300), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    order = relationship("Order")
+
+    __table_args__ = (
+        Index("ix_order_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+
+class UserCart(Base):
+    """Сохраненные корзины пользователей (пишутся пачками из памяти)"""
+    __tablename__ = "carts"
+    user_id = Column(Integer, primary_key=True)
+    items = Column(JSON, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class FSMRecord(Base):
+    """Состояния и данные FSM aiogram (данные - pickle)"""
+    __tablename__ = "fsm_states"
+    key = Column(String(200), primary_key=True)
+    state = Column(String(100), nullable=True)
+    data = Column(LargeBinary, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class Broadcast(Base):
+    """
+    Рассылка администратора всем пользователям.
+    last_user_id - контрольная точка: получатели идут по возрастанию users.id,
+    после перезапуска рассылка продолжается со следующего. lease_until - до
+    какого момента рассылку ведет процесс, взявший аренду с токеном lease_owner.
+    """
+    __tablename__ = "broadcasts"
+    id = Column(Integer, primary_key=True)
+    admin_chat_id = Column(Integer, nullable=False)
+    progress_message_id = Column(Integer, nullable=True)
+    text = Column(String(4096), nullable=False)
+    status = Column(String(20), default="running", index=True)
+    last_user_id = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    blocked = Column(Integer, nullable=False, default=0)
+    lease_until = Column(DateTime, nullable=True)
+    lease_owner = Column(String(32), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class DailyOrderStats(Base):
+    """
+    Сводка заказов по дню создания и текущему статусу.
+    Обновляется в той же транзакции, что и создание заказа или смена статуса.
+    """
+    __tablename__ = "daily_order_stats"
+    day = Column(Date, primary_key=True)
+    status = Column(String(20), primary_key=True)
+    orders_count = Column(Integer, nullable=False, default=0)
+    # Сумма заказов в копейках
+    revenue = Column(Integer, nullable=False, default=0)
+    items_count = Column(Integer, nullable=False, default=0)
+
 
 class MenuCategory(Base):
     """Категории меню для админ-панели"""
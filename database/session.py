@@ -1,14 +1,13 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import sessionmaker, declarative_base
+from typing import Dict, Tuple
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
 from config.config import settings
+from .models import Base
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Базовый класс для моделей
-Base = declarative_base()
-
 def get_database_url() -> str:
     """Получаем URL базы данных с учетом асинхронного режима"""
     db_url = settings.DATABASE_URL
@@ -16,12 +15,77 @@ def get_database_url() -> str:
         return db_url.replace("sqlite://", "sqlite+aiosqlite://")
     return db_url
 
+def sqlite_pragmas() -> Dict[str, object]:
+    """
+    Прагмы для каждого соединения SQLite: WAL позволяет читать во время записи,
+    synchronous=NORMAL в WAL не делает fsync на каждый commit (только на checkpoint),
+    busy_timeout ждет блокировку вместо мгновенного "database is locked".
+    """
+    return {
+        "journal_mode": "WAL",
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "cache_size": -settings.SQLITE_CACHE_SIZE_KB,
+        "temp_store": "MEMORY",
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+    }
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in sqlite_pragmas().items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+def create_async_engines(url: str, tuned: bool = True) -> Tuple[AsyncEngine, AsyncEngine]:
+    """
+    Создает (писатель, читатели).
+
+    Для SQLite с профилем tuned все записи идут через одно соединение-писатель
+    (пул из одного соединения выстраивает транзакции в очередь), а чтения -
+    через небольшой пул отдельных соединений. Для остальных СУБД это один движок.
+    """
+    if "sqlite" not in url:
+        engine = create_async_engine(
+            url,
+            echo=settings.DB_ECHO,
+            pool_size=20,
+            max_overflow=10,
+            pool_pre_ping=True
+        )
+        return engine, engine
+
+    if not tuned:
+        engine = create_async_engine(url, echo=settings.DB_ECHO)
+        return engine, engine
+
+    writer = create_async_engine(
+        url,
+        echo=settings.DB_ECHO,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=settings.SQLITE_WRITE_TIMEOUT
+    )
+    reader = create_async_engine(
+        url,
+        echo=settings.DB_ECHO,
+        pool_size=settings.SQLITE_READ_POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=settings.SQLITE_WRITE_TIMEOUT
+    )
+    for engine in (writer, reader):
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return writer, reader
+
 # Синхронные подключения (для Alembic и CLI-утилит)
 sync_engine = create_engine(
     settings.DATABASE_URL,
     connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {},
     echo=settings.DB_ECHO
 )
+if "sqlite" in settings.DATABASE_URL and settings.SQLITE_TUNING:
+    event.listen(sync_engine, "connect", _set_sqlite_pragmas)
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -30,15 +94,11 @@ SessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
-# Асинхронные подключения (для основного приложения)
-async_engine = create_async_engine(
+# Асинхронные подключения (для основного приложения):
+# async_engine - для транзакций с записью, async_read_engine - только для чтения
+async_engine, async_read_engine = create_async_engines(
     get_database_url(),
-    echo=settings.DB_ECHO,
-    **({} if "sqlite" in settings.DATABASE_URL else {
-        "pool_size": 20,
-        "max_overflow": 10,
-        "pool_pre_ping": True
-    })
+    tuned=settings.SQLITE_TUNING
 )
 
 AsyncSessionLocal = async_sessionmaker(
@@ -48,18 +108,14 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False
 )
 
-def get_db():
-    """Генератор синхронных сессий"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Сессии только для чтения (статистика, поиск, загрузка корзин) не занимают писателя
+AsyncReadSessionLocal = async_sessionmaker(
+    bind=async_read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autoflush=False
+)
 
-async def async_get_db():
-    """Генератор асинхронных сессий"""
-    async with AsyncSessionLocal() as session:
-        yield session
 async def init_models():
     """Создание таблиц в базе данных"""
     async with async_engine.begin() as conn:
@@ -88,4 +144,4 @@ async def async_get_db():
             logger.error(f"Async database error: {e}")
             raise
         finally:
-            await session.close()
\ No newline at end of file
+            await session.close()
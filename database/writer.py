@@ -0,0 +1,104 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from config.config import settings
+from services.metrics import metrics
+from .session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+WriteJob = Callable[[AsyncSession], Awaitable[Any]]
+
+
+class GroupCommitWriter:
+    """
+    Последовательный писатель с групповым commit.
+
+    Задачи записи (функции от сессии, без commit) выполняются по очереди
+    одной фоновой задачей; все, что накопилось в очереди, пока шла предыдущая
+    транзакция, выполняется в следующей и закрепляется одним commit.
+    Если одна из задач пачки падает, пачка откатывается и задачи
+    повторяются по одной, чтобы ошибка досталась только своему вызывающему.
+    """
+
+    def __init__(
+            self,
+            session_factory: async_sessionmaker = AsyncSessionLocal,
+            max_batch: Optional[int] = None
+    ):
+        self.session_factory = session_factory
+        self.max_batch = max_batch or settings.DB_GROUP_COMMIT_MAX_BATCH
+        self._queue: "asyncio.Queue[Tuple[WriteJob, asyncio.Future]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self, job: WriteJob) -> Any:
+        """Выполняет задачу в общей транзакции и возвращает ее результат после commit"""
+        if self._task is None:
+            # писатель не запущен (CLI, тесты): обычная транзакция
+            async with self.session_factory() as session:
+                result = await job(session)
+                await session.commit()
+                return result
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((job, future))
+        return await future
+
+    def start(self):
+        """Запускает фоновую задачу писателя"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        """Дописывает очередь и останавливает писателя"""
+        if self._task is None:
+            return
+        while not self._queue.empty():
+            await self._execute(self._take_batch([]))
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def _take_batch(self, batch: List[Tuple[WriteJob, asyncio.Future]]):
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _loop(self):
+        while True:
+            batch = self._take_batch([await self._queue.get()])
+            try:
+                await self._execute(batch)
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    if not future.done():
+                        future.cancel()
+                raise
+
+    async def _execute(self, batch: List[Tuple[WriteJob, asyncio.Future]]):
+        metrics.inc("db_group_commits_total")
+        metrics.inc("db_group_commit_jobs_total", value=len(batch))
+        try:
+            async with self.session_factory() as session:
+                results = [await job(session) for job, _ in batch]
+                await session.commit()
+        except Exception as e:
+            if len(batch) == 1:
+                future = batch[0][1]
+                if not future.done():
+                    future.set_exception(e)
+                return
+            logger.warning(f"Пачка записи из {len(batch)} задач откатилась, повтор по одной: {e}")
+            for job in batch:
+                await self._execute([job])
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
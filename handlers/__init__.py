@@ -29,4 +29,5 @@ def register_handlers(dp: Dispatcher) -> None:
 
 def get_handler_modules() -> List[str]:
     """Список модулей обработчиков"""
-    return ["start", "menu", "order", "faq", "admin"]  # Убрал cancel_order
\ No newline at end of file
+    # menu и cart регистрируются в main.py: им нужны общие сервисы
+    return ["start", "order", "faq", "admin"]  # Убрал cancel_order
\ No newline at end of file
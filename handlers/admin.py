@@ -1,33 +1,47 @@
 from aiogram import Dispatcher, F
 from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from keyboards.admin_kb import (
     get_admin_keyboard,
     get_user_management_keyboard,
-    get_menu_management_keyboard
+    get_menu_management_keyboard,
+    get_orders_management_keyboard,
+    get_broadcast_confirm_keyboard
 )
 from database.crud import (
     get_user_by_id,
     update_user_role,
     search_users,
     get_orders_stats,
+    get_daily_order_stats,
     get_menu_categories,
     update_menu_item
 )
 from database.models import UserRole
-from config.config import Config
+from database.session import AsyncSessionLocal, AsyncReadSessionLocal
+from services.menu_cache import MenuCache
+from services.broadcast import BroadcastService
+from middlewares.user import UserMiddleware
+from services.menu_import import import_menu
+from services.utils import format_price, ORDER_STATUS_TITLES
+from config.config import settings
 import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
 from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+ORDER_HISTORY_DAYS = 14
+
 
 class AdminStates:
     USER_SEARCH = "admin_user_search"
     ROLE_EDIT = "admin_role_edit"
     MENU_ITEM_EDIT = "menu_item_edit"
+    BROADCAST_TEXT = "admin_broadcast_text"
 
 
 async def admin_start(message: Message):
@@ -57,13 +71,14 @@ async def handle_back_to_admin(message: Message):
 async def handle_admin_stats(message: Message):
     """Обработчик статистики с реальными данными"""
     try:
-        stats = get_orders_stats(message.bot.get('db'))
+        async with AsyncReadSessionLocal() as session:
+            stats = await get_orders_stats(session)
         response = (
             "📊 Статистика бота:\n\n"
-            f"• Пользователей: {stats.get('total_users', 0)}\n"
-            f"• Активных заказов: {stats.get('active_orders', 0)}\n"
-            f"• Выручка: {stats.get('total_revenue', 0)} руб.\n"
-            f"• Новых за неделю: {stats.get('weekly_orders', 0)}"
+            f"• Пользователей: {stats['total_users']}\n"
+            f"• Активных заказов: {stats['active_orders']}\n"
+            f"• Выручка: {format_price(stats['total_revenue'])} руб.\n"
+            f"• Новых за неделю: {stats['weekly_orders']}"
         )
         await message.answer(response)
     except Exception as e:
@@ -71,6 +86,78 @@ async def handle_admin_stats(message: Message):
         await message.answer("⚠️ Ошибка получения статистики")
 
 
+async def handle_orders_management(message: Message):
+    """Меню управления заказами"""
+    try:
+        await message.answer(
+            "📦 Управление заказами:",
+            reply_markup=get_orders_management_keyboard()
+        )
+    except Exception as e:
+        logger.error(f"Error in handle_orders_management: {e}", exc_info=True)
+        await message.answer("⚠️ Ошибка управления заказами")
+
+
+async def handle_orders_today(message: Message):
+    """Заказы за сегодня по статусам (из сводки daily_order_stats)"""
+    try:
+        today = datetime.utcnow().date()
+        async with AsyncReadSessionLocal() as session:
+            rows = await get_daily_order_stats(session, today)
+
+        if not rows:
+            await message.answer("📦 Сегодня заказов пока нет")
+            return
+
+        total_orders = sum(row.orders_count for row in rows)
+        total_items = sum(row.items_count for row in rows)
+        revenue = sum(row.revenue for row in rows if row.status == "completed")
+        lines = [
+            f"{ORDER_STATUS_TITLES.get(row.status, row.status)}: {row.orders_count}"
+            for row in rows if row.orders_count
+        ]
+        await message.answer(
+            f"📦 Заказы за {today:%d.%m.%Y}:\n\n" + "\n".join(lines) +
+            f"\n\nВсего заказов: {total_orders}, позиций: {total_items}\n"
+            f"Выручка: {format_price(revenue)} руб."
+        )
+    except Exception as e:
+        logger.error(f"Error in handle_orders_today: {e}", exc_info=True)
+        await message.answer("⚠️ Ошибка получения заказов за сегодня")
+
+
+async def handle_orders_history(message: Message):
+    """История заказов по дням (из сводки daily_order_stats)"""
+    try:
+        date_from = datetime.utcnow().date() - timedelta(days=ORDER_HISTORY_DAYS - 1)
+        async with AsyncReadSessionLocal() as session:
+            rows = await get_daily_order_stats(session, date_from)
+
+        if not rows:
+            await message.answer("📆 Заказов за последние дни нет")
+            return
+
+        days = defaultdict(lambda: {"orders": 0, "completed": 0, "revenue": 0})
+        for row in rows:
+            day = days[row.day]
+            day["orders"] += row.orders_count
+            if row.status == "completed":
+                day["completed"] += row.orders_count
+                day["revenue"] += row.revenue
+
+        lines = [
+            f"{day:%d.%m}: {values['orders']} заказов, выполнено {values['completed']}, "
+            f"{format_price(values['revenue'])} руб."
+            for day, values in sorted(days.items(), reverse=True)
+        ]
+        await message.answer(
+            f"📆 История заказов за {ORDER_HISTORY_DAYS} дней:\n\n" + "\n".join(lines)
+        )
+    except Exception as e:
+        logger.error(f"Error in handle_orders_history: {e}", exc_info=True)
+        await message.answer("⚠️ Ошибка получения истории заказов")
+
+
 async def handle_user_management(message: Message):
     """Управление пользователями с inline-кнопками"""
     try:
@@ -111,14 +198,47 @@ async def handle_menu_management(message: Message):
         await message.answer("⚠️ Ошибка управления меню")
 
 
-async def process_role_selection(callback: CallbackQuery, state: FSMContext):
+async def handle_menu_import(message: Message, menu_cache: MenuCache):
+    """Импорт меню из iiko в таблицы категорий и позиций"""
+    try:
+        menu = await menu_cache.refresh()
+        if not menu:
+            await message.answer("⚠️ iiko недоступен, импорт невозможен")
+            return
+
+        async with AsyncSessionLocal() as session:
+            result = await import_menu(session, menu)
+
+        categories, items = result["categories"], result["items"]
+        await message.answer(
+            "📦 Импорт из iiko завершен:\n\n"
+            f"Категории: +{categories['inserted']}, ✏️ {categories['updated']}, "
+            f"🚫 {categories['deactivated']}\n"
+            f"Позиции: +{items['inserted']}, ✏️ {items['updated']}, "
+            f"🚫 {items['deactivated']}"
+        )
+    except Exception as e:
+        logger.error(f"Error in handle_menu_import: {e}", exc_info=True)
+        await message.answer("⚠️ Ошибка импорта меню")
+
+
+async def process_role_selection(
+        callback: CallbackQuery,
+        state: FSMContext,
+        user_middleware: Optional[UserMiddleware] = None
+):
     """Обработка выбора роли для пользователя"""
     try:
         data = callback.data.split('_')
         user_id = int(data[1])
         role = UserRole(data[2])
 
-        if update_user_role(callback.bot.get('db'), user_id, role):
+        async with AsyncSessionLocal() as session:
+            updated = await update_user_role(session, user_id, role)
+        if user_middleware is not None:
+            user_middleware.forget(user_id)
+
+        if updated:
             await callback.message.edit_text(f"✅ Роль пользователя {user_id} изменена на {role.value}")
         else:
             await callback.message.edit_text("⚠️ Не удалось изменить роль")
@@ -128,6 +248,63 @@ async def process_role_selection(callback: CallbackQuery, state: FSMContext):
         await callback.message.edit_text("⚠️ Ошибка изменения роли")
 
 
+async def handle_broadcast_start(message: Message, state: FSMContext):
+    """Запрос текста рассылки"""
+    try:
+        await state.set_state(AdminStates.BROADCAST_TEXT)
+        await message.answer("📨 Отправьте текст сообщения для всех пользователей")
+    except Exception as e:
+        logger.error(f"Error in handle_broadcast_start: {e}", exc_info=True)
+        await message.answer("⚠️ Ошибка подготовки рассылки")
+
+
+async def handle_broadcast_text(message: Message, state: FSMContext):
+    """Предпросмотр рассылки и подтверждение"""
+    try:
+        await state.update_data(broadcast_text=message.html_text)
+        await message.answer(
+            f"📨 Предпросмотр:\n\n{message.html_text}",
+            reply_markup=get_broadcast_confirm_keyboard()
+        )
+    except Exception as e:
+        logger.error(f"Error in handle_broadcast_text: {e}", exc_info=True)
+        await message.answer("⚠️ Ошибка подготовки рассылки")
+
+
+async def process_broadcast_confirm(callback: CallbackQuery, state: FSMContext, broadcaster: BroadcastService):
+    """Запуск рассылки"""
+    try:
+        text = (await state.get_data()).get("broadcast_text")
+        await state.clear()
+        if not text:
+            await callback.answer("Текст рассылки не найден", show_alert=True)
+            return
+
+        await callback.message.edit_reply_markup(reply_markup=None)
+        await callback.answer()
+        await broadcaster.create(callback.message.chat.id, text)
+    except Exception as e:
+        logger.error(f"Error in process_broadcast_confirm: {e}", exc_info=True)
+        await callback.message.answer("⚠️ Ошибка запуска рассылки")
+
+
+async def process_broadcast_discard(callback: CallbackQuery, state: FSMContext):
+    """Отмена подготовленной рассылки"""
+    await state.clear()
+    await callback.message.edit_text("❌ Рассылка отменена")
+
+
+async def process_broadcast_stop(callback: CallbackQuery, broadcaster: BroadcastService):
+    """Остановка идущей рассылки"""
+    try:
+        broadcast_id = int(callback.data.rsplit("_", 1)[1])
+        stopped = await broadcaster.cancel(broadcast_id)
+        await callback.answer("⏹ Рассылка остановлена" if stopped else "Рассылка уже завершена")
+    except Exception as e:
+        logger.error(f"Error in process_broadcast_stop: {e}", exc_info=True)
+        await callback.answer("⚠️ Ошибка остановки рассылки")
+
+
 def register_admin_handlers(dp: Dispatcher):
     """Регистрация обработчиков с проверкой прав"""
     try:
@@ -140,8 +317,26 @@ def register_admin_handlers(dp: Dispatcher):
         dp.message.register(handle_menu_management, F.text == "📝 Меню")
         dp.message.register(handle_back_to_admin, F.text == "◀️ Назад")
 
+        # Заказы
+        is_admin = F.from_user.id.in_(settings.ADMIN_IDS)
+        dp.message.register(handle_orders_management, F.text == "📦 Управление заказами", is_admin)
+        dp.message.register(handle_orders_today, F.text == "📦 Заказы за сегодня", is_admin)
+        dp.message.register(handle_orders_history, F.text == "📆 История заказов", is_admin)
+        dp.message.register(
+            handle_menu_import,
+            F.text == "📦 Импорт из iiko",
+            F.from_user.id.in_(settings.ADMIN_IDS)
+        )
+
+        # Рассылка
+        dp.message.register(handle_broadcast_start, F.text == "📨 Отправить сообщение", is_admin)
+        dp.message.register(handle_broadcast_text, StateFilter(AdminStates.BROADCAST_TEXT), F.text, is_admin)
+
         # Callback-обработчики
         dp.callback_query.register(process_role_selection, F.data.startswith("setrole_"))
+        dp.callback_query.register(process_broadcast_confirm, F.data == "broadcast_confirm", is_admin)
+        dp.callback_query.register(process_broadcast_discard, F.data == "broadcast_discard", is_admin)
+        dp.callback_query.register(process_broadcast_stop, F.data.startswith("broadcast_stop_"), is_admin)
 
         logger.info("Admin handlers registered successfully")
     except Exception as e:
@@ -1,11 +1,16 @@
 from aiogram import Router, types, F, Bot
-from aiogram.filters import Command
+from aiogram.filters import Command, or_f
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram import Dispatcher
 from typing import Optional, Dict, List
 from database.cart_repository import CartRepository
-from services.iiko_service import IikoService
+from database.crud import add_order_with_outbox
+from database.writer import GroupCommitWriter
+from services.menu_cache import MenuCache
+from services.order_queue import OrderSubmissionQueue
+from middlewares.user import CachedUser, fetch_user
+from services.utils import format_price
 from keyboards import (
     main_keyboard,
     cart_keyboard,
@@ -39,12 +44,10 @@ async def show_cart(
             )
             return
 
-        total = sum(item['price'] * item['quantity'] for item in cart.items)
-
         cart_text = "🛒 Ваша корзина:\n\n" + "\n".join(
-            f"{i + 1}. {item['name']} - {item['quantity']} x {item['price']}₽"
+            f"{i + 1}. {item.name} - {item.quantity} x {format_price(item.price)}₽"
             for i, item in enumerate(cart.items)
-        ) + f"\n\n💳 Итого: {total}₽"
+        ) + f"\n\n💳 Итого: {format_price(cart.total)}₽"
 
         await state.set_state(CartStates.viewing_cart)
         await message.answer(
@@ -63,23 +66,23 @@ async def show_cart(
 async def add_to_cart(
         message: types.Message,
         cart_repo: CartRepository,
-        state: FSMContext,
-        product_id: str
+        menu_cache: MenuCache
 ):
     """Добавляет товар в корзину"""
     try:
         user_id = message.from_user.id
-        data = await state.get_data()
-
-        product = next(
-            (p for p in data['menu']['products'] if p['id'] == product_id),
-            None
-        )
+        product_id = message.text.split('_', 1)[1]
+        menu = await menu_cache.get()
+        product = menu.products_by_id.get(product_id) if menu else None
 
         if not product:
             await message.answer("Товар не найден")
             return
 
+        if not menu_cache.is_available(product_id):
+            await message.answer("⛔ Товар временно нет в наличии")
+            return
+
         await cart_repo.add_item(
             user_id=user_id,
             product_id=product_id,
@@ -123,7 +126,6 @@ async def remove_from_cart(
 async def checkout_cart(
         message: types.Message,
         cart_repo: CartRepository,
-        iiko_service: IikoService,
         state: FSMContext
 ):
     """Оформляет заказ из корзины"""
@@ -135,12 +137,10 @@ async def checkout_cart(
             await message.answer("Корзина пуста")
             return
 
-        total = sum(item['price'] * item['quantity'] for item in cart.items)
-
         await state.set_state(CartStates.checkout)
         await message.answer(
-            f"Подтвердите заказ на сумму {total}₽:\n\n" +
-            "\n".join(f"- {item['name']} x{item['quantity']}" for item in cart.items),
+            f"Подтвердите заказ на сумму {format_price(cart.total)}₽:\n\n" +
+            "\n".join(f"- {item.name} x{item.quantity}" for item in cart.items),
             reply_markup=confirmation_keyboard()
         )
 
@@ -155,19 +155,39 @@ async def checkout_cart(
 async def confirm_order(
         callback: types.CallbackQuery,
         cart_repo: CartRepository,
-        iiko_service: IikoService,
-        state: FSMContext
+        order_queue: OrderSubmissionQueue,
+        db_writer: GroupCommitWriter,
+        state: FSMContext,
+        db_user: Optional[CachedUser] = None
 ):
-    """Подтверждает и отправляет заказ в iiko"""
+    """Подтверждает заказ и ставит его в очередь отправки в iiko"""
     try:
         user_id = callback.from_user.id
         cart = await cart_repo.get_cart(user_id)
 
-        # Отправка заказа в iiko
-        order_id = await iiko_service.create_order(
-            user_id=user_id,
-            items=cart.items
-        )
+        if not cart or not cart.items:
+            await callback.answer("Корзина пуста")
+            return
+
+        # Заказ и задача на отправку сохраняются локально,
+        # в iiko его отправит воркер очереди
+        iiko_service = order_queue.iiko_service
+        items = [item.to_order_item() for item in cart.items]
+        user = db_user
+        if user is None:
+            # Обычно пользователь уже найден UserMiddleware
+            user = await fetch_user(user_id, callback.from_user.full_name)
+
+        # Заказы разных пользователей пишутся общими транзакциями писателя
+        order = await db_writer.run(lambda session: add_order_with_outbox(
+            session,
+            user_id=user.id,
+            items=items,
+            organization_id=iiko_service.organization_id,
+            payload=iiko_service.build_order(user_id, items)
+        ))
+        order_queue.notify()
+        order_id = order.id
 
         # Очистка корзины
         await cart_repo.clear_cart(user_id)
@@ -187,34 +207,44 @@ async def confirm_order(
         )
 
 
-def register_cart_handlers(dp: Dispatcher, cart_repo: CartRepository, iiko_service: IikoService):
+def register_cart_handlers(
+        dp: Dispatcher,
+        cart_repo: CartRepository,
+        order_queue: OrderSubmissionQueue,
+        db_writer: GroupCommitWriter
+):
     """Регистрирует обработчики корзины"""
+    # Сервисы передаются в обработчики через данные диспетчера
+    dp["cart_repo"] = cart_repo
+    dp["order_queue"] = order_queue
+    dp["db_writer"] = db_writer
+
     # Просмотр корзины
     dp.message.register(
-        lambda message: show_cart(message, cart_repo, dp.fsm),
-        Command("cart") | F.text == "🛒 Корзина"
+        show_cart,
+        or_f(Command("cart"), F.text == "🛒 Корзина")
     )
 
     # Добавление в корзину
     dp.message.register(
-        lambda message: add_to_cart(message, cart_repo, dp.fsm, message.text.split('_')[1]),
-        Command(startswith="add_")
+        add_to_cart,
+        F.text.startswith("/add_")
     )
 
     # Удаление из корзины
     dp.callback_query.register(
-        lambda callback: remove_from_cart(callback, cart_repo),
+        remove_from_cart,
         F.data.startswith("remove_")
     )
 
     # Оформление заказа
     dp.message.register(
-        lambda message: checkout_cart(message, cart_repo, iiko_service, dp.fsm),
+        checkout_cart,
         F.text == "💳 Оформить заказ"
     )
 
     # Подтверждение заказа
     dp.callback_query.register(
-        lambda callback: confirm_order(callback, cart_repo, iiko_service, dp.fsm),
+        confirm_order,
         F.data == "confirm_order"
-    )
\ No newline at end of file
+    )
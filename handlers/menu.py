@@ -1,29 +1,73 @@
-from aiogram import Router, types, Bot, F
-from aiogram.filters import Command, Text
+from aiogram import Dispatcher, types, F
+from aiogram.filters import Command, or_f
 from aiogram.fsm.context import FSMContext
-from typing import Optional
 from keyboards import (
     main_keyboard,
     menu_categories_keyboard,
     menu_products_keyboard
 )
-from services.iiko_service import IikoService
+from services.menu_cache import MenuCache, MenuSnapshot
+from typing import Dict, Tuple
 import logging
 
-router = Router()
+MENU_BUTTONS = {"🍽 Меню", "🍽️ Меню"}
+STALE_NOTE = "\n\n⚠️ Сервис ресторана недоступен, меню может быть неактуальным"
+
+# Тексты экранов категорий: (версия меню, категория) -> (стоп-лист, текст)
+_category_texts: Dict[Tuple[int, str], Tuple[frozenset, str]] = {}
+
+
+def _category_text(menu: MenuSnapshot, menu_cache: MenuCache, category) -> str:
+    """Текст списка товаров категории; пересобирается только при смене меню или стоп-листа"""
+    key = (menu.version, category["id"])
+    stopped = menu_cache.stopped_products
+    cached = _category_texts.get(key)
+    if cached is not None and cached[0] is stopped:
+        return cached[1]
+
+    if any(version != menu.version for version, _ in _category_texts):
+        _category_texts.clear()
+    text = f"🍽 {category['name']}:\n\n" + "\n".join(
+        f"• {p['name']} - {p['price']}₽" + (" (нет в наличии)" if p['id'] in stopped else "")
+        for p in menu.category_products(category["id"])[:10]
+    )
+    _category_texts[key] = (stopped, text)
+    return text
+
+
+async def _menu_outdated(
+        callback: types.CallbackQuery,
+        state: FSMContext,
+        menu: MenuSnapshot
+) -> bool:
+    """
+    Проверяет, что клавиатура пользователя построена по текущей версии меню.
+    Если меню обновилось, перерисовывает список категорий.
+    """
+    data = await state.get_data()
+    if data.get('menu_fingerprint') == menu.fingerprint:
+        return False
+
+    await state.update_data(menu_fingerprint=menu.fingerprint)
+    await callback.answer("Меню обновилось")
+    await callback.message.edit_text(
+        "🍽 Меню обновилось, выберите категорию:",
+        reply_markup=menu_categories_keyboard(menu)
+    )
+    return True
 
 
 async def show_menu(
         message: types.Message,
-        iiko_service: IikoService,
+        menu_cache: MenuCache,
         state: FSMContext
 ):
     """
     Отображает главное меню с категориями
     """
     try:
-        # Получаем меню из iiko
-        menu = await iiko_service.get_menu()
+        # Берем текущий снимок меню из общего кэша
+        menu = await menu_cache.get()
 
         if not menu or not menu.categories:
             await message.answer(
@@ -32,13 +76,13 @@ async def show_menu(
             )
             return
 
-        # Сохраняем меню в состоянии
-        await state.update_data(menu=menu.dict())
+        # В состоянии храним только версию меню, сами данные - в общем кэше
+        await state.update_data(menu_fingerprint=menu.fingerprint)
 
         # Отправляем клавиатуру с категориями
         await message.answer(
-            "🍽 Выберите категорию:",
-            reply_markup=menu_categories_keyboard(menu.categories)
+            "🍽 Выберите категорию:" + (STALE_NOTE if menu_cache.is_stale else ""),
+            reply_markup=menu_categories_keyboard(menu)
         )
 
     except Exception as e:
@@ -49,53 +93,71 @@ async def show_menu(
         )
 
 
+async def show_categories(
+        callback: types.CallbackQuery,
+        menu_cache: MenuCache,
+        state: FSMContext
+):
+    """
+    Возвращает пользователя к списку категорий
+    """
+    try:
+        menu = await menu_cache.get()
+        if not menu:
+            await callback.answer("Меню временно недоступно")
+            return
+
+        await state.update_data(menu_fingerprint=menu.fingerprint)
+        await callback.message.edit_text(
+            "🍽 Выберите категорию:",
+            reply_markup=menu_categories_keyboard(menu)
+        )
+
+    except Exception as e:
+        logging.error(f"Categories error: {e}", exc_info=True)
+        await callback.answer("Ошибка загрузки меню")
+
+
 async def handle_category_selection(
         callback: types.CallbackQuery,
-        iiko_service: IikoService,
-        state: FSMContext,
-        bot: Optional[Bot] = None
+        menu_cache: MenuCache,
+        state: FSMContext
 ):
     """
     Обрабатывает выбор категории и показывает товары
     """
     try:
         category_id = callback.data.split('_')[1]
-        data = await state.get_data()
-        menu = data.get('menu')
+        menu = await menu_cache.get()
 
         if not menu:
-            await callback.answer("Меню устарело, запрашиваю новое...")
-            menu = await iiko_service.get_menu()
-            await state.update_data(menu=menu.dict())
+            await callback.answer("Меню временно недоступно")
+            return
+
+        if await _menu_outdated(callback, state, menu):
+            return
 
         # Находим выбранную категорию
-        category = next(
-            (c for c in menu['categories'] if c['id'] == category_id),
-            None
-        )
+        category = menu.categories_by_id.get(category_id)
 
         if not category:
             await callback.answer("Категория не найдена")
             return
 
-        # Получаем товары категории
-        products = [
-            p for p in menu['products']
-            if p['parentGroup'] == category_id
-        ]
+        # Товары категории уже отсортированы для показа
+        products = menu.category_products(category_id)
 
         if not products:
             await callback.message.edit_text(
                 f"🍽 В категории '{category['name']}' пока нет позиций",
-                reply_markup=menu_categories_keyboard(menu['categories'])
+                reply_markup=menu_categories_keyboard(menu)
             )
             return
 
         # Отправляем товары с пагинацией
         await callback.message.edit_text(
-            f"🍽 {category['name']}:\n\n" +
-            "\n".join(f"• {p['name']} - {p['price']}₽" for p in products[:10]),
-            reply_markup=menu_products_keyboard(products, category_id)
+            _category_text(menu, menu_cache, category),
+            reply_markup=menu_products_keyboard(menu, category_id)
         )
 
     except Exception as e:
@@ -108,6 +170,7 @@ async def handle_category_selection(
 
 async def handle_product_selection(
         callback: types.CallbackQuery,
+        menu_cache: MenuCache,
         state: FSMContext
 ):
     """
@@ -115,19 +178,28 @@ async def handle_product_selection(
     """
     try:
         product_id = callback.data.split('_')[1]
-        data = await state.get_data()
+        menu = await menu_cache.get()
 
-        product = next(
-            (p for p in data['menu']['products'] if p['id'] == product_id),
-            None
-        )
+        if not menu:
+            await callback.answer("Меню временно недоступно")
+            return
+
+        if await _menu_outdated(callback, state, menu):
+            return
+
+        product = menu.products_by_id.get(product_id)
 
         if product:
+            action = (
+                f"Добавить в корзину /add_{product_id}"
+                if menu_cache.is_available(product_id)
+                else "⛔ Временно нет в наличии"
+            )
             await callback.message.answer(
                 f"🍕 {product['name']}\n\n"
                 f"Цена: {product['price']}₽\n"
-                f"Состав: {product.get('description', 'нет описания')}\n\n"
-                "Добавить в корзину /add_{product_id}"
+                f"Состав: {product.get('description') or 'нет описания'}\n\n"
+                f"{action}"
             )
         else:
             await callback.answer("Товар не найден")
@@ -137,19 +209,28 @@ async def handle_product_selection(
         await callback.answer("Ошибка загрузки товара")
 
 
-def register_menu_handlers(dp: Dispatcher, iiko_service: IikoService):
+def register_menu_handlers(dp: Dispatcher, menu_cache: MenuCache):
     """
     Регистрирует обработчики меню
     """
+    # Кэш меню передается в обработчики через данные диспетчера
+    dp["menu_cache"] = menu_cache
+
     # Текстовая команда /menu и кнопка "Меню"
     dp.message.register(
-        lambda message: show_menu(message, iiko_service, dp.fsm),
-        Command("menu") | Text(text="🍽 Меню")
+        show_menu,
+        or_f(Command("menu"), F.text.in_(MENU_BUTTONS))
+    )
+
+    # Возврат к списку категорий
+    dp.callback_query.register(
+        show_categories,
+        F.data == "menu_categories"
     )
 
     # Обработка выбора категории
     dp.callback_query.register(
-        lambda callback: handle_category_selection(callback, iiko_service, dp.fsm, dp.bot),
+        handle_category_selection,
         F.data.startswith("category_")
     )
 
@@ -157,4 +238,4 @@ def register_menu_handlers(dp: Dispatcher, iiko_service: IikoService):
     dp.callback_query.register(
         handle_product_selection,
         F.data.startswith("product_")
-    )
\ No newline at end of file
+    )
@@ -1,11 +1,102 @@
 from aiogram import Dispatcher, F
-from aiogram.types import Message
+from aiogram.types import Message, CallbackQuery
+from aiogram.filters import Command, or_f
 from aiogram.fsm.context import FSMContext
+from typing import Optional
+from database.crud import get_user_orders_page
+from database.session import AsyncReadSessionLocal
+from keyboards import orders_page_keyboard
+from middlewares.user import CachedUser, fetch_user
+from services.utils import format_price, encode_cursor, decode_cursor, ORDER_STATUS_TITLES
+import logging
+
+logger = logging.getLogger(__name__)
+
+ORDERS_PAGE_SIZE = 5
+
 
 async def process_order(message: Message, state: FSMContext):
     """Обработчик начала оформления заказа"""
     await message.answer("Давайте оформим ваш заказ...")
 
+
+async def _orders_page(user_id: int, older_than=None, newer_than=None):
+    """Текст и клавиатура страницы истории заказов"""
+    async with AsyncReadSessionLocal() as session:
+        rows, has_more = await get_user_orders_page(
+            session,
+            user_id,
+            limit=ORDERS_PAGE_SIZE,
+            older_than=older_than,
+            newer_than=newer_than
+        )
+    if not rows:
+        return None, None
+
+    text = "📦 Ваши заказы:\n\n" + "\n".join(
+        f"#{row.id} от {row.created_at:%d.%m.%Y %H:%M} - "
+        f"{ORDER_STATUS_TITLES.get(row.status, row.status)}, "
+        f"позиций: {row.items_count or 0}, {format_price(row.total or 0)}₽"
+        for row in rows
+    )
+
+    first, last = rows[0], rows[-1]
+    # при листании вперед (к старым) более новые заказы точно есть, и наоборот
+    has_newer = newer_than is not None and has_more or older_than is not None
+    has_older = newer_than is not None or has_more
+    keyboard = orders_page_keyboard(
+        newer=encode_cursor(first.created_at, first.id) if has_newer else None,
+        older=encode_cursor(last.created_at, last.id) if has_older else None
+    )
+    return text, keyboard
+
+
+async def show_orders(message: Message, db_user: Optional[CachedUser] = None):
+    """Первая страница истории заказов пользователя"""
+    try:
+        user = db_user
+        if user is None:
+            user = await fetch_user(message.from_user.id, message.from_user.full_name)
+
+        text, keyboard = await _orders_page(user.id)
+        if text is None:
+            await message.answer("📦 У вас пока нет заказов")
+            return
+        await message.answer(text, reply_markup=keyboard)
+    except Exception as e:
+        logger.error(f"Orders history error: {e}", exc_info=True)
+        await message.answer("⚠️ Ошибка загрузки заказов")
+
+
+async def paginate_orders(callback: CallbackQuery, db_user: Optional[CachedUser] = None):
+    """Листание истории заказов по курсору из callback data"""
+    try:
+        if db_user is None:
+            await callback.answer("Попробуйте еще раз")
+            return
+
+        _, direction, cursor = callback.data.split("_", 2)
+        position = decode_cursor(cursor)
+        if direction == "older":
+            text, keyboard = await _orders_page(db_user.id, older_than=position)
+        else:
+            text, keyboard = await _orders_page(db_user.id, newer_than=position)
+
+        if text is None:
+            await callback.answer("Больше заказов нет")
+            return
+        await callback.message.edit_text(text, reply_markup=keyboard)
+        await callback.answer()
+    except Exception as e:
+        logger.error(f"Orders pagination error: {e}", exc_info=True)
+        await callback.answer("Ошибка загрузки заказов")
+
+
 def register_order_handlers(dp: Dispatcher):
     """Регистрация обработчиков заказов"""
-    dp.message.register(process_order, F.text == "🛒 Оформить заказ")
\ No newline at end of file
+    dp.message.register(process_order, F.text == "🛒 Оформить заказ")
+    dp.message.register(show_orders, or_f(Command("orders"), F.text == "📦 Мои заказы"))
+    dp.callback_query.register(
+        paginate_orders,
+        or_f(F.data.startswith("orders_older_"), F.data.startswith("orders_newer_"))
+    )
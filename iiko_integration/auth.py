@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+from typing import Optional, TYPE_CHECKING
+
+from config.config import settings
+
+if TYPE_CHECKING:
+    from iiko_integration.client import IikoClient
+
+logger = logging.getLogger(__name__)
+
+
+class IikoTokenManager:
+    """
+    Менеджер токена доступа iiko.
+
+    Токен живет ограниченное время (в iikoCloud - час), поэтому менеджер
+    обновляет его в фоне заранее, а одновременные запросы на обновление
+    объединяет в один вызов /api/1/access_token.
+    """
+
+    def __init__(
+            self,
+            client: "IikoClient",
+            api_login: str,
+            ttl: Optional[float] = None,
+            refresh_margin: Optional[float] = None
+    ):
+        self.client = client
+        self.api_login = api_login
+        self.ttl = ttl or settings.IIKO_TOKEN_TTL
+        self.refresh_margin = min(refresh_margin or settings.IIKO_TOKEN_REFRESH_MARGIN, self.ttl / 2)
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+        self._background: Optional[asyncio.Task] = None
+
+    async def get_token(self) -> str:
+        """Возвращает действующий токен, при необходимости получает новый"""
+        token = self._token
+        if token is not None and time.monotonic() < self._expires_at:
+            return token
+        return await self.refresh()
+
+    async def refresh(self) -> str:
+        """Обновляет токен; параллельные вызовы ждут один и тот же запрос"""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._fetch())
+        # shield: отмена одного ожидающего не должна отменять общий запрос
+        return await asyncio.shield(self._inflight)
+
+    def invalidate(self, token: str):
+        """Сбрасывает токен, отвергнутый сервером (401)"""
+        if self._token == token:
+            self._token = None
+            self._expires_at = 0.0
+
+    async def _fetch(self) -> str:
+        data = await self.client.post(
+            "/api/1/access_token",
+            {"apiLogin": self.api_login}
+        )
+        token = data.get("token")
+        if not token:
+            raise RuntimeError("iiko не вернул токен доступа")
+
+        self._token = token
+        self._expires_at = time.monotonic() + self.ttl
+        self._ensure_background()
+        logger.info("Токен iiko обновлен")
+        return token
+
+    def _ensure_background(self):
+        if self._background is None or self._background.done():
+            self._background = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        """Фоновое обновление токена до истечения срока действия"""
+        while True:
+            delay = self._expires_at - self.refresh_margin - time.monotonic()
+            await asyncio.sleep(max(delay, 1.0))
+            if time.monotonic() < self._expires_at - self.refresh_margin:
+                continue
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка фонового обновления токена iiko: {e}")
+                await asyncio.sleep(5)
+
+    async def close(self):
+        """Останавливает фоновое обновление"""
+        for task in (self._background, self._inflight):
+            if task is not None and not task.done():
+                task.cancel()
+        self._background = None
+        self._inflight = None
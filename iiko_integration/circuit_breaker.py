@@ -0,0 +1,97 @@
+import logging
+import time
+
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Запрос отклонен: iiko недоступен, автомат разомкнут"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Цепь {name} разомкнута, повтор через {retry_after:.0f} с")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель для вызовов внешнего сервиса.
+
+    closed - запросы проходят, ошибки подряд считаются;
+    open - запросы сразу отклоняются до истечения recovery_timeout;
+    half_open - пропускается ограниченное число пробных запросов,
+    успех замыкает цепь, ошибка снова размыкает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(
+            self,
+            name: str,
+            failure_threshold: int = 5,
+            recovery_timeout: float = 30.0,
+            half_open_max_calls: int = 1
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._set_state(self.CLOSED)
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN and self.retry_after > 0
+
+    @property
+    def retry_after(self) -> float:
+        """Сколько секунд осталось до пробного запроса"""
+        return max(0.0, self._opened_at + self.recovery_timeout - time.monotonic())
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"Цепь {self.name}: {self.state} -> {state}")
+        self.state = state
+        metrics.set("circuit_state", self._STATE_VALUES[state], circuit=self.name)
+
+    def before_call(self):
+        """Проверяет, можно ли выполнить запрос; иначе бросает CircuitOpenError"""
+        if self.state == self.OPEN:
+            if self.retry_after > 0:
+                metrics.inc("circuit_rejected_total", circuit=self.name)
+                raise CircuitOpenError(self.name, self.retry_after)
+            self._probes = 0
+            self._opened_at = time.monotonic()
+            self._set_state(self.HALF_OPEN)
+
+        if self.state == self.HALF_OPEN:
+            # зависшие пробные запросы не должны держать цепь полуоткрытой вечно
+            if self._probes >= self.half_open_max_calls:
+                if self.retry_after > 0:
+                    metrics.inc("circuit_rejected_total", circuit=self.name)
+                    raise CircuitOpenError(self.name, self.retry_after)
+                self._probes = 0
+                self._opened_at = time.monotonic()
+            self._probes += 1
+
+    def record_success(self):
+        self.failures = 0
+        if self.state != self.CLOSED:
+            self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        metrics.inc("circuit_failures_total", circuit=self.name)
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            if self.state != self.OPEN:
+                metrics.inc("circuit_opened_total", circuit=self.name)
+            self._set_state(self.OPEN)
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import aiohttp
+
+from config.config import settings
+from iiko_integration.auth import IikoTokenManager
+from iiko_integration.circuit_breaker import CircuitBreaker
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class IikoAPIError(Exception):
+    """Ошибка ответа iikoCloud API"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"iiko API вернул {status}: {message}")
+        self.status = status
+
+
+class IikoClient:
+    """
+    Общий асинхронный HTTP-клиент iikoCloud API.
+
+    Держит один пул keep-alive соединений на процесс и ограничивает
+    число одновременных запросов к iiko.
+    """
+
+    def __init__(
+            self,
+            base_url: str,
+            api_login: str,
+            timeout: Optional[float] = None,
+            connect_timeout: Optional[float] = None,
+            max_connections: Optional[int] = None,
+            max_concurrency: Optional[int] = None
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = aiohttp.ClientTimeout(
+            total=timeout or settings.IIKO_HTTP_TIMEOUT,
+            connect=connect_timeout or settings.IIKO_CONNECT_TIMEOUT
+        )
+        self.max_connections = max_connections or settings.IIKO_MAX_CONNECTIONS
+        self._semaphore = asyncio.Semaphore(max_concurrency or settings.IIKO_MAX_CONCURRENCY)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.tokens = IikoTokenManager(self, api_login)
+        self.breaker = CircuitBreaker(
+            "iiko",
+            failure_threshold=settings.IIKO_CIRCUIT_FAILURE_THRESHOLD,
+            recovery_timeout=settings.IIKO_CIRCUIT_RECOVERY_TIMEOUT
+        )
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Ленивое создание сессии внутри работающего event loop"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                raise_for_status=False
+            )
+        return self._session
+
+    async def post(
+            self,
+            path: str,
+            payload: Dict[str, Any],
+            token: Optional[str] = None,
+            timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        POST-запрос к iiko, возвращает распарсенный JSON.
+
+        Сетевые ошибки, таймауты, 5xx и 429 считаются отказом iiko и
+        размыкают автомат; пока он разомкнут, запрос сразу завершается
+        CircuitOpenError без обращения к серверу.
+        """
+        headers = {"Authorization": f"Bearer {token}"} if token else None
+        request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+
+        self.breaker.before_call()
+        async with self._semaphore:
+            try:
+                async with self._get_session().post(
+                    f"{self.base_url}{path}",
+                    json=payload,
+                    headers=headers,
+                    timeout=request_timeout
+                ) as response:
+                    if response.status >= 400:
+                        text = await response.text()
+                        raise IikoAPIError(response.status, text[:300])
+                    data = await response.json(content_type=None)
+            except IikoAPIError as e:
+                metrics.inc("iiko_requests_total", path=path, result=str(e.status))
+                if e.status >= 500 or e.status == 429:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                metrics.inc("iiko_requests_total", path=path, result="error")
+                self.breaker.record_failure()
+                raise
+
+        metrics.inc("iiko_requests_total", path=path, result="ok")
+        self.breaker.record_success()
+        return data
+
+    async def request(
+            self,
+            path: str,
+            payload: Dict[str, Any],
+            timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Авторизованный запрос; при 401 токен обновляется и запрос повторяется один раз"""
+        token = await self.tokens.get_token()
+        try:
+            return await self.post(path, payload, token=token, timeout=timeout)
+        except IikoAPIError as e:
+            if e.status != 401:
+                raise
+            logger.warning("Токен iiko отклонен, повторная авторизация")
+            self.tokens.invalidate(token)
+            token = await self.tokens.get_token()
+            return await self.post(path, payload, token=token, timeout=timeout)
+
+    async def close(self):
+        """Закрывает пул соединений"""
+        await self.tokens.close()
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_clients: Dict[Tuple[str, str], IikoClient] = {}
+
+
+def get_iiko_client(base_url: Optional[str] = None, api_login: Optional[str] = None) -> IikoClient:
+    """Возвращает общий клиент для указанного адреса и логина iiko"""
+    url = (base_url or settings.IIKO_API_URL).rstrip('/')
+    login = api_login or settings.IIKO_API_LOGIN
+    client = _clients.get((url, login))
+    if client is None:
+        client = _clients[(url, login)] = IikoClient(url, login)
+    return client
+
+
+async def close_iiko_clients():
+    """Закрывает все открытые клиенты iiko"""
+    for client in list(_clients.values()):
+        try:
+            await client.close()
+        except Exception as e:
+            logger.error(f"Ошибка закрытия клиента iiko: {e}")
+    _clients.clear()
@@ -0,0 +1,106 @@
+"""
+Генератор событий вебхуков iikoCloud для офлайн-проверки приемника.
+
+Пример:
+    python -m iiko_integration.fake_events --url http://localhost:8080/iiko/webhook \
+        --token secret --orders 1,2,3
+"""
+import argparse
+import asyncio
+import random
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from iiko_integration.webhooks import ORDER_STATUSES
+
+
+def _event(event_type: str, organization_id: str, info: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "eventType": event_type,
+        "eventTime": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+        "organizationId": organization_id,
+        "correlationId": str(uuid.uuid4()),
+        "eventInfo": info
+    }
+
+
+def order_update_event(
+        iiko_order_id: str,
+        status: str,
+        organization_id: str = "fake-org",
+        external_number: Optional[str] = None,
+        event_type: str = "DeliveryOrderUpdate"
+) -> Dict[str, Any]:
+    """Событие изменения заказа"""
+    return _event(event_type, organization_id, {
+        "id": iiko_order_id,
+        "posId": str(uuid.uuid4()),
+        "externalNumber": external_number,
+        "organizationId": organization_id,
+        "creationStatus": "Success",
+        "errorInfo": None,
+        "order": {"status": status}
+    })
+
+
+def stop_list_update_event(terminal_group_id: str, organization_id: str = "fake-org") -> Dict[str, Any]:
+    """Событие изменения стоп-листа группы терминалов"""
+    return _event("StopListUpdate", organization_id, {
+        "terminalGroupsStopListsUpdates": [{"id": terminal_group_id, "isFull": True}]
+    })
+
+
+def nomenclature_update_event(organization_id: str = "fake-org") -> Dict[str, Any]:
+    """Событие изменения номенклатуры"""
+    return _event("NomenclatureUpdate", organization_id, {})
+
+
+def random_order_events(order_ids: List[str], count: int, organization_id: str = "fake-org") -> List[Dict[str, Any]]:
+    """Случайные обновления статусов для заказов бота (по externalNumber)"""
+    statuses = list(ORDER_STATUSES)
+    return [
+        order_update_event(
+            f"fake-{order_id}",
+            random.choice(statuses),
+            organization_id=organization_id,
+            external_number=order_id
+        )
+        for order_id in random.choices(order_ids, k=count)
+    ]
+
+
+async def post_events(url: str, token: str, events: List[Dict[str, Any]]) -> int:
+    """Отправляет пачку событий в приемник, возвращает HTTP-статус"""
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, json=events, headers={"Authorization": token}) as response:
+            return response.status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отправка тестовых вебхуков iiko")
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--orders", default="", help="номера заказов бота через запятую")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--stop-list", dest="stop_list", help="id группы терминалов")
+    parser.add_argument("--nomenclature", action="store_true")
+    args = parser.parse_args()
+
+    events = []
+    order_ids = [i.strip() for i in args.orders.split(",") if i.strip()]
+    if order_ids:
+        events += random_order_events(order_ids, args.count)
+    if args.stop_list:
+        events.append(stop_list_update_event(args.stop_list))
+    if args.nomenclature:
+        events.append(nomenclature_update_event())
+
+    status = asyncio.run(post_events(args.url, args.token, events))
+    print(f"Отправлено событий: {len(events)}, ответ: {status}")
+
+
+if __name__ == "__main__":
+    main()
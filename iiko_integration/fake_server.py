@@ -0,0 +1,251 @@
+"""
+Локальная замена iikoCloud API для офлайн-проверки и нагрузочных тестов.
+
+Запуск:
+    python -m iiko_integration.fake_server --port 8081 --products 5000 \
+        --latency 0.2 --error-rate 0.05 --token-ttl 60
+
+Бот подключается к нему через IIKO_API_URL=http://127.0.0.1:8081
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+
+@dataclass
+class FakeIikoConfig:
+    """Параметры поддельного iiko"""
+    categories: int = 20
+    products: int = 500
+    modifiers: int = 100
+    latency: float = 0.05
+    jitter: float = 0.02
+    error_rate: float = 0.0
+    token_ttl: float = 3600.0
+    revision_interval: float = 0.0
+    stopped_products: int = 0
+    seed: Optional[int] = None
+
+
+def generate_nomenclature(config: FakeIikoConfig, revision: int) -> Dict[str, Any]:
+    """Номенклатура в формате /api/1/nomenclature заданного размера"""
+    rnd = random.Random(config.seed)
+    groups = [
+        {
+            "id": f"group-{i}",
+            "name": f"Категория {i}",
+            "order": i,
+            "isIncludedInMenu": True,
+            "isGroupModifier": False,
+            "isDeleted": False
+        }
+        for i in range(config.categories)
+    ]
+    groups.append({
+        "id": "group-modifiers",
+        "name": "Модификаторы",
+        "isIncludedInMenu": False,
+        "isGroupModifier": True,
+        "isDeleted": False
+    })
+    products = [
+        {
+            "id": f"product-{i}",
+            "name": f"Блюдо {i}",
+            "description": f"Описание блюда {i}",
+            "type": "Dish",
+            "order": i,
+            "parentGroup": f"group-{i % max(config.categories, 1)}",
+            "isDeleted": False,
+            "sizePrices": [{"sizeId": None, "price": {"currentPrice": rnd.randint(100, 1500)}}]
+        }
+        for i in range(config.products)
+    ]
+    products += [
+        {
+            "id": f"modifier-{i}",
+            "name": f"Добавка {i}",
+            "type": "Modifier",
+            "parentGroup": "group-modifiers",
+            "isDeleted": False,
+            "sizePrices": [{"sizeId": None, "price": {"currentPrice": rnd.randint(10, 100)}}]
+        }
+        for i in range(config.modifiers)
+    ]
+    return {
+        "correlationId": str(uuid.uuid4()),
+        "groups": groups,
+        "productCategories": [],
+        "products": products,
+        "sizes": [],
+        "revision": revision
+    }
+
+
+class FakeIikoServer:
+    """Обработчики поддельного iikoCloud API"""
+
+    def __init__(self, config: FakeIikoConfig):
+        self.config = config
+        self.tokens: Dict[str, float] = {}
+        self.orders: Dict[str, Dict[str, Any]] = {}
+        self.requests: Dict[str, int] = {}
+        self._started = time.monotonic()
+        self._revision = 1
+        self._nomenclature = generate_nomenclature(config, self._revision)
+
+    @property
+    def revision(self) -> int:
+        """Текущая ревизия; при revision_interval растет со временем"""
+        if self.config.revision_interval > 0:
+            revision = 1 + int((time.monotonic() - self._started) / self.config.revision_interval)
+            if revision != self._revision:
+                self._revision = revision
+                self._nomenclature = generate_nomenclature(self.config, revision)
+        return self._revision
+
+    async def _simulate(self, request: web.Request):
+        """Задержка и случайные отказы"""
+        self.requests[request.path] = self.requests.get(request.path, 0) + 1
+        delay = self.config.latency + random.uniform(0, self.config.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if random.random() < self.config.error_rate:
+            raise web.HTTPInternalServerError(text='{"errorDescription": "fake failure"}')
+
+    def _check_token(self, request: web.Request):
+        token = request.headers.get("Authorization", "").replace("Bearer ", "", 1)
+        expires_at = self.tokens.get(token)
+        if expires_at is None or expires_at < time.monotonic():
+            self.tokens.pop(token, None)
+            raise web.HTTPUnauthorized(text='{"errorDescription": "token expired"}')
+
+    async def access_token(self, request: web.Request) -> web.Response:
+        await self._simulate(request)
+        body = await request.json()
+        if not body.get("apiLogin"):
+            raise web.HTTPBadRequest(text='{"errorDescription": "apiLogin required"}')
+        token = uuid.uuid4().hex
+        self.tokens[token] = time.monotonic() + self.config.token_ttl
+        return web.json_response({"correlationId": str(uuid.uuid4()), "token": token})
+
+    async def nomenclature(self, request: web.Request) -> web.Response:
+        await self._simulate(request)
+        self._check_token(request)
+        body = await request.json()
+        revision = self.revision
+        if (body.get("startRevision") or 0) >= revision:
+            return web.json_response({
+                "correlationId": str(uuid.uuid4()),
+                "groups": [],
+                "productCategories": [],
+                "products": [],
+                "sizes": [],
+                "revision": revision
+            })
+        return web.json_response(self._nomenclature)
+
+    async def create_order(self, request: web.Request) -> web.Response:
+        await self._simulate(request)
+        self._check_token(request)
+        body = await request.json()
+        order_id = (body.get("order") or {}).get("id") or str(uuid.uuid4())
+        if order_id in self.orders:
+            raise web.HTTPBadRequest(text='{"errorDescription": "order with this id already exists"}')
+        self.orders[order_id] = body
+        return web.json_response({
+            "correlationId": str(uuid.uuid4()),
+            "orderInfo": {
+                "id": order_id,
+                "organizationId": body.get("organizationId"),
+                "creationStatus": "InProgress"
+            }
+        })
+
+    async def orders_by_id(self, request: web.Request) -> web.Response:
+        await self._simulate(request)
+        self._check_token(request)
+        body = await request.json()
+        return web.json_response({
+            "correlationId": str(uuid.uuid4()),
+            "orders": [
+                {
+                    "id": order_id,
+                    "organizationId": self.orders[order_id].get("organizationId"),
+                    "creationStatus": "Success"
+                }
+                for order_id in body.get("orderIds") or []
+                if order_id in self.orders
+            ]
+        })
+
+    async def stop_lists(self, request: web.Request) -> web.Response:
+        await self._simulate(request)
+        self._check_token(request)
+        body = await request.json()
+        stopped = [
+            {"productId": f"product-{i}", "balance": 0}
+            for i in range(min(self.config.stopped_products, self.config.products))
+        ]
+        return web.json_response({
+            "correlationId": str(uuid.uuid4()),
+            "terminalGroupStopLists": [
+                {
+                    "organizationId": organization_id,
+                    "items": [
+                        {"terminalGroupId": group_id, "items": stopped}
+                        for group_id in body.get("terminalGroupsIds") or ["terminal-group-1"]
+                    ]
+                }
+                for organization_id in body.get("organizationIds") or []
+            ]
+        })
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/1/access_token", self.access_token)
+        app.router.add_post("/api/1/nomenclature", self.nomenclature)
+        app.router.add_post("/api/1/orders/create", self.create_order)
+        app.router.add_post("/api/1/orders/by_id", self.orders_by_id)
+        app.router.add_post("/api/1/stop_lists", self.stop_lists)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена iikoCloud API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--modifiers", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="базовая задержка ответа, с")
+    parser.add_argument("--jitter", type=float, default=0.02, help="случайная добавка к задержке, с")
+    parser.add_argument("--error-rate", dest="error_rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--token-ttl", dest="token_ttl", type=float, default=3600.0)
+    parser.add_argument("--revision-interval", dest="revision_interval", type=float, default=0.0,
+                        help="как часто меняется ревизия меню, с (0 - никогда)")
+    parser.add_argument("--stopped-products", dest="stopped_products", type=int, default=0)
+    args = parser.parse_args()
+
+    config = FakeIikoConfig(
+        categories=args.categories,
+        products=args.products,
+        modifiers=args.modifiers,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        token_ttl=args.token_ttl,
+        revision_interval=args.revision_interval,
+        stopped_products=args.stopped_products
+    )
+    web.run_app(FakeIikoServer(config).create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import asyncio
+import hmac
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from database.crud import apply_order_status_updates
+from database.session import AsyncSessionLocal
+from services.iiko_service import IikoService
+from services.menu_cache import MenuCache
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ORDER_EVENTS = {"DeliveryOrderUpdate", "TableOrderUpdate"}
+ORDER_ERROR_EVENTS = {"DeliveryOrderError", "TableOrderError"}
+
+# Статусы заказов iiko -> статусы заказов бота
+ORDER_STATUSES = {
+    "Unconfirmed": "accepted",
+    "New": "accepted",
+    "WaitCooking": "accepted",
+    "ReadyForCooking": "accepted",
+    "CookingStarted": "cooking",
+    "CookingCompleted": "ready",
+    "Waiting": "ready",
+    "OnWay": "delivering",
+    "Delivered": "completed",
+    "Bill": "completed",
+    "Closed": "completed",
+    "Cancelled": "cancelled",
+    "Deleted": "cancelled",
+}
+
+
+def parse_order_event(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Достает из события заказа id в iiko, номер заказа бота и новый статус"""
+    info = event.get("eventInfo") or {}
+    iiko_order_id = info.get("id")
+    if not iiko_order_id:
+        return None
+
+    if event.get("eventType") in ORDER_ERROR_EVENTS or info.get("creationStatus") == "Error":
+        status = "failed"
+    else:
+        iiko_status = (info.get("order") or {}).get("status")
+        status = ORDER_STATUSES.get(iiko_status)
+        if status is None:
+            return None
+
+    external_number = str(info.get("externalNumber") or "")
+    return {
+        "iiko_order_id": iiko_order_id,
+        "order_id": int(external_number) if external_number.isdigit() else None,
+        "status": status
+    }
+
+
+class IikoWebhookHandler:
+    """
+    Приемник вебхуков iikoCloud.
+
+    Обновления заказов применяются к таблице orders одной пачкой на запрос,
+    обновления стоп-листов - к доступности товаров в кэше меню,
+    обновление номенклатуры запускает внеочередное обновление меню.
+    С apply_orders=False события заказов пропускаются: в режиме супервизора
+    их применяет только воркер 0, а кэш меню обновляет каждый воркер.
+    """
+
+    def __init__(self, menu_cache: MenuCache, iiko_service: IikoService, auth_token: str, apply_orders: bool = True):
+        self.menu_cache = menu_cache
+        self.iiko_service = iiko_service
+        self.auth_token = auth_token
+        self.apply_orders = apply_orders
+        self._background: set = set()
+
+    def _authorized(self, request: web.Request) -> bool:
+        header = request.headers.get("Authorization", "")
+        if header.startswith("Bearer "):
+            header = header[len("Bearer "):]
+        return bool(self.auth_token) and hmac.compare_digest(header, self.auth_token)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """HTTP-обработчик POST-запроса от iiko"""
+        if not self._authorized(request):
+            metrics.inc("iiko_webhook_requests_total", result="unauthorized")
+            return web.Response(status=401)
+
+        try:
+            events = json.loads(await request.read())
+        except ValueError:
+            metrics.inc("iiko_webhook_requests_total", result="bad_request")
+            return web.Response(status=400)
+
+        if isinstance(events, dict):
+            events = [events]
+
+        try:
+            await self.process_events(events)
+        except Exception as e:
+            logger.error(f"Ошибка обработки вебхука iiko: {e}", exc_info=True)
+            metrics.inc("iiko_webhook_requests_total", result="error")
+            return web.Response(status=500)
+
+        metrics.inc("iiko_webhook_requests_total", result="ok")
+        return web.Response(status=200)
+
+    async def process_events(self, events: List[Dict[str, Any]]):
+        """Применяет пачку событий iiko"""
+        order_updates: Dict[str, Dict[str, Any]] = {}
+        stop_list_groups: List[str] = []
+        nomenclature_changed = False
+
+        for event in events:
+            event_type = event.get("eventType")
+            metrics.inc("iiko_webhook_events_total", type=event_type or "unknown")
+
+            if event_type in ORDER_EVENTS or event_type in ORDER_ERROR_EVENTS:
+                if not self.apply_orders:
+                    continue
+                update = parse_order_event(event)
+                if update:
+                    # внутри пачки важен только последний статус заказа
+                    previous = order_updates.get(update["iiko_order_id"])
+                    if previous and update["order_id"] is None:
+                        update["order_id"] = previous["order_id"]
+                    order_updates[update["iiko_order_id"]] = update
+            elif event_type == "StopListUpdate":
+                info = event.get("eventInfo") or {}
+                stop_list_groups += [
+                    group["id"] for group in info.get("terminalGroupsStopListsUpdates") or []
+                ]
+            elif event_type == "NomenclatureUpdate":
+                nomenclature_changed = True
+
+        if order_updates:
+            async with AsyncSessionLocal() as session:
+                await apply_order_status_updates(session, list(order_updates.values()))
+
+        if stop_list_groups:
+            stop_lists = await self.iiko_service.get_stop_lists(stop_list_groups)
+            for group_id in stop_list_groups:
+                self.menu_cache.apply_stop_list(group_id, stop_lists.get(group_id, ()))
+
+        if nomenclature_changed:
+            task = asyncio.create_task(self.menu_cache.refresh())
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+
+def setup_iiko_webhook(app: web.Application, handler: IikoWebhookHandler, path: str):
+    """Подключает приемник вебхуков iiko к aiohttp-приложению"""
+    app.router.add_post(path, handler.handle)
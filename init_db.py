@@ -1,7 +1,12 @@
+from alembic import command
+from alembic.config import Config
 from sqlalchemy import select
+from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.session import async_engine, init_models, async_get_db
-from database.models import Base
+from database.session import async_engine, init_models, async_get_db, AsyncSessionLocal
+from database.crud import rebuild_daily_order_stats
+from pathlib import Path
+import argparse
 import asyncio
 import logging
 
@@ -12,6 +17,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+ALEMBIC_INI = Path(__file__).resolve().parent / "alembic.ini"
+
 
 async def check_database_connection():
     """Проверяет соединение с базой данных"""
@@ -26,18 +33,32 @@ async def check_database_connection():
         return False
 
 
+def _upgrade(connection: Connection):
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "migrations"))
+    config.attributes["connection"] = connection
+    command.upgrade(config, "head")
+
+
+async def run_migrations():
+    """Применяет недостающие миграции Alembic (уже примененные пропускаются)"""
+    async with async_engine.connect() as connection:
+        await connection.run_sync(_upgrade)
+        await connection.commit()
+
+
 async def initialize_database():
     """
     Полная инициализация базы данных:
-    1. Создает таблицы
+    1. Применяет миграции схемы
     2. Проверяет соединение
     3. Возвращает статус
     """
     try:
         logger.info("Начало инициализации базы данных...")
 
-        # Создание таблиц
-        await init_models()
+        # Миграции схемы
+        await run_migrations()
 
         # Проверка соединения
         if not await check_database_connection():
@@ -51,7 +72,34 @@ async def initialize_database():
         return False
 
 
+async def backfill_daily_order_stats():
+    """Пересчитывает сводку daily_order_stats по существующим заказам"""
+    try:
+        async with AsyncSessionLocal() as session:
+            buckets = await rebuild_daily_order_stats(session)
+        logger.info(f"✅ Сводка заказов пересчитана, строк: {buckets}")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Ошибка пересчета сводки заказов: {e}")
+        return False
+
+
+async def run(args):
+    if not await initialize_database():
+        return False
+    if args.backfill_stats:
+        return await backfill_daily_order_stats()
+    return True
+
+
 if __name__ == "__main__":
-    result = asyncio.run(initialize_database())
+    parser = argparse.ArgumentParser(description="Инициализация базы данных")
+    parser.add_argument(
+        "--backfill-stats",
+        dest="backfill_stats",
+        action="store_true",
+        help="пересчитать сводку daily_order_stats по существующим заказам"
+    )
+    result = asyncio.run(run(parser.parse_args()))
     if not result:
         exit(1)
\ No newline at end of file
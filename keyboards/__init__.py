@@ -1,9 +1,13 @@
 from .main import main_keyboard
 from .cart import cart_keyboard
 from .confirmation import confirmation_keyboard
+from .inline import menu_categories_keyboard, menu_products_keyboard, orders_page_keyboard
 
 __all__ = [
     'main_keyboard',
     'cart_keyboard',
-    'confirmation_keyboard'
-]
\ No newline at end of file
+    'confirmation_keyboard',
+    'menu_categories_keyboard',
+    'menu_products_keyboard',
+    'orders_page_keyboard'
+]
@@ -1,7 +1,11 @@
+from functools import lru_cache
+
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
 from aiogram.types import ReplyKeyboardMarkup, InlineKeyboardMarkup
 from database.models import UserRole
 
+# Статичные клавиатуры строятся один раз; готовая разметка не изменяется при отправке
+@lru_cache(maxsize=None)
 def get_admin_keyboard() -> ReplyKeyboardMarkup:
     """Основная клавиатура админ-панели"""
     builder = ReplyKeyboardBuilder()
@@ -14,6 +18,7 @@ def get_admin_keyboard() -> ReplyKeyboardMarkup:
     builder.adjust(2, 2, 1, 1)
     return builder.as_markup(resize_keyboard=True)
 
+@lru_cache(maxsize=None)
 def get_user_management_keyboard() -> ReplyKeyboardMarkup:
     """Клавиатура управления пользователями"""
     builder = ReplyKeyboardBuilder()
@@ -26,6 +31,7 @@ def get_user_management_keyboard() -> ReplyKeyboardMarkup:
     builder.adjust(2, 2, 1, 1)
     return builder.as_markup(resize_keyboard=True)
 
+@lru_cache(maxsize=None)
 def get_menu_management_keyboard() -> ReplyKeyboardMarkup:
     """Клавиатура управления меню"""
     builder = ReplyKeyboardBuilder()
@@ -38,6 +44,7 @@ def get_menu_management_keyboard() -> ReplyKeyboardMarkup:
     builder.adjust(2, 2, 1, 1)
     return builder.as_markup(resize_keyboard=True)
 
+@lru_cache(maxsize=None)
 def get_orders_management_keyboard() -> ReplyKeyboardMarkup:
     """Клавиатура управления заказами"""
     builder = ReplyKeyboardBuilder()
@@ -65,6 +72,7 @@ def get_role_selection_keyboard(user_id: int) -> InlineKeyboardMarkup:
     builder.adjust(2, 1)
     return builder.as_markup()
 
+@lru_cache(maxsize=32)
 def get_confirmation_keyboard(action: str) -> InlineKeyboardMarkup:
     """Клавиатура подтверждения действия"""
     builder = InlineKeyboardBuilder()
@@ -93,4 +101,20 @@ def get_pagination_keyboard(page: int, total_pages: int, prefix: str) -> InlineK
         text="Вперед ➡️",
         callback_data=f"{prefix}_page_{min(total_pages, page+1)}"
     )
-    return builder.as_markup()
\ No newline at end of file
+    return builder.as_markup()
+
+@lru_cache(maxsize=None)
+def get_broadcast_confirm_keyboard() -> InlineKeyboardMarkup:
+    """Подтверждение запуска рассылки"""
+    builder = InlineKeyboardBuilder()
+    builder.button(text="✅ Отправить всем", callback_data="broadcast_confirm")
+    builder.button(text="❌ Отмена", callback_data="broadcast_discard")
+    builder.adjust(2)
+    return builder.as_markup()
+
+@lru_cache(maxsize=32)
+def get_broadcast_progress_keyboard(broadcast_id: int) -> InlineKeyboardMarkup:
+    """Остановка идущей рассылки"""
+    builder = InlineKeyboardBuilder()
+    builder.button(text="⏹ Остановить", callback_data=f"broadcast_stop_{broadcast_id}")
+    return builder.as_markup()
@@ -1,11 +1,15 @@
+from functools import lru_cache
+
 from aiogram.utils.keyboard import ReplyKeyboardBuilder
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 
 
+@lru_cache(maxsize=None)
 def cart_keyboard() -> ReplyKeyboardMarkup:
     """
     Создает клавиатуру для управления корзиной
-    с использованием современного ReplyKeyboardBuilder
+    с использованием современного ReplyKeyboardBuilder.
+    Клавиатура статична, поэтому строится один раз.
     """
     builder = ReplyKeyboardBuilder()
     builder.button(text="💳 Оформить заказ")
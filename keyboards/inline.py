@@ -1,12 +1,95 @@
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from typing import Dict, Optional
 
-def menu_categories_keyboard(categories: list):
-    markup = InlineKeyboardMarkup()
+from aiogram.types import InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from services.menu_cache import MenuSnapshot
+
+
+def _build_categories_keyboard(categories) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
     for category in categories:
-        markup.add(
-            InlineKeyboardButton(
-                category["name"],
-                callback_data=f"category_{category['id']}"
-            )
+        builder.button(
+            text=category["name"],
+            callback_data=f"category_{category['id']}"
         )
-    return markup
\ No newline at end of file
+    builder.adjust(2)
+    return builder.as_markup()
+
+
+def _build_products_keyboard(products) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    for product in products[:10]:
+        builder.button(
+            text=f"{product['name']} - {product['price']}₽",
+            callback_data=f"product_{product['id']}"
+        )
+    builder.button(
+        text="⬅️ К категориям",
+        callback_data="menu_categories"
+    )
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+class MenuKeyboards:
+    """
+    Клавиатуры меню одной версии снимка. Категории строятся при первом
+    обращении к версии, товары - при первом открытии категории; дальше
+    разметка только переиспользуется.
+    """
+    __slots__ = ("version", "categories", "_menu", "_products")
+
+    def __init__(self, menu: MenuSnapshot):
+        self.version = menu.version
+        self.categories = _build_categories_keyboard(menu.categories)
+        self._menu = menu
+        self._products: Dict[str, InlineKeyboardMarkup] = {}
+
+    def products(self, category_id: str) -> Optional[InlineKeyboardMarkup]:
+        keyboard = self._products.get(category_id)
+        if keyboard is None and category_id in self._menu.categories_by_id:
+            keyboard = self._products[category_id] = _build_products_keyboard(
+                self._menu.category_products(category_id)
+            )
+        return keyboard
+
+
+_menu_keyboards: Optional[MenuKeyboards] = None
+
+
+def menu_keyboards(menu: MenuSnapshot) -> MenuKeyboards:
+    """Клавиатуры текущей версии меню; при смене версии старые отбрасываются"""
+    global _menu_keyboards
+    current = _menu_keyboards
+    if current is not None and current.version == menu.version:
+        return current
+    keyboards = MenuKeyboards(menu)
+    # снимок, устаревший еще до ответа, не вытесняет клавиатуры более новой версии
+    if current is None or menu.version > current.version:
+        _menu_keyboards = keyboards
+    return keyboards
+
+
+def menu_categories_keyboard(menu: MenuSnapshot) -> InlineKeyboardMarkup:
+    """Inline-клавиатура категорий меню"""
+    return menu_keyboards(menu).categories
+
+
+def menu_products_keyboard(menu: MenuSnapshot, category_id: str) -> InlineKeyboardMarkup:
+    """Inline-клавиатура товаров категории"""
+    keyboards = menu_keyboards(menu)
+    return keyboards.products(category_id) or keyboards.categories
+
+
+def orders_page_keyboard(newer: Optional[str], older: Optional[str]) -> Optional[InlineKeyboardMarkup]:
+    """Листание истории заказов; newer/older - курсоры соседних страниц"""
+    builder = InlineKeyboardBuilder()
+    if newer:
+        builder.button(text="⬅️ Новее", callback_data=f"orders_newer_{newer}")
+    if older:
+        builder.button(text="Старее ➡️", callback_data=f"orders_older_{older}")
+    if not newer and not older:
+        return None
+    builder.adjust(2)
+    return builder.as_markup()
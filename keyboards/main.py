@@ -1,5 +1,9 @@
+from functools import lru_cache
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 
+# Клавиатура статична: строится один раз, разметка переиспользуется во всех ответах
+@lru_cache(maxsize=None)
 def main_keyboard() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
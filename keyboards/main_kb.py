@@ -1,6 +1,9 @@
+from functools import lru_cache
+
 from aiogram.utils.keyboard import ReplyKeyboardBuilder
 from aiogram.types import ReplyKeyboardMarkup
 
+@lru_cache(maxsize=None)
 def main_keyboard() -> ReplyKeyboardMarkup:
     """Основная клавиатура"""
     builder = ReplyKeyboardBuilder()
@@ -1,13 +1,26 @@
 import logging
 from aiogram import Bot, Dispatcher, types
 from aiogram.client.default import DefaultBotProperties
-from aiogram.fsm.storage.memory import MemoryStorage
 from config.config import settings
 from handlers import register_handlers
 from handlers.cart import register_cart_handlers
+from handlers.menu import register_menu_handlers
 from database.cart_repository import CartRepository
+from database.writer import GroupCommitWriter
+from database.fsm_storage import DatabaseStorage
+from middlewares import ThrottlingMiddleware, UserMiddleware
 from services.iiko_service import IikoService
+from services.menu_cache import MenuCache
+from services.notifications import NotificationScheduler
+from services.broadcast import BroadcastService
+from services.order_queue import OrderSubmissionQueue
+from services.web_server import create_web_app, start_web_server, setup_telegram_webhook
+from services.supervisor import run_supervisor
+from iiko_integration.webhooks import IikoWebhookHandler, setup_iiko_webhook
+from init_db import initialize_database
+from iiko_integration.client import close_iiko_clients
 import asyncio
+import signal
 
 # Настройка логирования
 logging.basicConfig(
@@ -37,6 +50,7 @@ async def on_shutdown(bot: Bot):
     """Действия при завершении работы"""
     logger.info("⛔ Бот завершает работу")
     try:
+        await close_iiko_clients()
         await bot.session.close()
     except Exception as e:
         logger.error(f"Ошибка при закрытии сессии: {e}")
@@ -44,6 +58,10 @@ async def on_shutdown(bot: Bot):
 async def main():
     """Основная функция запуска бота"""
     try:
+        # Подготовка базы данных
+        if not await initialize_database():
+            raise RuntimeError("База данных не инициализирована")
+
         # Инициализация сервисов
         iiko_service = IikoService(
             api_login=settings.IIKO_API_LOGIN,
@@ -51,7 +69,20 @@ async def main():
             organization_id=settings.IIKO_ORG_ID,
             base_url=settings.IIKO_API_URL
         )
+        # Воркер 0 (или единственный процесс) отправляет заказы в iiko,
+        # применяет статусы заказов из вебхуков iiko и регистрирует вебхук Telegram
+        worker_id = settings.BOT_WORKER_ID
+        is_primary = worker_id in (None, 0)
+
         cart_repo = CartRepository()
+        db_writer = GroupCommitWriter()
+        # С вебхуками iiko меню и стоп-листы обновляются по событиям, опрос остается редким.
+        # Супервизор рассылает вебхуки iiko всем воркерам
+        menu_cache = MenuCache(
+            iiko_service,
+            ttl=settings.MENU_CACHE_PUSH_TTL if settings.IIKO_WEBHOOK_TOKEN else None
+        )
+        order_queue = OrderSubmissionQueue(iiko_service)
 
         # Инициализация бота
         bot = Bot(
@@ -62,38 +93,148 @@ async def main():
             )
         )
 
-        # Инициализация диспетчера
-        dp = Dispatcher(storage=MemoryStorage())
+        # Инициализация диспетчера: состояния FSM переживают перезапуск
+        fsm_storage = DatabaseStorage()
+        dp = Dispatcher(storage=fsm_storage)
+
+        # Исходящие сообщения (рассылки, уведомления) - через общую очередь с лимитами.
+        # Лимит Telegram общий для бота, поэтому воркеры делят его поровну
+        notifier = NotificationScheduler(
+            bot,
+            rate=settings.NOTIFY_GLOBAL_RATE / settings.BOT_WORKERS if worker_id is not None else None
+        )
+        dp["notifier"] = notifier
+        broadcaster = BroadcastService(notifier)
+        dp["broadcaster"] = broadcaster
+
+        # Лимиты нагрузки - до обращения к БД
+        dp.update.outer_middleware(ThrottlingMiddleware())
+
+        # Пользователь из БД для каждого апдейта (кэш + пакетная запись активности)
+        user_middleware = UserMiddleware()
+        dp.update.outer_middleware(user_middleware)
+        dp["user_middleware"] = user_middleware
 
         # Регистрация обработчиков
         register_handlers(dp)
-        register_cart_handlers(dp, cart_repo, iiko_service)
+        register_menu_handlers(dp, menu_cache)
+        register_cart_handlers(dp, cart_repo, order_queue, db_writer)
 
         # Подключение обработчиков жизненного цикла
         dp.startup.register(on_startup)
         dp.shutdown.register(on_shutdown)
 
-        # Удаление вебхука (на всякий случай)
-        await bot.delete_webhook(drop_pending_updates=True)
+        # Фоновое обновление меню, запись корзин и отправка заказов
+        menu_cache.start()
+        cart_repo.start()
+        user_middleware.start()
+        db_writer.start()
+        fsm_storage.start()
+        notifier.start()
+        broadcaster.start()
+        if is_primary:
+            await order_queue.start()
 
-        # Запуск бота
-        logger.info("Запуск бота...")
-        await dp.start_polling(
-            bot,
-            skip_updates=True,
-            allowed_updates=dp.resolve_used_update_types()
-        )
+        # HTTP-сервер: вебхуки Telegram и iiko, метрики
+        webhook_mode = settings.BOT_MODE == "webhook"
+        if webhook_mode or settings.IIKO_WEBHOOK_TOKEN:
+            web_app = create_web_app()
+            if settings.IIKO_WEBHOOK_TOKEN:
+                # статусы заказов применяет только воркер 0, стоп-листы и меню - каждый
+                setup_iiko_webhook(
+                    web_app,
+                    IikoWebhookHandler(
+                        menu_cache,
+                        iiko_service,
+                        settings.IIKO_WEBHOOK_TOKEN,
+                        apply_orders=is_primary
+                    ),
+                    settings.IIKO_WEBHOOK_PATH
+                )
+            if webhook_mode:
+                setup_telegram_webhook(
+                    web_app,
+                    dp,
+                    bot,
+                    settings.BOT_WEBHOOK_PATH,
+                    settings.BOT_WEBHOOK_SECRET
+                )
+            if worker_id is None:
+                web_runner = await start_web_server(web_app, settings.WEB_SERVER_HOST, settings.WEB_SERVER_PORT)
+            else:
+                # воркер слушает только локальный порт, запросы приходят от супервизора
+                web_runner = await start_web_server(web_app, "127.0.0.1", settings.BOT_WORKER_BASE_PORT + worker_id)
+
+        if webhook_mode and is_primary:
+            # Накопившиеся апдейты не сбрасываются: Telegram доставит их на вебхук
+            await bot.set_webhook(
+                url=settings.BOT_WEBHOOK_URL.rstrip("/") + settings.BOT_WEBHOOK_PATH,
+                secret_token=settings.BOT_WEBHOOK_SECRET,
+                allowed_updates=dp.resolve_used_update_types(),
+                max_connections=settings.BOT_WEBHOOK_MAX_CONNECTIONS,
+                drop_pending_updates=False
+            )
+            logger.info("Бот запущен в режиме webhook")
+
+        if webhook_mode:
+            # SIGTERM (от супервизора или systemd) - штатная остановка с записью корзин и FSM
+            stop = asyncio.Event()
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+            if worker_id is not None:
+                logger.info(f"Воркер {worker_id} запущен")
+            await stop.wait()
+        else:
+            # Удаление вебхука (на всякий случай)
+            await bot.delete_webhook(drop_pending_updates=True)
+
+            # Запуск бота
+            logger.info("Запуск бота...")
+            await dp.start_polling(
+                bot,
+                skip_updates=True,
+                allowed_updates=dp.resolve_used_update_types()
+            )
 
     except Exception as e:
         logger.critical(f"⛔ Критическая ошибка: {e}", exc_info=True)
     finally:
+        if 'web_runner' in locals():
+            await web_runner.cleanup()
+        if 'menu_cache' in locals():
+            await menu_cache.close()
+        if 'order_queue' in locals():
+            await order_queue.close()
+        if 'broadcaster' in locals():
+            await broadcaster.close()
+        if 'notifier' in locals():
+            await notifier.close()
+        if 'fsm_storage' in locals():
+            try:
+                await fsm_storage.close()
+            except Exception as e:
+                logger.error(f"Ошибка при сохранении состояний FSM: {e}")
+        if 'db_writer' in locals():
+            await db_writer.close()
+        if 'user_middleware' in locals():
+            try:
+                await user_middleware.close()
+            except Exception as e:
+                logger.error(f"Ошибка при сохранении активности пользователей: {e}")
+        if 'cart_repo' in locals():
+            try:
+                await cart_repo.close()
+            except Exception as e:
+                logger.error(f"Ошибка при сохранении корзин: {e}")
         if 'bot' in locals():
             await bot.session.close()
             logger.info("Сессия бота корректно закрыта")
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if settings.BOT_WORKERS > 1 and settings.BOT_WORKER_ID is None:
+            asyncio.run(run_supervisor())
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Бот остановлен вручную")
     except Exception as e:
@@ -0,0 +1,9 @@
+from .user import UserMiddleware, CachedUser
+from .throttling import ThrottlingMiddleware, Priority
+
+__all__ = [
+    'UserMiddleware',
+    'CachedUser',
+    'ThrottlingMiddleware',
+    'Priority'
+]
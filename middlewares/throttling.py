@@ -0,0 +1,198 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update, User as TelegramUser
+
+from config.config import settings
+from handlers.menu import MENU_BUTTONS
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Класс приоритета апдейта; меньше - важнее"""
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+# Оформление и подтверждение заказа
+HIGH_PRIORITY_TEXTS = {"💳 Оформить заказ", "🛒 Оформить заказ", "❌ Отменить заказ"}
+HIGH_PRIORITY_CALLBACKS = {"confirm_order"}
+
+# Просмотр меню, корзины и истории заказов
+LOW_PRIORITY_TEXTS = MENU_BUTTONS | {"/menu", "/cart", "/orders", "🛒 Корзина", "📦 Мои заказы"}
+LOW_PRIORITY_CALLBACK_PREFIXES = ("menu_categories", "category_", "product_", "orders_older_", "orders_newer_")
+
+SHED_ANSWER = "⏳ Сервис перегружен, попробуйте через пару секунд"
+THROTTLED_ANSWER = "⏳ Слишком часто, подождите немного"
+
+
+def update_priority(update: Update) -> Priority:
+    """Определяет приоритет апдейта по тексту кнопки или данным callback"""
+    if update.callback_query is not None:
+        data = update.callback_query.data or ""
+        if data in HIGH_PRIORITY_CALLBACKS:
+            return Priority.HIGH
+        if data.startswith(LOW_PRIORITY_CALLBACK_PREFIXES):
+            return Priority.LOW
+        return Priority.NORMAL
+
+    message = update.message
+    if message is not None:
+        if message.contact is not None or message.text in HIGH_PRIORITY_TEXTS:
+            return Priority.HIGH
+        if message.text in LOW_PRIORITY_TEXTS:
+            return Priority.LOW
+    return Priority.NORMAL
+
+
+class PriorityLimiter:
+    """
+    Ограничение числа одновременно выполняемых обработчиков.
+
+    Ожидающие апдейты получают освободившийся слот в порядке приоритета.
+    Низкоприоритетные не ждут: при занятости больше low_limit слотов они
+    отбрасываются, так что запас всегда остается для оформления заказов.
+    Обычные отбрасываются, когда очередь ожидания длиннее max_waiting.
+    """
+
+    def __init__(self, max_in_flight: int, low_limit: int, max_waiting: int):
+        self.max_in_flight = max_in_flight
+        self.low_limit = low_limit
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, priority: Priority) -> bool:
+        """Занимает слот; False - апдейт нужно отбросить"""
+        if priority == Priority.LOW:
+            if self.in_flight >= self.low_limit or self._waiters:
+                return False
+        elif priority == Priority.NORMAL and len(self._waiters) >= self.max_waiting:
+            return False
+
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return True
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # слот уже передан этому апдейту - вернем его следующему
+                self.release()
+            raise
+        return True
+
+    def release(self):
+        """Освобождает слот, передавая его самому приоритетному ожидающему"""
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Внешний middleware апдейтов: лимит частоты на пользователя (token bucket)
+    и общий лимит одновременных обработчиков с приоритетами.
+
+    Оформление заказа не ограничивается по частоте и не отбрасывается.
+    Отброшенные и ограниченные апдейты не доходят до БД и обработчиков;
+    на callback отвечаем коротким уведомлением, чтобы кнопка не «висела».
+    """
+
+    def __init__(
+            self,
+            rate: Optional[float] = None,
+            burst: Optional[int] = None,
+            max_in_flight: Optional[int] = None,
+            low_priority_share: Optional[float] = None,
+            max_waiting: Optional[int] = None
+    ):
+        self.rate = rate or settings.THROTTLE_RATE
+        self.burst = burst or settings.THROTTLE_BURST
+        max_in_flight = max_in_flight or settings.THROTTLE_MAX_IN_FLIGHT
+        self.limiter = PriorityLimiter(
+            max_in_flight,
+            max(1, int(max_in_flight * (low_priority_share or settings.THROTTLE_LOW_PRIORITY_SHARE))),
+            max_waiting or settings.THROTTLE_MAX_WAITING
+        )
+        self._buckets: Dict[int, Tuple[float, float]] = {}
+        self._purged_at = time.monotonic()
+
+    def _allow(self, user_id: int) -> bool:
+        """Списывает токен из корзины пользователя"""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(user_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        if tokens < 1:
+            self._buckets[user_id] = (tokens, now)
+            return False
+        self._buckets[user_id] = (tokens - 1, now)
+
+        # полностью восстановившиеся корзины не нужны
+        if now - self._purged_at > 60:
+            refill = self.burst / self.rate
+            self._buckets = {
+                key: value for key, value in self._buckets.items()
+                if now - value[1] < refill
+            }
+            self._purged_at = now
+        return True
+
+    @staticmethod
+    async def _reject(update: Update, text: str):
+        if update.callback_query is not None:
+            try:
+                await update.callback_query.answer(text)
+            except Exception as e:
+                logger.debug(f"Не удалось ответить на callback: {e}")
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        priority = update_priority(event)
+        label = priority.name.lower()
+        from_user: Optional[TelegramUser] = data.get("event_from_user")
+
+        if priority != Priority.HIGH and from_user is not None and not self._allow(from_user.id):
+            metrics.inc("throttled_updates_total", priority=label)
+            await self._reject(event, THROTTLED_ANSWER)
+            return None
+
+        if not await self.limiter.acquire(priority):
+            metrics.inc("shed_updates_total", priority=label)
+            await self._reject(event, SHED_ANSWER)
+            return None
+
+        metrics.set("handlers_in_flight", self.limiter.in_flight)
+        metrics.set("handlers_waiting", self.limiter.waiting)
+        try:
+            return await handler(event, data)
+        finally:
+            self.limiter.release()
+            metrics.set("handlers_in_flight", self.limiter.in_flight)
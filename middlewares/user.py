@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User as TelegramUser
+
+from config.config import settings
+from database.crud import ensure_user, find_user_role, touch_users
+from database.models import UserRole
+from database.session import AsyncSessionLocal, AsyncReadSessionLocal
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CachedUser(NamedTuple):
+    """Пользователь из БД, доступный обработчикам как db_user"""
+    id: int
+    role: UserRole
+
+
+async def fetch_user(telegram_id: int, full_name: str) -> CachedUser:
+    """
+    Пользователь из БД: поиск - через пул читателей, единственный
+    писатель занимается только для создания нового пользователя
+    """
+    async with AsyncReadSessionLocal() as session:
+        row = await find_user_role(session, telegram_id)
+    if row is None:
+        async with AsyncSessionLocal() as session:
+            row = await ensure_user(session, telegram_id, full_name)
+    return CachedUser(row.id, row.role)
+
+
+class UserMiddleware(BaseMiddleware):
+    """
+    Внешний middleware апдейтов: находит или создает пользователя в БД
+    и передает его в обработчики как db_user.
+
+    Известные пользователи берутся из LRU-кэша без запросов к БД; запись
+    живет не дольше cache_ttl секунд, чтобы подхватить смену роли из другого
+    воркера. last_activity копится в памяти и пишется пачкой раз в flush_interval секунд.
+    """
+
+    def __init__(
+            self,
+            cache_size: Optional[int] = None,
+            flush_interval: Optional[float] = None,
+            cache_ttl: Optional[float] = None
+    ):
+        self.cache_size = cache_size or settings.USER_CACHE_SIZE
+        self.flush_interval = flush_interval or settings.USER_ACTIVITY_FLUSH_INTERVAL
+        self.cache_ttl = cache_ttl or settings.USER_CACHE_TTL
+        self._users: "OrderedDict[int, Tuple[CachedUser, float]]" = OrderedDict()
+        self._activity: Dict[int, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        from_user: Optional[TelegramUser] = data.get("event_from_user")
+        if from_user is not None and not from_user.is_bot:
+            try:
+                user = await self.get_user(from_user)
+                data["db_user"] = user
+                self._activity[user.id] = datetime.utcnow()
+            except Exception as e:
+                logger.error(f"Ошибка получения пользователя {from_user.id}: {e}")
+        return await handler(event, data)
+
+    async def get_user(self, from_user: TelegramUser) -> CachedUser:
+        """Пользователь из кэша или из БД (с созданием при первом обращении)"""
+        cached = self._users.get(from_user.id)
+        if cached is not None and cached[1] > time.monotonic():
+            self._users.move_to_end(from_user.id)
+            metrics.inc("user_cache_total", result="hit")
+            return cached[0]
+
+        metrics.inc("user_cache_total", result="miss")
+        user = await fetch_user(from_user.id, from_user.full_name)
+        self._users[from_user.id] = (user, time.monotonic() + self.cache_ttl)
+        self._users.move_to_end(from_user.id)
+        if len(self._users) > self.cache_size:
+            self._users.popitem(last=False)
+        return user
+
+    def forget(self, telegram_id: int):
+        """Убирает пользователя из кэша (например, после смены роли)"""
+        self._users.pop(telegram_id, None)
+
+    async def flush(self):
+        """Записывает накопленные last_activity одним запросом"""
+        if not self._activity:
+            return
+        activity, self._activity = self._activity, {}
+        try:
+            async with AsyncSessionLocal() as session:
+                await touch_users(session, activity)
+        except BaseException:
+            # и при ошибке, и при отмене посреди записи: более свежие отметки,
+            # пришедшие во время записи, важнее старых
+            for user_id, ts in activity.items():
+                self._activity.setdefault(user_id, ts)
+            raise
+
+    def start(self):
+        """Запускает фоновую запись активности"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка записи активности пользователей: {e}")
+
+    async def close(self):
+        """Останавливает фоновую запись и сохраняет оставшуюся активность"""
+        if self._task is not None:
+            self._task.cancel()
+            # дождемся отмены: прерванная запись вернет свои отметки в _activity
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
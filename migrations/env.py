@@ -0,0 +1,54 @@
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy.engine import Connection
+
+from database.models import Base
+
+config = context.config
+target_metadata = Base.metadata
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    # полнотекстовый индекс users_fts создается миграциями вручную, его нет в моделях
+    return not (type_ == "table" and name.startswith("users_fts"))
+
+
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        # SQLite не умеет большинство ALTER TABLE - Alembic пересоздает таблицы
+        render_as_batch=connection.dialect.name == "sqlite"
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    """Миграции из командной строки: через асинхронный движок приложения"""
+    from database.session import async_engine
+
+    async with async_engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+        await connection.commit()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        # Вызов из init_db: соединение уже открыто приложением
+        do_run_migrations(connection)
+        return
+
+    if config.config_file_name is not None:
+        fileConfig(config.config_file_name, disable_existing_loggers=False)
+    asyncio.run(run_async_migrations())
+
+
+if context.is_offline_mode():
+    raise RuntimeError("Офлайн-режим миграций не поддерживается, используйте alembic upgrade head")
+
+run_migrations_online()
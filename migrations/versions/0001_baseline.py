@@ -0,0 +1,239 @@
+"""Базовая схема
+
+Создает недостающие таблицы и поднимает БД, созданные ранними версиями бота
+через create_all: добавляет отсутствующие колонки users и orders, заполняет
+role, last_activity, total и phone_digits, строит полнотекстовый индекс имен.
+Каждый шаг проверяет текущее состояние, поэтому ревизия безопасна для любой
+из этих баз.
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18 00:00:00
+
+"""
+import json
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_baseline"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+USER_ROLE = sa.Enum("CUSTOMER", "MANAGER", "ADMIN", "COURIER", name="userrole")
+
+USERS_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5("
+    "full_name, content='users', content_rowid='id', tokenize='unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN "
+    "INSERT INTO users_fts(rowid, full_name) VALUES (new.id, new.full_name); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, full_name) VALUES ('delete', old.id, old.full_name); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF full_name ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, full_name) VALUES ('delete', old.id, old.full_name); "
+    "INSERT INTO users_fts(rowid, full_name) VALUES (new.id, new.full_name); END",
+]
+
+
+def _create_tables(existing):
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("telegram_id", sa.Integer, nullable=False, unique=True),
+            sa.Column("full_name", sa.String(100)),
+            sa.Column("phone", sa.String(20), nullable=True),
+            sa.Column("phone_digits", sa.String(20), nullable=True),
+            sa.Column("role", USER_ROLE),
+            sa.Column("created_at", sa.DateTime),
+            sa.Column("last_activity", sa.DateTime),
+        )
+    if "orders" not in existing:
+        op.create_table(
+            "orders",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id")),
+            sa.Column("items", sa.JSON, nullable=False),
+            sa.Column("status", sa.String(20)),
+            sa.Column("total", sa.Integer, nullable=False, server_default="0"),
+            sa.Column("iiko_order_id", sa.String(50), nullable=True),
+            sa.Column("created_at", sa.DateTime),
+            sa.Column("updated_at", sa.DateTime),
+            sa.Column("courier_id", sa.Integer, sa.ForeignKey("users.id"), nullable=True),
+        )
+    if "order_outbox" not in existing:
+        op.create_table(
+            "order_outbox",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("order_id", sa.Integer, sa.ForeignKey("orders.id"), nullable=False),
+            sa.Column("organization_id", sa.String(50), nullable=False),
+            sa.Column("payload", sa.JSON, nullable=False),
+            sa.Column("status", sa.String(20)),
+            sa.Column("attempts", sa.Integer),
+            sa.Column("next_attempt_at", sa.DateTime),
+            sa.Column("last_error", sa.String(300), nullable=True),
+            sa.Column("created_at", sa.DateTime),
+            sa.Column("updated_at", sa.DateTime),
+        )
+    if "carts" not in existing:
+        op.create_table(
+            "carts",
+            sa.Column("user_id", sa.Integer, primary_key=True),
+            sa.Column("items", sa.JSON, nullable=False),
+            sa.Column("updated_at", sa.DateTime),
+        )
+    if "daily_order_stats" not in existing:
+        op.create_table(
+            "daily_order_stats",
+            sa.Column("day", sa.Date, primary_key=True),
+            sa.Column("status", sa.String(20), primary_key=True),
+            sa.Column("orders_count", sa.Integer, nullable=False),
+            sa.Column("revenue", sa.Integer, nullable=False),
+            sa.Column("items_count", sa.Integer, nullable=False),
+        )
+    if "menu_categories" not in existing:
+        op.create_table(
+            "menu_categories",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("name", sa.String(100), nullable=False),
+            sa.Column("iiko_id", sa.String(50), nullable=False, unique=True),
+            sa.Column("is_active", sa.Integer),
+            sa.Column("created_at", sa.DateTime),
+        )
+    if "menu_items" not in existing:
+        op.create_table(
+            "menu_items",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("name", sa.String(100), nullable=False),
+            sa.Column("description", sa.String(300)),
+            sa.Column("price", sa.Integer, nullable=False),
+            sa.Column("iiko_id", sa.String(50), nullable=False, unique=True),
+            sa.Column("category_id", sa.Integer, sa.ForeignKey("menu_categories.id")),
+            sa.Column("is_active", sa.Integer),
+            sa.Column("created_at", sa.DateTime),
+        )
+
+
+def _add_missing_columns(bind):
+    """Колонки, которых нет в БД, созданных ранними версиями моделей"""
+    inspector = sa.inspect(bind)
+    users = {column["name"] for column in inspector.get_columns("users")}
+    orders = {column["name"] for column in inspector.get_columns("orders")}
+
+    if "role" not in users:
+        USER_ROLE.create(bind, checkfirst=True)
+        op.add_column("users", sa.Column("role", USER_ROLE))
+    if "last_activity" not in users:
+        op.add_column("users", sa.Column("last_activity", sa.DateTime))
+    if "phone_digits" not in users:
+        op.add_column("users", sa.Column("phone_digits", sa.String(20), nullable=True))
+
+    if "updated_at" not in orders:
+        op.add_column("orders", sa.Column("updated_at", sa.DateTime))
+    if "courier_id" not in orders:
+        # в SQLite внешний ключ можно добавить только пересозданием таблицы
+        with op.batch_alter_table("orders") as batch:
+            batch.add_column(sa.Column(
+                "courier_id", sa.Integer,
+                sa.ForeignKey("users.id", name="fk_orders_courier_id_users"), nullable=True
+            ))
+    if "total" not in orders:
+        op.add_column("orders", sa.Column("total", sa.Integer, nullable=False, server_default="0"))
+
+    # заполнение только пустых значений - повторный запуск ничего не меняет
+    op.execute("UPDATE users SET role = 'CUSTOMER' WHERE role IS NULL")
+    op.execute("UPDATE users SET last_activity = created_at WHERE last_activity IS NULL")
+    op.execute("UPDATE orders SET updated_at = created_at WHERE updated_at IS NULL")
+    _fill_phone_digits(bind)
+    _fill_order_totals(bind)
+
+
+def _fill_phone_digits(bind, batch_size: int = 1000):
+    users = sa.table("users", sa.column("id"), sa.column("phone"), sa.column("phone_digits"))
+    rows = bind.execute(
+        sa.select(users.c.id, users.c.phone)
+        .where(users.c.phone.isnot(None), users.c.phone_digits.is_(None))
+    ).all()
+    updates = []
+    for row in rows:
+        digits = re.sub(r"\D", "", row.phone or "")
+        if len(digits) == 11 and digits.startswith("8"):
+            digits = "7" + digits[1:]
+        if digits:
+            updates.append({"b_id": row.id, "b_digits": digits})
+    for start in range(0, len(updates), batch_size):
+        bind.execute(
+            users.update()
+            .where(users.c.id == sa.bindparam("b_id"))
+            .values(phone_digits=sa.bindparam("b_digits")),
+            updates[start:start + batch_size]
+        )
+
+
+def _fill_order_totals(bind, batch_size: int = 1000):
+    """Сумма заказа в копейках из позиций (цены позиций - в рублях)"""
+    orders = sa.table("orders", sa.column("id"), sa.column("items"), sa.column("total"))
+    rows = bind.execute(sa.select(orders.c.id, orders.c["items"]).where(orders.c.total == 0)).all()
+    updates = []
+    for row in rows:
+        items = row[1]
+        items = json.loads(items) if isinstance(items, str) else items or []
+        total = sum(int(round((item.get("price") or 0) * 100)) * (item.get("quantity") or 0) for item in items)
+        if total:
+            updates.append({"b_id": row.id, "b_total": total})
+    for start in range(0, len(updates), batch_size):
+        bind.execute(
+            orders.update()
+            .where(orders.c.id == sa.bindparam("b_id"))
+            .values(total=sa.bindparam("b_total")),
+            updates[start:start + batch_size]
+        )
+
+
+def _create_users_fts(bind):
+    exists = bind.execute(sa.text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'"
+    )).first()
+    for statement in USERS_FTS_DDL:
+        op.execute(statement)
+    if not exists:
+        op.execute("INSERT INTO users_fts(users_fts) VALUES ('rebuild')")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    _create_tables(set(sa.inspect(bind).get_table_names()))
+    _add_missing_columns(bind)
+    op.create_index("ix_users_phone_digits", "users", ["phone_digits"], if_not_exists=True)
+    if bind.dialect.name == "sqlite":
+        _create_users_fts(bind)
+
+
+def downgrade() -> None:
+    """
+    Downgrade schema.
+
+    Удаляет все таблицы базовой схемы вместе с данными: откат к пустой БД.
+    Базы ранних версий бота восстановить так нельзя - только из резервной копии.
+    """
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        for trigger in ("users_fts_update", "users_fts_delete", "users_fts_insert"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS users_fts")
+    op.drop_index("ix_users_phone_digits", table_name="users", if_exists=True)
+
+    existing = set(sa.inspect(bind).get_table_names())
+    # зависимые таблицы удаляются раньше тех, на которые ссылаются
+    for table in (
+            "menu_items", "menu_categories", "daily_order_stats", "carts",
+            "order_outbox", "orders", "users"
+    ):
+        if table in existing:
+            op.drop_table(table)
+    USER_ROLE.drop(bind, checkfirst=True)
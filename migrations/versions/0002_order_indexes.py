@@ -0,0 +1,47 @@
+"""Индексы под запросы к заказам
+
+status+created_at - статистика и активные заказы, user_id+created_at -
+история заказов пользователя, courier_id+status - заказы курьера,
+status+next_attempt_at - выборка очереди отправки в iiko.
+В PostgreSQL индексы строятся CONCURRENTLY, без блокировки записи.
+
+Revision ID: 0002_order_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-18 00:00:01
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_order_indexes"
+down_revision: Union[str, Sequence[str], None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_orders_status_created_at", "orders", ["status", "created_at"]),
+    ("ix_orders_user_id_created_at", "orders", ["user_id", "created_at"]),
+    ("ix_orders_courier_id_status", "orders", ["courier_id", "status"]),
+    ("ix_order_outbox_status_next_attempt_at", "order_outbox", ["status", "next_attempt_at"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True)
+    op.execute("ANALYZE")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,36 @@
+"""Таблица состояний FSM
+
+Revision ID: 0003_fsm_states
+Revises: 0002_order_indexes
+Create Date: 2026-10-18 00:00:02
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_fsm_states"
+down_revision: Union[str, Sequence[str], None] = "0002_order_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if "fsm_states" not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            "fsm_states",
+            sa.Column("key", sa.String(200), primary_key=True),
+            sa.Column("state", sa.String(100), nullable=True),
+            sa.Column("data", sa.LargeBinary, nullable=True),
+            sa.Column("updated_at", sa.DateTime),
+        )
+    op.create_index("ix_fsm_states_updated_at", "fsm_states", ["updated_at"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_fsm_states_updated_at", table_name="fsm_states", if_exists=True)
+    op.drop_table("fsm_states")
@@ -0,0 +1,52 @@
+"""Рассылки и отметка о блокировке бота пользователем
+
+Revision ID: 0004_broadcasts
+Revises: 0003_fsm_states
+Create Date: 2026-10-18 00:00:03
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0004_broadcasts"
+down_revision: Union[str, Sequence[str], None] = "0003_fsm_states"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    if "bot_blocked_at" not in {c["name"] for c in inspector.get_columns("users")}:
+        with op.batch_alter_table("users") as batch_op:
+            batch_op.add_column(sa.Column("bot_blocked_at", sa.DateTime, nullable=True))
+
+    if "broadcasts" not in inspector.get_table_names():
+        op.create_table(
+            "broadcasts",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("admin_chat_id", sa.Integer, nullable=False),
+            sa.Column("progress_message_id", sa.Integer, nullable=True),
+            sa.Column("text", sa.String(4096), nullable=False),
+            sa.Column("status", sa.String(20)),
+            sa.Column("last_user_id", sa.Integer, nullable=False, server_default="0"),
+            sa.Column("total", sa.Integer, nullable=False, server_default="0"),
+            sa.Column("sent", sa.Integer, nullable=False, server_default="0"),
+            sa.Column("failed", sa.Integer, nullable=False, server_default="0"),
+            sa.Column("blocked", sa.Integer, nullable=False, server_default="0"),
+            sa.Column("lease_until", sa.DateTime, nullable=True),
+            sa.Column("created_at", sa.DateTime),
+            sa.Column("finished_at", sa.DateTime, nullable=True),
+        )
+    op.create_index("ix_broadcasts_status", "broadcasts", ["status"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_broadcasts_status", table_name="broadcasts", if_exists=True)
+    op.drop_table("broadcasts")
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("bot_blocked_at")
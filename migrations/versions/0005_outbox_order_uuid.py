@@ -0,0 +1,45 @@
+"""id заказа iiko в очереди отправки
+
+Revision ID: 0005_outbox_order_uuid
+Revises: 0004_broadcasts
+Create Date: 2026-10-18 00:00:04
+
+"""
+import uuid
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0005_outbox_order_uuid"
+down_revision: Union[str, Sequence[str], None] = "0004_broadcasts"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    columns = {c["name"] for c in sa.inspect(bind).get_columns("order_outbox")}
+    if "order_uuid" not in columns:
+        op.add_column("order_outbox", sa.Column("order_uuid", sa.String(36), nullable=True))
+
+    # уже созданным задачам - свой id на каждую строку
+    outbox = sa.table("order_outbox", sa.column("id"), sa.column("order_uuid"))
+    ids = bind.execute(sa.select(outbox.c.id).where(outbox.c.order_uuid.is_(None))).scalars().all()
+    if ids:
+        bind.execute(
+            outbox.update()
+            .where(outbox.c.id == sa.bindparam("b_id"))
+            .values(order_uuid=sa.bindparam("b_uuid")),
+            [{"b_id": outbox_id, "b_uuid": str(uuid.uuid4())} for outbox_id in ids]
+        )
+    with op.batch_alter_table("order_outbox") as batch_op:
+        batch_op.alter_column("order_uuid", existing_type=sa.String(36), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("order_outbox") as batch_op:
+        batch_op.drop_column("order_uuid")
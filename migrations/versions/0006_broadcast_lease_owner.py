@@ -0,0 +1,30 @@
+"""Владелец аренды рассылки
+
+Revision ID: 0006_broadcast_lease_owner
+Revises: 0005_outbox_order_uuid
+Create Date: 2026-10-18 00:00:05
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0006_broadcast_lease_owner"
+down_revision: Union[str, Sequence[str], None] = "0005_outbox_order_uuid"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("broadcasts")}
+    if "lease_owner" not in columns:
+        op.add_column("broadcasts", sa.Column("lease_owner", sa.String(32), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("broadcasts") as batch_op:
+        batch_op.drop_column("lease_owner")
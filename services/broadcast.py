@@ -0,0 +1,399 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.methods import EditMessageText
+from sqlalchemy import func, or_, select, update
+
+from config.config import settings
+from database.models import Broadcast, User
+from database.session import AsyncSessionLocal, AsyncReadSessionLocal
+from keyboards.admin_kb import get_broadcast_progress_keyboard
+from services.metrics import metrics
+from services.notifications import MessagePriority, NotificationScheduler
+
+logger = logging.getLogger(__name__)
+
+STATUS_TITLES = {
+    "running": "идет",
+    "completed": "завершена",
+    "cancelled": "остановлена",
+}
+
+
+def format_duration(seconds: float) -> str:
+    """Длительность для отчета: «1 ч 05 мин», «3 мин 20 с»"""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours} ч {minutes:02d} мин"
+    if minutes:
+        return f"{minutes} мин {seconds:02d} с"
+    return f"{seconds} с"
+
+
+class BroadcastService:
+    """
+    Рассылка сообщения всем пользователям через NotificationScheduler.
+
+    Получатели читаются пачками по возрастанию users.id (каждая пачка - короткий
+    запрос по первичному ключу, без долгой транзакции). После каждой пачки
+    счетчики и last_user_id сохраняются одной транзакцией, а пользователи,
+    заблокировавшие бота, получают bot_blocked_at и выпадают из следующих рассылок.
+
+    Рассылку ведет процесс, взявший аренду (lease_until) со своим токеном
+    (lease_owner). Аренда продлевается в фоне каждые lease_ttl / 3 секунд,
+    пока идет отправка, а контрольная точка и освобождение аренды
+    выполняются только при совпадении токена. Процесс, потерявший аренду,
+    прекращает отправку. Рассылки с истекшей арендой (процесс упал)
+    подхватываются фоновой задачей и продолжаются с контрольной точки.
+    Отправка «не менее одного раза»: пачка, прерванная падением, будет
+    отправлена заново.
+    """
+
+    def __init__(
+            self,
+            notifier: NotificationScheduler,
+            batch_size: Optional[int] = None,
+            progress_interval: Optional[float] = None,
+            lease_ttl: Optional[float] = None,
+            resume_interval: Optional[float] = None
+    ):
+        self.notifier = notifier
+        # пачка должна успевать уйти за половину аренды при лимите отправки этого процесса
+        self.batch_size = max(1, min(
+            batch_size or settings.BROADCAST_BATCH_SIZE,
+            int(notifier.rate * (lease_ttl or settings.BROADCAST_LEASE_TTL) / 2)
+        ))
+        self.progress_interval = progress_interval or settings.BROADCAST_PROGRESS_INTERVAL
+        self.lease_ttl = lease_ttl or settings.BROADCAST_LEASE_TTL
+        self.resume_interval = resume_interval or settings.BROADCAST_RESUME_INTERVAL
+        self._running: Dict[int, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def create(self, admin_chat_id: int, text: str) -> int:
+        """Создает рассылку, отправляет администратору сообщение о ходе и запускает ее"""
+        async with AsyncReadSessionLocal() as session:
+            total = await session.scalar(
+                select(func.count(User.id)).where(User.bot_blocked_at.is_(None))
+            )
+
+        progress = await self.notifier.send_message(admin_chat_id, f"📨 Рассылка: подготовка, получателей {total}")
+        async with AsyncSessionLocal() as session:
+            broadcast = Broadcast(
+                admin_chat_id=admin_chat_id,
+                progress_message_id=progress.message_id,
+                text=text,
+                status="running",
+                total=total
+            )
+            session.add(broadcast)
+            await session.commit()
+            broadcast_id = broadcast.id
+
+        logger.info(f"Рассылка {broadcast_id} создана, получателей: {total}")
+        self._launch(broadcast_id)
+        return broadcast_id
+
+    async def cancel(self, broadcast_id: int) -> bool:
+        """Останавливает рассылку; процесс, который ее ведет, увидит это на контрольной точке"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id, Broadcast.status == "running")
+                .values(status="cancelled", finished_at=datetime.utcnow())
+            )
+            await session.commit()
+        if result.rowcount != 1:
+            return False
+
+        task = self._running.get(broadcast_id)
+        if task is not None:
+            # недоставленные сообщения текущей пачки снимаются с очереди отправки
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        async with AsyncReadSessionLocal() as session:
+            broadcast = await session.get(Broadcast, broadcast_id)
+        await self._report(broadcast, "cancelled", 0)
+        return True
+
+    def _launch(self, broadcast_id: int):
+        if broadcast_id in self._running:
+            return
+        task = asyncio.create_task(self._run(broadcast_id))
+        self._running[broadcast_id] = task
+        task.add_done_callback(lambda _: self._running.pop(broadcast_id, None))
+
+    async def _claim(self, broadcast_id: int) -> Optional[Tuple[Broadcast, str]]:
+        """Берет аренду рассылки, если ее не ведет другой процесс; возвращает рассылку и токен"""
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                update(Broadcast)
+                .where(
+                    Broadcast.id == broadcast_id,
+                    Broadcast.status == "running",
+                    or_(Broadcast.lease_until.is_(None), Broadcast.lease_until < now)
+                )
+                .values(lease_until=now + timedelta(seconds=self.lease_ttl), lease_owner=token)
+            )
+            await session.commit()
+            if result.rowcount != 1:
+                return None
+            return await session.get(Broadcast, broadcast_id), token
+
+    async def _renew(self, broadcast_id: int, token: str) -> bool:
+        """Продлевает аренду; False - аренду взял другой процесс или рассылка остановлена"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                update(Broadcast)
+                .where(
+                    Broadcast.id == broadcast_id,
+                    Broadcast.status == "running",
+                    Broadcast.lease_owner == token
+                )
+                .values(lease_until=datetime.utcnow() + timedelta(seconds=self.lease_ttl))
+            )
+            await session.commit()
+        return result.rowcount == 1
+
+    async def _keep_lease(self, broadcast_id: int, token: str, runner: asyncio.Task):
+        """Продлевает аренду, пока идет отправка пачки; при потере аренды останавливает рассылку"""
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            try:
+                renewed = await self._renew(broadcast_id, token)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # до истечения аренды есть еще две попытки
+                logger.warning(f"Рассылка {broadcast_id}: не удалось продлить аренду: {e}")
+                continue
+            if not renewed:
+                logger.warning(f"Рассылка {broadcast_id}: аренда потеряна, отправка остановлена")
+                runner.cancel()
+                return
+
+    async def _release(self, broadcast_id: int, token: str):
+        """Освобождает аренду, только если ее держит этот процесс"""
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id, Broadcast.lease_owner == token)
+                .values(lease_until=None, lease_owner=None)
+            )
+            await session.commit()
+
+    async def _recipients(self, after_user_id: int) -> List:
+        async with AsyncReadSessionLocal() as session:
+            return (await session.execute(
+                select(User.id, User.telegram_id)
+                .where(User.id > after_user_id, User.bot_blocked_at.is_(None))
+                .order_by(User.id)
+                .limit(self.batch_size)
+            )).all()
+
+    async def _send_batch(self, recipients: List, text: str) -> Dict[str, List[int]]:
+        """Отправляет пачку; результат - id пользователей по исходу"""
+        results = await asyncio.gather(
+            *(
+                self.notifier.send_message(row.telegram_id, text, MessagePriority.BULK)
+                for row in recipients
+            ),
+            return_exceptions=True
+        )
+        outcome = {"sent": [], "blocked": [], "failed": []}
+        for row, result in zip(recipients, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, TelegramForbiddenError):
+                outcome["blocked"].append(row.id)
+            elif isinstance(result, Exception):
+                logger.warning(f"Рассылка: не удалось отправить пользователю {row.telegram_id}: {result}")
+                outcome["failed"].append(row.id)
+            else:
+                outcome["sent"].append(row.id)
+        return outcome
+
+    async def _checkpoint(
+            self,
+            broadcast: Broadcast,
+            token: str,
+            last_user_id: int,
+            outcome: Dict[str, List[int]]
+    ) -> Optional[str]:
+        """
+        Сохраняет результат пачки и продлевает аренду; возвращает текущий статус
+        или None, если аренду уже держит другой процесс (результат не сохраняется)
+        """
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as session:
+            if outcome["blocked"]:
+                await session.execute(
+                    update(User)
+                    .where(User.id.in_(outcome["blocked"]))
+                    .values(bot_blocked_at=now)
+                    .execution_options(synchronize_session=False)
+                )
+            result = await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast.id, Broadcast.lease_owner == token)
+                .values(
+                    last_user_id=last_user_id,
+                    sent=Broadcast.sent + len(outcome["sent"]),
+                    failed=Broadcast.failed + len(outcome["failed"]),
+                    blocked=Broadcast.blocked + len(outcome["blocked"]),
+                    lease_until=now + timedelta(seconds=self.lease_ttl)
+                )
+            )
+            if result.rowcount != 1:
+                await session.rollback()
+                return None
+            status = await session.scalar(select(Broadcast.status).where(Broadcast.id == broadcast.id))
+            await session.commit()
+
+        broadcast.last_user_id = last_user_id
+        broadcast.sent += len(outcome["sent"])
+        broadcast.failed += len(outcome["failed"])
+        broadcast.blocked += len(outcome["blocked"])
+        for name, ids in outcome.items():
+            metrics.inc("broadcast_messages_total", len(ids), result=name)
+        return status
+
+    async def _report(self, broadcast: Broadcast, status: str, rate: float):
+        """Обновляет сообщение администратора о ходе рассылки"""
+        done = broadcast.sent + broadcast.failed + broadcast.blocked
+        total = max(broadcast.total, done)
+        lines = [
+            f"📨 Рассылка #{broadcast.id}: {STATUS_TITLES.get(status, status)}",
+            "",
+            f"Обработано: {done} из {total} ({done * 100 // max(total, 1)}%)",
+            f"Доставлено: {broadcast.sent}",
+            f"Заблокировали бота: {broadcast.blocked}",
+            f"Ошибок: {broadcast.failed}",
+        ]
+        if status == "running" and rate > 0:
+            lines.append(f"Скорость: {rate:.1f} сообщ./с, осталось ~{format_duration((total - done) / rate)}")
+
+        try:
+            await self.notifier.submit(EditMessageText(
+                chat_id=broadcast.admin_chat_id,
+                message_id=broadcast.progress_message_id,
+                text="\n".join(lines),
+                reply_markup=get_broadcast_progress_keyboard(broadcast.id) if status == "running" else None
+            ))
+        except TelegramBadRequest as e:
+            logger.debug(f"Сообщение о ходе рассылки {broadcast.id} не обновлено: {e}")
+        except Exception as e:
+            logger.warning(f"Ошибка обновления хода рассылки {broadcast.id}: {e}")
+
+    async def _run(self, broadcast_id: int):
+        claimed = await self._claim(broadcast_id)
+        if claimed is None:
+            return
+        broadcast, token = claimed
+        keeper = asyncio.create_task(self._keep_lease(broadcast_id, token, asyncio.current_task()))
+        logger.info(f"Рассылка {broadcast_id}: продолжение с пользователя {broadcast.last_user_id}")
+
+        started = time.monotonic()
+        done_at_start = broadcast.sent + broadcast.failed + broadcast.blocked
+        reported_at = 0.0
+        status = "running"
+        try:
+            while status == "running":
+                recipients = await self._recipients(broadcast.last_user_id)
+                if not recipients:
+                    status = "completed"
+                    break
+
+                outcome = await self._send_batch(recipients, broadcast.text)
+                status = await self._checkpoint(broadcast, token, recipients[-1].id, outcome)
+                if status is None:
+                    logger.warning(f"Рассылка {broadcast_id}: аренда потеряна, отправку продолжает другой процесс")
+                    return
+
+                if time.monotonic() - reported_at >= self.progress_interval:
+                    done = broadcast.sent + broadcast.failed + broadcast.blocked - done_at_start
+                    await self._report(broadcast, status, done / max(time.monotonic() - started, 1e-6))
+                    reported_at = time.monotonic()
+
+            # дальше только запись итога и отчет - продлевать аренду больше не нужно
+            keeper.cancel()
+            if status == "completed":
+                async with AsyncSessionLocal() as session:
+                    result = await session.execute(
+                        update(Broadcast)
+                        .where(
+                            Broadcast.id == broadcast_id,
+                            Broadcast.status == "running",
+                            Broadcast.lease_owner == token
+                        )
+                        .values(
+                            status="completed",
+                            finished_at=datetime.utcnow(),
+                            lease_until=None,
+                            lease_owner=None
+                        )
+                    )
+                    await session.commit()
+                if result.rowcount != 1:
+                    logger.warning(f"Рассылка {broadcast_id}: итог не записан - аренда потеряна или рассылка остановлена")
+                    return
+            logger.info(
+                f"Рассылка {broadcast_id} {STATUS_TITLES.get(status, status)}: доставлено {broadcast.sent}, "
+                f"заблокировали {broadcast.blocked}, ошибок {broadcast.failed}"
+            )
+            await self._report(broadcast, status, 0)
+        except asyncio.CancelledError:
+            # остановка процесса или рассылки: отдаем аренду, чтобы продолжить без ожидания
+            # (если ее уже взял другой процесс, запрос ничего не изменит)
+            await self._release(broadcast_id, token)
+            raise
+        except Exception as e:
+            # аренда истечет, и рассылку подхватит фоновая задача
+            logger.error(f"Ошибка рассылки {broadcast_id}: {e}", exc_info=True)
+        finally:
+            keeper.cancel()
+
+    async def resume(self):
+        """Запускает рассылки, которые никто не ведет (процесс упал или перезапущен)"""
+        async with AsyncReadSessionLocal() as session:
+            ids = (await session.scalars(
+                select(Broadcast.id).where(
+                    Broadcast.status == "running",
+                    or_(Broadcast.lease_until.is_(None), Broadcast.lease_until < datetime.utcnow())
+                )
+            )).all()
+        for broadcast_id in ids:
+            self._launch(broadcast_id)
+
+    def start(self):
+        """Запускает фоновое продолжение прерванных рассылок"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._resume_loop())
+
+    async def _resume_loop(self):
+        while True:
+            try:
+                await self.resume()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка продолжения рассылок: {e}")
+            await asyncio.sleep(self.resume_interval)
+
+    async def close(self):
+        """Останавливает рассылки; они продолжатся с контрольной точки после запуска"""
+        tasks = list(self._running.values())
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
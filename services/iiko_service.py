@@ -1,39 +1,108 @@
 import logging
-from typing import List, Dict
-import requests
+from typing import List, Dict, Any, Optional, Set
+from iiko_integration.client import get_iiko_client
 
 logger = logging.getLogger(__name__)
 
 
 class IikoService:
-    def __init__(self, api_login: str, password: str, organization_id: str,
+    def __init__(self, api_login: str, api_password: str, organization_id: str,
                  base_url: str = "https://api-ru.iiko.services"):
         """
         Инициализация сервиса iiko
 
         :param api_login: Логин API iiko
-        :param password: Пароль API iiko
+        :param api_password: Пароль API iiko
         :param organization_id: ID организации в iiko
         :param base_url: Базовый URL API (по умолчанию https://api-ru.iiko.services)
         """
         self.api_login = api_login
-        self.password = password
+        self.api_password = api_password
         self.organization_id = organization_id
         self.base_url = base_url
-        self.token = None
-        self.token_expires = None
+        self.client = get_iiko_client(base_url, api_login)
 
-    async def create_order(self, user_id: int, items: List[Dict]) -> str:
-        """Создание заказа в iiko"""
+    async def get_menu(self, start_revision: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Загрузка номенклатуры организации из iiko
+
+        :param start_revision: Ревизия, которая уже есть у клиента. Если она не
+            устарела, iiko вернет только номер ревизии без списков
+        """
         try:
-            if not self.token:
-                await self._authenticate()
+            payload = {"organizationId": self.organization_id}
+            if start_revision:
+                payload["startRevision"] = start_revision
+
+            return await self.client.request("/api/1/nomenclature", payload)
+
+        except Exception as e:
+            logger.error(f"Error loading menu: {e}")
+            return None
+
+    async def get_stop_lists(self, terminal_group_ids: Optional[List[str]] = None) -> Dict[str, Set[str]]:
+        """Стоп-листы организации: id группы терминалов -> id товаров на стопе"""
+        payload: Dict[str, Any] = {"organizationIds": [self.organization_id]}
+        if terminal_group_ids:
+            payload["terminalGroupsIds"] = terminal_group_ids
 
-            # Здесь реализация создания заказа
-            # ...
+        data = await self.client.request("/api/1/stop_lists", payload)
+        stop_lists: Dict[str, Set[str]] = {}
+        for organization in data.get("terminalGroupStopLists") or []:
+            for group in organization.get("items") or []:
+                stop_lists[group["terminalGroupId"]] = {
+                    item["productId"] for item in group.get("items") or []
+                }
+        return stop_lists
 
-            return "12345"  # Временная заглушка - вернем фиктивный номер заказа
+    @staticmethod
+    def build_order(user_id: int, items: List[Dict]) -> Dict[str, Any]:
+        """Формирует тело заказа iiko из позиций корзины"""
+        return {
+            "externalNumber": str(user_id),
+            "items": [
+                {
+                    "productId": item['product_id'],
+                    "type": "Product",
+                    "amount": item['quantity']
+                }
+                for item in items
+            ]
+        }
+
+    async def submit_order(self, order: Dict[str, Any], organization_id: Optional[str] = None) -> str:
+        """Отправляет готовый заказ в iiko и возвращает его идентификатор"""
+        data = await self.client.request(
+            "/api/1/orders/create",
+            {
+                "organizationId": organization_id or self.organization_id,
+                "order": order
+            }
+        )
+        return data.get("orderInfo", {}).get("id")
+
+    async def find_order(self, order_id: str, organization_id: Optional[str] = None) -> Optional[str]:
+        """
+        Ищет заказ по id, заданному при отправке; возвращает id, если iiko
+        его принял (создан или еще создается), иначе None
+        """
+        data = await self.client.request(
+            "/api/1/orders/by_id",
+            {
+                "organizationIds": [organization_id or self.organization_id],
+                "orderIds": [order_id]
+            }
+        )
+        for order in data.get("orders") or []:
+            if order.get("id") == order_id and order.get("creationStatus") != "Error":
+                return order_id
+        return None
+
+    async def create_order(self, user_id: int, items: List[Dict]) -> str:
+        """Создание заказа в iiko"""
+        try:
+            return await self.submit_order(self.build_order(user_id, items))
 
         except Exception as e:
             logger.error(f"Error creating order: {e}")
-            raise
\ No newline at end of file
+            raise
@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+from config.config import settings
+from services.iiko_service import IikoService
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class MenuSnapshot:
+    """
+    Неизменяемый разобранный снимок номенклатуры iiko.
+
+    version - счетчик снимков процесса (для кэшей в памяти), fingerprint -
+    идентификатор содержимого, одинаковый во всех процессах и после
+    перезапуска (его можно сохранять, например, в данных FSM).
+    """
+    version: int
+    revision: int
+    fingerprint: str
+    categories: Tuple[Mapping[str, Any], ...]
+    products: Tuple[Mapping[str, Any], ...]
+    loaded_at: float
+    categories_by_id: Mapping[str, Mapping[str, Any]]
+    products_by_id: Mapping[str, Mapping[str, Any]]
+    products_by_category: Mapping[str, Tuple[Mapping[str, Any], ...]]
+
+    def category_products(self, category_id: str) -> Tuple[Mapping[str, Any], ...]:
+        """Товары категории в порядке отображения"""
+        return self.products_by_category.get(category_id, ())
+
+
+def _product_price(product: Dict[str, Any]) -> float:
+    for size_price in product.get("sizePrices") or []:
+        price = (size_price.get("price") or {}).get("currentPrice")
+        if price is not None:
+            return price
+    return 0
+
+
+def _display_order(item: Mapping[str, Any]):
+    return item["order"], item["name"]
+
+
+def _menu_fingerprint(revision: int, categories, products) -> str:
+    """Ревизия iiko, а если ее нет - хеш того, что видит пользователь"""
+    if revision:
+        return f"r{revision}"
+    digest = hashlib.blake2b(digest_size=12)
+    for category in categories:
+        digest.update(f"c|{category['id']}|{category['name']}\n".encode())
+    for product in products:
+        digest.update(f"p|{product['id']}|{product['parentGroup']}|{product['name']}|{product['price']}\n".encode())
+    return f"h{digest.hexdigest()}"
+
+
+def parse_nomenclature(data: Dict[str, Any], version: int) -> MenuSnapshot:
+    """Разбирает ответ /api/1/nomenclature в снимок меню с готовыми индексами"""
+    categories = sorted((
+        MappingProxyType({
+            "id": group["id"],
+            "name": group.get("name") or "",
+            "order": group.get("order") or 0
+        })
+        for group in data.get("groups") or []
+        if not group.get("isDeleted")
+        and not group.get("isGroupModifier")
+        and group.get("isIncludedInMenu", True)
+    ), key=_display_order)
+    products = sorted((
+        MappingProxyType({
+            "id": product["id"],
+            "name": product.get("name") or "",
+            "description": product.get("description") or "",
+            "parentGroup": product.get("parentGroup"),
+            "price": _product_price(product),
+            "order": product.get("order") or 0
+        })
+        for product in data.get("products") or []
+        if not product.get("isDeleted")
+        and product.get("type") != "Modifier"
+        and product.get("parentGroup")
+    ), key=_display_order)
+
+    by_category: Dict[str, List[Mapping[str, Any]]] = {}
+    for product in products:
+        by_category.setdefault(product["parentGroup"], []).append(product)
+
+    revision = data.get("revision") or 0
+    return MenuSnapshot(
+        version=version,
+        revision=revision,
+        fingerprint=_menu_fingerprint(revision, categories, products),
+        categories=tuple(categories),
+        products=tuple(products),
+        loaded_at=time.time(),
+        categories_by_id=MappingProxyType({c["id"]: c for c in categories}),
+        products_by_id=MappingProxyType({p["id"]: p for p in products}),
+        products_by_category=MappingProxyType(
+            {category_id: tuple(items) for category_id, items in by_category.items()}
+        )
+    )
+
+
+class MenuCache:
+    """
+    Общий для процесса кэш меню.
+
+    Читатели всегда получают текущий снимок без обращения к iiko.
+    Фоновое обновление запрашивает номенклатуру с startRevision и
+    разбирает ответ только если ревизия изменилась. Если iiko недоступен,
+    продолжает отдаваться последний удачный снимок с признаком is_stale.
+    Стоп-листы загружаются целиком при старте и на каждом обновлении,
+    между ними - точечно по вебхукам iiko.
+    """
+
+    def __init__(self, iiko_service: IikoService, ttl: Optional[float] = None):
+        self.iiko_service = iiko_service
+        self.ttl = ttl or settings.MENU_CACHE_TTL
+        self._snapshot: Optional[MenuSnapshot] = None
+        self._version = 0
+        self._loading: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stale = False
+        self._stop_lists: Dict[str, FrozenSet[str]] = {}
+        self._stopped: FrozenSet[str] = frozenset()
+
+    @property
+    def is_stale(self) -> bool:
+        """Последнее обновление не удалось, снимок может быть неактуальным"""
+        return self._stale
+
+    def is_available(self, product_id: str) -> bool:
+        """Товар не стоит на стопе ни в одной группе терминалов"""
+        return product_id not in self._stopped
+
+    @property
+    def stopped_products(self) -> FrozenSet[str]:
+        """Товары на стопе; при каждом изменении стоп-листа - новый объект"""
+        return self._stopped
+
+    def apply_stop_list(self, terminal_group_id: str, product_ids: Iterable[str]):
+        """Заменяет стоп-лист одной группы терминалов"""
+        self._stop_lists[terminal_group_id] = frozenset(product_ids)
+        self._stopped = frozenset().union(*self._stop_lists.values())
+        metrics.set("menu_stopped_products", len(self._stopped))
+
+    async def refresh_stop_lists(self):
+        """Загружает стоп-листы всех групп терминалов организации целиком"""
+        stop_lists = await self.iiko_service.get_stop_lists()
+        self._stop_lists = {group_id: frozenset(ids) for group_id, ids in stop_lists.items()}
+        self._stopped = frozenset().union(*self._stop_lists.values())
+        metrics.set("menu_stopped_products", len(self._stopped))
+
+    def _set_stale(self, stale: bool):
+        self._stale = stale
+        metrics.set("menu_cache_stale", int(stale))
+
+    @property
+    def snapshot(self) -> Optional[MenuSnapshot]:
+        """Текущий снимок меню (может отсутствовать до первой загрузки)"""
+        return self._snapshot
+
+    async def get(self) -> Optional[MenuSnapshot]:
+        """Возвращает снимок меню, при холодном старте дожидается загрузки"""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        return await self.refresh()
+
+    async def refresh(self) -> Optional[MenuSnapshot]:
+        """Обновляет меню; одновременные вызовы ждут одну загрузку"""
+        if self._loading is None or self._loading.done():
+            self._loading = asyncio.ensure_future(self._load())
+        return await asyncio.shield(self._loading)
+
+    async def _load(self) -> Optional[MenuSnapshot]:
+        current = self._snapshot
+        data = await self.iiko_service.get_menu(
+            start_revision=current.revision if current else None
+        )
+        if data is None:
+            metrics.inc("menu_refresh_total", result="error")
+            self._set_stale(current is not None)
+            return current
+
+        metrics.inc("menu_refresh_total", result="ok")
+        self._set_stale(False)
+        revision = data.get("revision") or 0
+        if current is not None and revision and revision <= current.revision:
+            return current
+
+        self._version += 1
+        snapshot = parse_nomenclature(data, self._version)
+        self._snapshot = snapshot
+        logger.info(
+            f"Меню обновлено: ревизия {snapshot.revision}, "
+            f"{len(snapshot.categories)} категорий, {len(snapshot.products)} позиций"
+        )
+        return snapshot
+
+    def start(self):
+        """Запускает фоновое обновление меню"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        # первый проход - при старте: до него все товары считались бы доступными
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка фонового обновления меню: {e}")
+            try:
+                await self.refresh_stop_lists()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка загрузки стоп-листов: {e}")
+            await asyncio.sleep(self.ttl)
+
+    async def close(self):
+        """Останавливает фоновое обновление"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,99 @@
+import logging
+from typing import Any, Dict, List
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import MenuCategory, MenuItem
+from services.menu_cache import MenuSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+def _price_kopecks(price) -> int:
+    return int(round((price or 0) * 100))
+
+
+async def _sync_table(
+        session: AsyncSession,
+        model,
+        rows: Dict[str, Dict[str, Any]],
+        fields: List[str]
+) -> Dict[str, int]:
+    """
+    Сверяет таблицу с данными iiko по iiko_id и применяет изменения пачками:
+    один executemany на вставку, один на обновление и один UPDATE на скрытие.
+    """
+    existing = (await session.execute(
+        select(model.id, model.iiko_id, model.is_active, *(getattr(model, f) for f in fields))
+    )).all()
+    existing_by_iiko_id = {row.iiko_id: row for row in existing}
+
+    inserts = []
+    updates = []
+    for iiko_id, values in rows.items():
+        row = existing_by_iiko_id.get(iiko_id)
+        if row is None:
+            inserts.append({"iiko_id": iiko_id, "is_active": 1, **values})
+        elif not row.is_active or any(getattr(row, f) != values[f] for f in fields):
+            updates.append({"id": row.id, "is_active": 1, **values})
+
+    deactivate = [
+        row.id for row in existing
+        if row.is_active and row.iiko_id not in rows
+    ]
+
+    if inserts:
+        await session.execute(insert(model), inserts)
+    if updates:
+        await session.execute(update(model), updates)
+    if deactivate:
+        await session.execute(
+            update(model)
+            .where(model.id.in_(deactivate))
+            .values(is_active=0)
+            .execution_options(synchronize_session=False)
+        )
+
+    return {"inserted": len(inserts), "updated": len(updates), "deactivated": len(deactivate)}
+
+
+async def import_menu(session: AsyncSession, menu: MenuSnapshot) -> Dict[str, Dict[str, int]]:
+    """
+    Синхронизирует таблицы menu_categories и menu_items со снимком меню iiko
+    одной транзакцией. Цены позиций хранятся в копейках.
+    """
+    try:
+        categories = await _sync_table(
+            session,
+            MenuCategory,
+            {c["id"]: {"name": c["name"][:100]} for c in menu.categories},
+            ["name"]
+        )
+
+        category_ids = dict((await session.execute(
+            select(MenuCategory.iiko_id, MenuCategory.id)
+        )).all())
+
+        items = await _sync_table(
+            session,
+            MenuItem,
+            {
+                p["id"]: {
+                    "name": p["name"][:100],
+                    "description": (p["description"] or "")[:300],
+                    "price": _price_kopecks(p["price"]),
+                    "category_id": category_ids.get(p["parentGroup"])
+                }
+                for p in menu.products
+            },
+            ["name", "description", "price", "category_id"]
+        )
+
+        await session.commit()
+        logger.info(f"Импорт меню из iiko: категории {categories}, позиции {items}")
+        return {"categories": categories, "items": items}
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Error in import_menu: {e}")
+        raise
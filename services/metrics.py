@@ -0,0 +1,48 @@
+from collections import defaultdict
+from typing import Dict, Tuple
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Metrics:
+    """Простой реестр счетчиков и показателей процесса"""
+
+    def __init__(self):
+        self._counters: Dict[LabelKey, float] = defaultdict(float)
+        self._gauges: Dict[LabelKey, float] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> LabelKey:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Увеличивает счетчик"""
+        self._counters[self._key(name, labels)] += value
+
+    def set(self, name: str, value: float, **labels):
+        """Устанавливает текущее значение показателя"""
+        self._gauges[self._key(name, labels)] = value
+
+    def get(self, name: str, **labels) -> float:
+        """Текущее значение счетчика или показателя"""
+        key = self._key(name, labels)
+        if key in self._gauges:
+            return self._gauges[key]
+        return self._counters.get(key, 0)
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus"""
+        lines = []
+        for kind, values in (("counter", self._counters), ("gauge", self._gauges)):
+            seen = set()
+            for (name, labels), value in sorted(values.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} {kind}")
+                    seen.add(name)
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Глобальный реестр метрик
+metrics = Metrics()
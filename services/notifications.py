@@ -0,0 +1,272 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import SendMessage, TelegramMethod
+
+from config.config import settings
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class MessagePriority(IntEnum):
+    """Приоритет исходящего сообщения; меньше - важнее"""
+    TRANSACTIONAL = 0
+    BULK = 1
+
+
+class _Job:
+    __slots__ = ("method", "priority", "future", "attempts")
+
+    def __init__(self, method: TelegramMethod, priority: MessagePriority, future: asyncio.Future):
+        self.method = method
+        self.priority = priority
+        self.future = future
+        self.attempts = 0
+
+
+class _Chat:
+    __slots__ = ("queues", "next_at", "busy", "version")
+
+    def __init__(self):
+        self.queues: Tuple[Deque[_Job], Deque[_Job]] = (deque(), deque())
+        self.next_at = 0.0
+        self.busy = False
+        self.version = 0
+
+    def head(self) -> Optional[_Job]:
+        for queue in self.queues:
+            if queue:
+                return queue[0]
+        return None
+
+
+class NotificationScheduler:
+    """
+    Единая очередь исходящих сообщений бота с учетом лимитов Telegram.
+
+    - общий token bucket на rate сообщений в секунду;
+    - в один чат не чаще раза в chat_interval секунд (группы - group_chat_interval),
+      сообщения одного чата уходят по очереди;
+    - 429 (retry_after) откладывает только свой чат, остальные продолжают отправку;
+    - транзакционные сообщения обгоняют массовые как внутри чата, так и между чатами.
+
+    Отправитель ждет результат: send_message возвращает Message или
+    пробрасывает ошибку Telegram (например, TelegramForbiddenError).
+    """
+
+    def __init__(
+            self,
+            bot: Bot,
+            rate: Optional[float] = None,
+            chat_interval: Optional[float] = None,
+            group_chat_interval: Optional[float] = None,
+            max_attempts: Optional[int] = None
+    ):
+        self.bot = bot
+        self.rate = rate or settings.NOTIFY_GLOBAL_RATE
+        self.chat_interval = chat_interval or settings.NOTIFY_CHAT_INTERVAL
+        self.group_chat_interval = group_chat_interval or settings.NOTIFY_GROUP_CHAT_INTERVAL
+        self.max_attempts = max_attempts or settings.NOTIFY_MAX_ATTEMPTS
+        self._chats: Dict[Any, _Chat] = {}
+        # готовые к отправке чаты: (приоритет головы, порядок, версия, чат)
+        self._ready: List[Tuple[int, int, int, Any]] = []
+        # отложенные чаты: (когда можно слать, порядок, версия, чат)
+        self._delayed: List[Tuple[float, int, int, Any]] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._tokens = float(self.rate)
+        self._tokens_at = time.monotonic()
+        self._sending: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._purged_at = time.monotonic()
+
+    @property
+    def pending(self) -> int:
+        return sum(len(q) for chat in self._chats.values() for q in chat.queues)
+
+    async def send_message(
+            self,
+            chat_id: int,
+            text: str,
+            priority: MessagePriority = MessagePriority.TRANSACTIONAL,
+            **kwargs
+    ):
+        """Ставит sendMessage в очередь и ждет результата"""
+        return await self.submit(SendMessage(chat_id=chat_id, text=text, **kwargs), priority)
+
+    def submit(self, method: TelegramMethod, priority: MessagePriority = MessagePriority.TRANSACTIONAL) -> asyncio.Future:
+        """Ставит метод Bot API с полем chat_id в очередь; результат - future"""
+        future = asyncio.get_running_loop().create_future()
+        chat_id = method.chat_id
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat()
+        chat.queues[priority].append(_Job(method, priority, future))
+        metrics.inc("notifications_queued_total", priority=priority.name.lower())
+        self._schedule(chat_id, chat)
+        return future
+
+    def _schedule(self, chat_id: Any, chat: _Chat):
+        """Ставит чат в очередь готовых или отложенных по его голове"""
+        head = chat.head()
+        if chat.busy or head is None:
+            # пустой чат остается до next_at, чтобы следующее сообщение выдержало интервал
+            self._purge_idle()
+            return
+        # версии уникальны глобально: запись удаленного и созданного заново чата не оживет
+        chat.version = next(self._counter)
+        if chat.next_at > time.monotonic():
+            heapq.heappush(self._delayed, (chat.next_at, next(self._counter), chat.version, chat_id))
+        else:
+            heapq.heappush(self._ready, (head.priority, next(self._counter), chat.version, chat_id))
+        self._wakeup.set()
+
+    def _purge_idle(self):
+        """Раз в минуту удаляет пустые чаты, интервал которых уже прошел"""
+        now = time.monotonic()
+        if now - self._purged_at < 60:
+            return
+        self._purged_at = now
+        for chat_id in [
+            chat_id for chat_id, chat in self._chats.items()
+            if not chat.busy and chat.head() is None and chat.next_at <= now
+        ]:
+            del self._chats[chat_id]
+
+    def _promote_delayed(self) -> Optional[float]:
+        """Переносит наступившие отложенные чаты в готовые; возвращает паузу до следующего"""
+        now = time.monotonic()
+        while self._delayed:
+            next_at, _, version, chat_id = self._delayed[0]
+            chat = self._chats.get(chat_id)
+            if chat is None or chat.version != version:
+                heapq.heappop(self._delayed)
+                continue
+            if next_at > now:
+                return next_at - now
+            heapq.heappop(self._delayed)
+            head = chat.head()
+            heapq.heappush(self._ready, (head.priority, next(self._counter), version, chat_id))
+        return None
+
+    def _pop_ready(self) -> Optional[Tuple[Any, _Chat]]:
+        while self._ready:
+            _, _, version, chat_id = heapq.heappop(self._ready)
+            chat = self._chats.get(chat_id)
+            if chat is not None and chat.version == version and not chat.busy:
+                return chat_id, chat
+        return None
+
+    async def _take_token(self):
+        """Общий token bucket: не больше rate отправок в секунду"""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._tokens_at) * self.rate)
+            self._tokens_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def _dispatch_loop(self):
+        while True:
+            self._wakeup.clear()
+            delay = self._promote_delayed()
+            if not self._ready:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._take_token()
+            # пока ждали токен, могли прийти более важные сообщения
+            self._promote_delayed()
+            popped = self._pop_ready()
+            if popped is None:
+                self._tokens += 1
+                continue
+            chat_id, chat = popped
+            job = chat.head()
+            chat.queues[job.priority].popleft()
+            if job.future.cancelled():
+                # отправитель уже не ждет результата (например, рассылку остановили)
+                self._tokens += 1
+                self._schedule(chat_id, chat)
+                continue
+            chat.busy = True
+            task = asyncio.create_task(self._deliver(chat_id, chat, job))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _deliver(self, chat_id: Any, chat: _Chat, job: _Job):
+        """Отправляет одно сообщение; при 429 откладывает только этот чат"""
+        interval = self.group_chat_interval if isinstance(chat_id, int) and chat_id < 0 else self.chat_interval
+        label = job.priority.name.lower()
+        job.attempts += 1
+        try:
+            result = await self.bot(job.method)
+            chat.next_at = time.monotonic() + interval
+            metrics.inc("notifications_sent_total", priority=label)
+            if not job.future.done():
+                job.future.set_result(result)
+        except TelegramRetryAfter as e:
+            metrics.inc("notifications_retry_after_total", priority=label)
+            logger.warning(f"Лимит Telegram для чата {chat_id}: повтор через {e.retry_after} с")
+            chat.next_at = time.monotonic() + e.retry_after
+            chat.queues[job.priority].appendleft(job)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            chat.next_at = time.monotonic() + interval * 2 ** job.attempts
+            if job.attempts < self.max_attempts:
+                chat.queues[job.priority].appendleft(job)
+            else:
+                metrics.inc("notifications_failed_total", priority=label)
+                if not job.future.done():
+                    job.future.set_exception(e)
+        except Exception as e:
+            chat.next_at = time.monotonic() + interval
+            metrics.inc("notifications_failed_total", priority=label)
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            chat.busy = False
+            self._schedule(chat_id, chat)
+
+    def start(self):
+        """Запускает отправку"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._dispatch_loop())
+
+    async def close(self, drain_timeout: Optional[float] = None):
+        """
+        Дает очереди до drain_timeout секунд на отправку транзакционных
+        сообщений, затем останавливается; неотправленные получают CancelledError.
+        """
+        deadline = time.monotonic() + (drain_timeout or settings.NOTIFY_DRAIN_TIMEOUT)
+        while time.monotonic() < deadline and (self._sending or any(
+                chat.queues[MessagePriority.TRANSACTIONAL] for chat in self._chats.values()
+        )):
+            await asyncio.sleep(0.05)
+
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._sending):
+            task.cancel()
+        await asyncio.gather(*self._sending, return_exceptions=True)
+        for chat in self._chats.values():
+            for queue in chat.queues:
+                for job in queue:
+                    job.future.cancel()
+        self._chats.clear()
+        self._ready.clear()
+        self._delayed.clear()
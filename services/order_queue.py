@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import select, update
+
+from config.config import settings
+from database.crud import change_orders_status
+from database.models import Order, OrderOutbox
+from database.session import AsyncSessionLocal
+from iiko_integration.circuit_breaker import CircuitOpenError
+from services.iiko_service import IikoService
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class OrderSubmissionQueue:
+    """
+    Очередь отправки заказов в iiko поверх таблицы order_outbox.
+
+    Обработчик подтверждения только сохраняет заказ и задачу в SQLite,
+    а отправкой занимается пул воркеров: задачи забираются пачками,
+    группируются по организации и отправляются с ограничением параллельности.
+    Неудачные попытки повторяются с экспоненциальной задержкой.
+    """
+
+    def __init__(
+            self,
+            iiko_service: IikoService,
+            workers: Optional[int] = None,
+            batch_size: Optional[int] = None,
+            concurrency: Optional[int] = None,
+            max_attempts: Optional[int] = None,
+            retry_base: Optional[float] = None,
+            retry_max: Optional[float] = None,
+            poll_interval: Optional[float] = None
+    ):
+        self.iiko_service = iiko_service
+        self.workers = workers or settings.ORDER_QUEUE_WORKERS
+        self.batch_size = batch_size or settings.ORDER_QUEUE_BATCH_SIZE
+        self.max_attempts = max_attempts or settings.ORDER_QUEUE_MAX_ATTEMPTS
+        self.retry_base = retry_base or settings.ORDER_QUEUE_RETRY_BASE
+        self.retry_max = retry_max or settings.ORDER_QUEUE_RETRY_MAX
+        self.poll_interval = poll_interval or settings.ORDER_QUEUE_POLL_INTERVAL
+        self._semaphore = asyncio.Semaphore(concurrency or settings.ORDER_QUEUE_CONCURRENCY)
+        self._batches: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def notify(self):
+        """Будит диспетчер после добавления новой задачи"""
+        self._wakeup.set()
+
+    async def start(self):
+        """Возвращает зависшие задачи в очередь и запускает воркеры"""
+        await self._recover()
+        self._tasks = [asyncio.create_task(self._dispatch_loop())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Очередь заказов запущена, воркеров: {self.workers}")
+
+    async def close(self):
+        """Останавливает диспетчер и воркеры"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _recover(self):
+        """
+        Задачи, оставшиеся в обработке после падения, снова становятся ожидающими.
+        iiko мог успеть их принять, поэтому перед повтором заказ ищется по id.
+        """
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(OrderOutbox)
+                .where(OrderOutbox.status == "processing")
+                .values(status="pending", last_error="Отправка прервана перезапуском")
+            )
+            await session.commit()
+
+    async def _dispatch_loop(self):
+        while True:
+            self._wakeup.clear()
+            claimed = 0
+            try:
+                for batch in await self._claim():
+                    claimed += len(batch)
+                    await self._batches.put(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка выборки очереди заказов: {e}", exc_info=True)
+
+            if claimed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _claim(self) -> List[List[Any]]:
+        """Забирает пачку готовых к отправке задач и группирует их по организации"""
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(
+                select(
+                    OrderOutbox.id,
+                    OrderOutbox.order_id,
+                    OrderOutbox.organization_id,
+                    OrderOutbox.payload,
+                    OrderOutbox.order_uuid,
+                    OrderOutbox.attempts,
+                    OrderOutbox.last_error
+                )
+                .where(
+                    OrderOutbox.status == "pending",
+                    OrderOutbox.next_attempt_at <= datetime.utcnow()
+                )
+                .order_by(OrderOutbox.id)
+                .limit(self.batch_size)
+            )).all()
+            if not rows:
+                return []
+
+            await session.execute(
+                update(OrderOutbox)
+                .where(OrderOutbox.id.in_([row.id for row in rows]))
+                .values(status="processing")
+            )
+            await session.commit()
+
+        by_organization = defaultdict(list)
+        for row in rows:
+            by_organization[row.organization_id].append(row)
+        return list(by_organization.values())
+
+    async def _worker(self):
+        while True:
+            batch = await self._batches.get()
+            try:
+                await self._process(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка обработки пачки заказов: {e}", exc_info=True)
+            finally:
+                self._batches.task_done()
+
+    async def _submit(self, row) -> Tuple[Any, Optional[str], Optional[str], float]:
+        """Результат: (задача, id заказа в iiko, ошибка, отложить без расхода попытки на N секунд)"""
+        async with self._semaphore:
+            try:
+                if row.attempts or row.last_error:
+                    # прошлая попытка могла дойти до iiko (таймаут, 5xx после приема)
+                    iiko_order_id = await self.iiko_service.find_order(row.order_uuid, row.organization_id)
+                    if iiko_order_id:
+                        return row, iiko_order_id, None, 0
+                iiko_order_id = await self.iiko_service.submit_order(
+                    {**row.payload, "id": row.order_uuid},
+                    row.organization_id
+                )
+                if not iiko_order_id:
+                    return row, None, "iiko не вернул идентификатор заказа", 0
+                return row, iiko_order_id, None, 0
+            except CircuitOpenError as e:
+                return row, None, str(e), max(e.retry_after, 1.0)
+            except Exception as e:
+                return row, None, str(e) or type(e).__name__, 0
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _process(self, batch: List[Any]):
+        """Отправляет пачку заказов одной организации и сохраняет результаты одной транзакцией"""
+        results = await asyncio.gather(*(self._submit(row) for row in batch))
+        now = datetime.utcnow()
+
+        async with AsyncSessionLocal() as session:
+            for row, iiko_order_id, error, postpone in results:
+                metrics.inc(
+                    "order_submissions_total",
+                    result="postponed" if postpone else "ok" if error is None else "error"
+                )
+                if postpone:
+                    # iiko недоступен: ждем восстановления цепи, попытка не засчитывается
+                    await session.execute(
+                        update(OrderOutbox)
+                        .where(OrderOutbox.id == row.id)
+                        .values(
+                            status="pending",
+                            last_error=error[:300],
+                            next_attempt_at=now + timedelta(seconds=postpone)
+                        )
+                    )
+                    continue
+
+                if error is None:
+                    await session.execute(
+                        update(OrderOutbox)
+                        .where(OrderOutbox.id == row.id)
+                        .values(status="sent", attempts=row.attempts + 1, last_error=None)
+                    )
+                    await session.execute(
+                        update(Order)
+                        .where(Order.id == row.order_id)
+                        .values(iiko_order_id=iiko_order_id)
+                    )
+                    # вебхук iiko мог прийти раньше и уже продвинуть статус
+                    await change_orders_status(session, [row.order_id], "accepted", only_from=["created"])
+                    continue
+
+                attempts = row.attempts + 1
+                if attempts >= self.max_attempts:
+                    logger.error(f"Заказ {row.order_id} не отправлен в iiko после {attempts} попыток: {error}")
+                    await session.execute(
+                        update(OrderOutbox)
+                        .where(OrderOutbox.id == row.id)
+                        .values(status="failed", attempts=attempts, last_error=error[:300])
+                    )
+                    await change_orders_status(session, [row.order_id], "failed", only_from=["created"])
+                else:
+                    logger.warning(f"Заказ {row.order_id}: попытка {attempts} не удалась: {error}")
+                    await session.execute(
+                        update(OrderOutbox)
+                        .where(OrderOutbox.id == row.id)
+                        .values(
+                            status="pending",
+                            attempts=attempts,
+                            last_error=error[:300],
+                            next_attempt_at=now + timedelta(seconds=self._retry_delay(attempts))
+                        )
+                    )
+            await session.commit()
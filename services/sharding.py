@@ -0,0 +1,141 @@
+import asyncio
+import bisect
+import hashlib
+import hmac
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, web
+
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Консистентное хеширование: у каждого узла replicas точек на кольце.
+    При изменении числа воркеров переезжает только ~1/N пользователей.
+    """
+
+    def __init__(self, nodes: List[str], replicas: int = 100):
+        points = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in nodes
+            for i in range(replicas)
+        )
+        self._keys = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def get(self, key: Any) -> str:
+        """Узел, отвечающий за ключ"""
+        index = bisect.bisect(self._keys, _hash(str(key))) % len(self._keys)
+        return self._nodes[index]
+
+
+def update_shard_key(update: Dict[str, Any]) -> Optional[int]:
+    """
+    Ключ маршрутизации апдейта: id пользователя, а без него - id чата.
+    Корзина и FSM привязаны к пользователю, поэтому все его апдейты
+    попадают в один воркер.
+    """
+    for name, event in update.items():
+        if name == "update_id" or not isinstance(event, dict):
+            continue
+        sender = event.get("from") or event.get("user")
+        if sender and sender.get("id"):
+            return sender["id"]
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat and chat.get("id"):
+            return chat["id"]
+    return None
+
+
+class ShardRouter:
+    """
+    Точка входа вебхука Telegram перед воркерами: проверяет секретный токен
+    и пересылает апдейт воркеру, выбранному по ключу пользователя.
+    Если воркер недоступен, возвращает 503 - Telegram повторит доставку.
+    """
+
+    def __init__(self, workers: List[str], secret_token: str, timeout: float = 10.0):
+        self.workers = workers
+        self.secret_token = secret_token
+        self.ring = HashRing(workers)
+        self._timeout = ClientTimeout(total=timeout)
+        self._session: Optional[ClientSession] = None
+        self._background: set = set()
+
+    def _get_session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(timeout=self._timeout)
+        return self._session
+
+    async def _forward(self, worker: str, path: str, body: bytes, headers: Dict[str, str]) -> web.Response:
+        try:
+            async with self._get_session().post(worker + path, data=body, headers=headers) as response:
+                text = await response.text()
+                metrics.inc("shard_requests_total", worker=worker, status=response.status)
+                return web.Response(status=response.status, text=text, content_type=response.content_type)
+        except (asyncio.TimeoutError, ClientError) as e:
+            metrics.inc("shard_requests_total", worker=worker, status="unavailable")
+            logger.warning(f"Воркер {worker} недоступен: {e}")
+            return web.Response(status=503, text="Worker unavailable")
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret_token):
+            return web.Response(status=401, text="Unauthorized")
+
+        body = await request.read()
+        try:
+            key = update_shard_key(json.loads(body))
+        except (ValueError, AttributeError):
+            return web.Response(status=400, text="Bad update")
+
+        return await self._forward(
+            self.ring.get(key if key is not None else 0),
+            request.path,
+            body,
+            {SECRET_HEADER: self.secret_token, "Content-Type": "application/json"}
+        )
+
+    def setup(self, app: web.Application, path: str):
+        """Регистрирует маршрут вебхука Telegram и закрытие HTTP-сессии"""
+        app.router.add_post(path, self.handle_update)
+        app.on_cleanup.append(lambda _: self.close())
+
+    def setup_passthrough(self, app: web.Application, path: str, worker: int = 0, fanout: bool = False):
+        """
+        Пересылает запросы пути воркеру worker как есть (например, вебхуки iiko);
+        ответ отправителю - ответ этого воркера. С fanout копия запроса в фоне
+        уходит и остальным воркерам.
+        """
+
+        async def handle(request: web.Request) -> web.Response:
+            headers = {
+                name: value for name, value in request.headers.items()
+                if name.lower() in ("authorization", "content-type")
+            }
+            body = await request.read()
+            if fanout:
+                for index, other in enumerate(self.workers):
+                    if index != worker:
+                        task = asyncio.create_task(self._forward(other, request.path, body, headers))
+                        self._background.add(task)
+                        task.add_done_callback(self._background.discard)
+            return await self._forward(self.workers[worker], request.path, body, headers)
+
+        app.router.add_post(path, handle)
+
+    async def close(self):
+        await asyncio.gather(*self._background, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import signal
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from config.config import settings
+from init_db import initialize_database
+from services.sharding import ShardRouter
+from services.web_server import create_web_app, start_web_server
+
+logger = logging.getLogger(__name__)
+
+MAIN_SCRIPT = Path(__file__).resolve().parent.parent / "main.py"
+
+
+def worker_url(index: int) -> str:
+    """Адрес HTTP-сервера воркера"""
+    return f"http://127.0.0.1:{settings.BOT_WORKER_BASE_PORT + index}"
+
+
+class Supervisor:
+    """
+    Запускает N процессов-воркеров бота (main.py с BOT_WORKER_ID) и
+    перезапускает упавшие с нарастающей задержкой.
+    """
+
+    def __init__(self, workers: int, restart_delay: float = 1.0, restart_delay_max: float = 30.0):
+        self.workers = workers
+        self.restart_delay = restart_delay
+        self.restart_delay_max = restart_delay_max
+        self._processes: List[Optional[asyncio.subprocess.Process]] = [None] * workers
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    async def _spawn(self, index: int) -> asyncio.subprocess.Process:
+        env = dict(os.environ, BOT_WORKER_ID=str(index))
+        return await asyncio.create_subprocess_exec(sys.executable, str(MAIN_SCRIPT), env=env)
+
+    async def _keep_alive(self, index: int):
+        delay = self.restart_delay
+        while not self._stopping:
+            process = await self._spawn(index)
+            self._processes[index] = process
+            logger.info(f"Воркер {index} запущен, pid {process.pid}")
+            started = asyncio.get_running_loop().time()
+            code = await process.wait()
+            if self._stopping:
+                break
+
+            # долго проработавший воркер перезапускаем сразу, падающий на старте - с задержкой
+            if asyncio.get_running_loop().time() - started > self.restart_delay_max:
+                delay = self.restart_delay
+            logger.error(f"Воркер {index} завершился с кодом {code}, перезапуск через {delay:.0f} с")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.restart_delay_max)
+
+    def start(self):
+        """Запускает воркеры"""
+        self._tasks = [asyncio.create_task(self._keep_alive(i)) for i in range(self.workers)]
+
+    async def close(self, timeout: float = 15.0):
+        """Останавливает воркеры: SIGTERM, а по истечении timeout - SIGKILL"""
+        self._stopping = True
+        running = [p for p in self._processes if p is not None and p.returncode is None]
+        for process in running:
+            process.terminate()
+        try:
+            await asyncio.wait_for(asyncio.gather(*(p.wait() for p in running)), timeout)
+        except asyncio.TimeoutError:
+            for process in running:
+                if process.returncode is None:
+                    process.kill()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+async def run_supervisor():
+    """
+    Режим супервизора: принимает вебхуки Telegram и раздает апдейты воркерам
+    по консистентному хешу id пользователя. Вебхуки iiko получают все воркеры:
+    статусы заказов применяет воркер 0 (он же отправляет заказы в iiko и
+    регистрирует вебхук Telegram), стоп-листы и меню обновляет каждый у себя.
+    """
+    if not await initialize_database():
+        raise RuntimeError("База данных не инициализирована")
+
+    router = ShardRouter(
+        [worker_url(i) for i in range(settings.BOT_WORKERS)],
+        settings.BOT_WEBHOOK_SECRET
+    )
+    app = create_web_app()
+    router.setup(app, settings.BOT_WEBHOOK_PATH)
+    if settings.IIKO_WEBHOOK_TOKEN:
+        router.setup_passthrough(app, settings.IIKO_WEBHOOK_PATH, fanout=True)
+
+    supervisor = Supervisor(settings.BOT_WORKERS)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    runner = await start_web_server(app, settings.WEB_SERVER_HOST, settings.WEB_SERVER_PORT)
+    try:
+        supervisor.start()
+        logger.info(f"Супервизор запущен, воркеров: {settings.BOT_WORKERS}")
+        await stop.wait()
+    finally:
+        logger.info("Остановка воркеров...")
+        await supervisor.close()
+        await runner.cleanup()
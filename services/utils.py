@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+# Статусы заказов для пользователей и админ-панели
+ORDER_STATUS_TITLES = {
+    "created": "🆕 Новые",
+    "accepted": "✅ Приняты",
+    "cooking": "👨‍🍳 Готовятся",
+    "ready": "📦 Готовы",
+    "delivering": "🚚 В пути",
+    "completed": "🏁 Выполнены",
+    "cancelled": "❌ Отменены",
+    "failed": "⚠️ Ошибка отправки"
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def format_price(kopecks: int) -> str:
+    """Цена в копейках -> строка в рублях без лишних нулей"""
+    rubles, rest = divmod(kopecks, 100)
+    return f"{rubles}" if not rest else f"{rubles}.{rest:02d}"
+
+
+def encode_cursor(created_at: datetime, order_id: int) -> str:
+    """Курсор (created_at, id) для callback data: микросекунды с эпохи и id"""
+    return f"{(created_at - _EPOCH) // timedelta(microseconds=1)}_{order_id}"
+
+
+def decode_cursor(cursor: str):
+    """Обратное преобразование encode_cursor"""
+    micros, order_id = cursor.split("_")
+    return _EPOCH + timedelta(microseconds=int(micros)), int(order_id)
@@ -0,0 +1,45 @@
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    """Метрики процесса в формате Prometheus"""
+    return web.Response(text=metrics.render(), content_type="text/plain")
+
+
+def create_web_app() -> web.Application:
+    """aiohttp-приложение бота; маршруты вебхуков подключаются отдельно"""
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    return app
+
+
+async def start_web_server(app: web.Application, host: str, port: int) -> web.AppRunner:
+    """Запускает HTTP-сервер и возвращает runner для остановки"""
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"HTTP-сервер запущен на {host}:{port}")
+    return runner
+
+
+def setup_telegram_webhook(app: web.Application, dp: Dispatcher, bot: Bot, path: str, secret_token: str):
+    """
+    Подключает прием апдейтов Telegram: запрос проверяется по секретному
+    токену и сразу подтверждается, апдейт обрабатывается в фоне.
+    Запуск и остановка диспетчера привязываются к жизненному циклу приложения.
+    """
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=secret_token
+    ).register(app, path=path)
+    setup_application(app, dp, bot=bot)